@@ -0,0 +1,308 @@
+"""
+-*- coding: utf-8 -*-
+
+batch_corpus_commands.py
+
+Runs the Itinerary functions on every itinerary datasheet in a folder (for
+example all of Completed-Itineraries) in one command, using every core of
+the computer.  Where interactive_gaz_itin_commands.py processes a single
+gazetteer and itinerary chosen in the text template, this processes the
+whole corpus the same way each time:
+    format_dates - the 'dates' column
+    attribute_lookup - only if a gazetteer is entered (ex: latitude,
+        longitude, geo_id from Full_Crown_of_Aragon_Gazetteer.csv)
+    itin_to_trips - the trips dataframe
+    travel_check - the trips that seem too fast to be possible
+    itin_to_gaz - the itinerary as a gazetteer, labelled with its code
+
+Each datasheet is matched to its itinerary_code in itinerary-codes.csv.
+If the codes file has a 'file_name' column, that is used directly;
+otherwise the words of the itinerary_full_name (ex: Joan_I_of_Aragon_Royal)
+are compared with the words of the file name (Joan_I_royal_itinerary_
+datasheet.csv) and, among the names whose first word (the traveller) is in
+the file name, the code with the most words in common is used.  Files
+without a clear match are still processed, but without a code.
+
+For every itinerary the outputs are written to the output folder as
+<name>_processed.csv, <name>_trips.csv and <name>_gazetteer.csv (or .parquet
+or .feather with --format), <name>_flagged.csv when any trips are flagged by
+the travel check, and all of the error_checks are gathered into a
+single corpus_error_report.txt.  With --label, the gazetteer is also labelled
+with the codes of every itinerary that visits each place (see
+Gazetteer.bulk_itinerary_labels) and saved as <gazetteer>_labelled.csv.
+With --events, the time and row count of every step of each itinerary are
+written to <name>_events.jsonl (see instrument_class.py).  With --compact,
+each itinerary is held in compact column types (see
+Itinerary.compact_frame) and its dates are saved as day numbers.  With
+--distances FILE, the trip distances come from a saved matrix of the
+distance between every pair of gazetteer places (see
+distance_cache_class.py), built from the gazetteer the first time.
+
+Example (from the top folder of the repository):
+    python Itinerary-Project-Code/batch_corpus_commands.py itinerary-codes.csv
+        Completed-Itineraries Corpus-Output
+        --gazetteer Gazetteers/Full_Crown_of_Aragon_Gazetteer.csv
+        --attributes latitude longitude geo_id --label
+
+Function List:
+    main():
+        Reads the command line options and runs process_corpus.
+    process_corpus(codes_file, corpus_dir, out_dir, gaz_file=None,
+                   attributes=None, workers=None, out_format='csv',
+                   label=False, events=False, compact=False,
+                   distance_matrix=None):
+        Finds every datasheet, matches their codes, runs process_itinerary
+        on each of them in a pool of processes, and writes the error report
+        (and the labelled gazetteer if label is True).  Returns a summary
+        DataFrame with one row per itinerary.
+    process_itinerary(file_path, itin_code, out_dir, gaz_file=None,
+                      attributes=None, out_format='csv', events=False,
+                      compact=False, distance_matrix=None):
+        Runs the Itinerary functions on one datasheet and writes the
+        outputs.  Returns a dictionary of row counts, the time taken, and
+        the error_checks.
+    match_codes(codes_df, file_paths):
+        Returns a dictionary of the itinerary_code for each file (or None).
+
+Functions called by main Function List:
+    _words(text):
+        Splits a name into a set of lowercase words.
+    _first_word(text):
+        Returns the first lowercase word of a name.
+    _error_report(results, report_file):
+        Writes the consolidated error report.
+    _label_gazetteer(results, gaz_file, out_dir, out_format):
+        Labels the gazetteer with every itinerary code in one pass.
+
+@author: Adam Franklin-Lyons
+    Marlboro College | Python 3.7
+
+Created on Sat Oct 17 16:45:12 2026
+"""
+
+from itinerary_class import Itinerary
+from gazetteer_class import Gazetteer
+from instrument_class import Instrument
+from distance_cache_class import DistanceCache
+from table_io_functions import read_table, write_table
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import glob
+import os
+import re
+import time
+import pandas as pd
+
+def main():
+    """
+    Reads the codes file, corpus folder, output folder and the optional
+    gazetteer settings from the command line and processes the corpus.
+    """
+    parser = argparse.ArgumentParser(description='Process every itinerary '
+                                     'datasheet in a folder.')
+    parser.add_argument('codes_file', help='itinerary-codes.csv')
+    parser.add_argument('corpus_dir', help='ex: Completed-Itineraries')
+    parser.add_argument('out_dir', help='folder for the output files')
+    parser.add_argument('--gazetteer', default=None,
+                        help='gazetteer csv for the attribute lookup')
+    parser.add_argument('--attributes', nargs='+',
+                        default=['latitude', 'longitude', 'geo_id'],
+                        help='gazetteer columns to look up')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of processes (default: all cores)')
+    parser.add_argument('--format', default='csv',
+                        choices=['csv', 'parquet', 'feather'],
+                        help='file type for the outputs')
+    parser.add_argument('--label', action='store_true',
+                        help='label the gazetteer with the itinerary codes')
+    parser.add_argument('--events', action='store_true',
+                        help='save the timing events of every itinerary')
+    parser.add_argument('--compact', action='store_true',
+                        help='use compact column types for each itinerary')
+    parser.add_argument('--distances', default=None,
+                        help='.npz distance matrix file (made if missing)')
+    args = parser.parse_args()
+    summary = process_corpus(args.codes_file, args.corpus_dir, args.out_dir,
+                             gaz_file=args.gazetteer,
+                             attributes=args.attributes,
+                             workers=args.workers, out_format=args.format,
+                             label=args.label, events=args.events,
+                             compact=args.compact,
+                             distance_matrix=args.distances)
+    print(summary.to_string(index=False))
+
+def process_corpus(codes_file, corpus_dir, out_dir, gaz_file=None,
+                   attributes=None, workers=None, out_format='csv',
+                   label=False, events=False, compact=False,
+                   distance_matrix=None):
+    """
+    Finds every '*_datasheet.csv' file in the corpus folder (and its
+    sub-folders), matches each to its code from the codes file, and runs
+    process_itinerary on all of them at once in separate processes.  The
+    default number of processes is the number of cores on the computer.
+    The combined error report is written to the output folder and a
+    summary DataFrame (file, code, rows, dated rows, trips, places) is
+    returned.  If label is True and there is a gazetteer, the gazetteer is
+    saved again with the itin_list of every place filled in.  A
+    distance_matrix file that does not exist yet is built from the
+    gazetteer once, before the itineraries are processed.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    if distance_matrix and gaz_file and not os.path.exists(distance_matrix):
+        cache = DistanceCache(distance_matrix)
+        cache.build_matrix(read_table(gaz_file))
+        cache.save_matrix()
+    file_paths = sorted(glob.glob(os.path.join(corpus_dir, '**',
+                                               '*_datasheet.csv'),
+                                  recursive=True))
+    codes = match_codes(pd.read_csv(codes_file), file_paths)
+    jobs = [(path, codes[path], out_dir, gaz_file, attributes, out_format,
+             events, compact, distance_matrix) for path in file_paths]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(process_itinerary, *zip(*jobs)))
+    if label and gaz_file:
+        _label_gazetteer(results, gaz_file, out_dir, out_format)
+    _error_report(results, os.path.join(out_dir, 'corpus_error_report.txt'))
+    return pd.DataFrame([{key: value for key, value in result.items()
+                          if key not in ['errors', 'names']}
+                         for result in results])
+
+def process_itinerary(file_path, itin_code, out_dir, gaz_file=None,
+                      attributes=None, out_format='csv', events=False,
+                      compact=False, distance_matrix=None):
+    """
+    Runs one itinerary datasheet through the Itinerary functions: the
+    attribute lookup (if there is a gazetteer), format_dates, itin_to_trips,
+    travel_check, and itin_to_gaz (with the itinerary code when there is
+    one).  The processed itinerary, trips, and gazetteer are written to
+    out_dir.  Any failure is recorded in the errors rather than stopping the
+    other itineraries.  With events, an Instrument records each step in
+    <name>_events.jsonl in out_dir.  With compact, the itinerary uses
+    compact column types, and with a distance_matrix file the trip
+    distances are read from it where possible.
+    """
+    name = os.path.basename(file_path).split('.')[0]
+    out_path = os.path.join(out_dir, name + '_{}.' + out_format)
+    result = {'file': name, 'itin_code': itin_code, 'rows': 0,
+              'dated_rows': 0, 'trips': 0, 'flagged': 0, 'places': 0,
+              'errors': [], 'seconds': 0.0, 'names': []}
+    start = time.perf_counter()
+    instrument = None
+    if events:
+        instrument = Instrument(os.path.join(out_dir, name + '_events.jsonl'))
+    try:
+        itin = Itinerary(file_path, instrument=instrument, compact=compact)
+        result['rows'] = len(itin.itin_df)
+        result['names'] = list(itin.itin_df['modern_name'].dropna().unique())
+        if not itin.no_flag:
+            result['errors'] = itin.error_checks
+            return result
+        if gaz_file:
+            gaz_df = read_table(gaz_file)
+            itin.attribute_lookup(gaz_df, attributes)
+        itin.format_dates()
+        result['dated_rows'] = int(itin.itin_df['dates'].notna().sum())
+        cache = DistanceCache(distance_matrix) if distance_matrix else None
+        trips = itin.itin_to_trips(distance_cache=cache)
+        if trips is not None:
+            result['trips'] = len(trips)
+            write_table(trips, out_path.format('trips'))
+            flagged = itin.travel_check(trips)
+            result['flagged'] = len(flagged)
+            if not flagged.empty:
+                write_table(flagged, out_path.format('flagged'))
+        gaz_df = itin.itin_to_gaz(add_code=bool(itin_code),
+                                  itin_code=itin_code)
+        if gaz_df is not None:
+            result['places'] = len(gaz_df)
+            write_table(gaz_df, out_path.format('gazetteer'))
+        write_table(itin.itin_df, out_path.format('processed'))
+        result['errors'] = itin.error_checks
+    except Exception as error:
+        result['errors'].append('Processing stopped with an error: '
+                                '{!r}'.format(error))
+    finally:
+        result['seconds'] = round(time.perf_counter() - start, 3)
+        if instrument:
+            instrument.close()
+    return result
+
+def match_codes(codes_df, file_paths):
+    """
+    Matches every datasheet to an itinerary_code.  A 'file_name' column in
+    the codes file gives exact matches.  Otherwise each file takes the code
+    whose itinerary_full_name shares the most words with the file name.
+    Only names whose first word (the traveller, ex: 'Joan') appears in the
+    file name count, and no other code may share as many words.  Unmatched
+    files get None.
+    """
+    matches = {}
+    for path in file_paths:
+        file_name = os.path.basename(path)
+        if 'file_name' in codes_df.columns:
+            found = codes_df.loc[codes_df['file_name'] == file_name,
+                                 'itinerary_code']
+            matches[path] = found.values[0] if not found.empty else None
+            continue
+        file_words = _words(file_name)
+        scores = codes_df['itinerary_full_name'].apply(
+                            lambda x: len(_words(x) & file_words)
+                            if _first_word(x) in file_words else 0)
+        best = scores.max()
+        if best > 0 and (scores == best).sum() == 1:
+            matches[path] = codes_df.loc[scores.idxmax(), 'itinerary_code']
+        else:
+            matches[path] = None
+    return matches
+
+def _words(text):
+    """
+    Splits a name like 'Joan_I_of_Aragon_Royal' into the set of lowercase
+    words {'joan', 'i', 'of', 'aragon', 'royal'}.
+    """
+    return set(re.split(r'[_\W]+', str(text).lower())) - {''}
+
+def _first_word(text):
+    """
+    Returns the first lowercase word of a name ('joan' for Joan_I_of_Aragon).
+    """
+    return re.split(r'[_\W]+', str(text).lower())[0]
+
+def _label_gazetteer(results, gaz_file, out_dir, out_format):
+    """
+    Labels the gazetteer with the code of every itinerary that has one,
+    using the unique place names each process_itinerary returned, and
+    writes it as <gazetteer>_labelled in the output folder.  Places that
+    are not in the gazetteer are added to that itinerary's errors.
+    """
+    gaz = Gazetteer(gaz_file, None, monitor=False, cache_file=None)
+    labelled = [result for result in results if result['itin_code']]
+    gaz.bulk_itinerary_labels([(pd.DataFrame({'modern_name':
+                                              result['names']}),
+                                result['itin_code'])
+                               for result in labelled])
+    for result in labelled:
+        result['errors'] = list(result['errors']) + [
+                    line for line in gaz.error_checks
+                    if line.endswith('({})'.format(result['itin_code']))]
+    name = os.path.basename(gaz_file).split('.')[0]
+    write_table(gaz.gaz_df, os.path.join(out_dir, '{}_labelled.{}'.format(
+                                                        name, out_format)))
+
+def _error_report(results, report_file):
+    """
+    Writes every itinerary's error_checks (without repeats) into one text
+    file, each under a heading with the file name, code, and counts.
+    """
+    with open(report_file, 'w', encoding='utf-8') as f:
+        for result in results:
+            f.write('=== {file} ({itin_code}): {rows} rows, {dated_rows} '
+                    'dated, {trips} trips, {places} places ===\n'.format(
+                    **result))
+            for line in pd.unique(pd.Series(result['errors'], dtype=object)):
+                f.write('{}\n'.format(line))
+            f.write('\n')
+        f.write('So many places to visit!\n')
+
+if __name__ == '__main__':
+    main()
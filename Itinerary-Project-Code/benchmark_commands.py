@@ -0,0 +1,309 @@
+"""
+-*- coding: utf-8 -*-
+
+benchmark_commands.py
+
+Times the slowest parts of the Gazetteer and Itinerary classes so that the
+effect of a change can be measured instead of guessed.  Each itinerary
+datasheet (all of Completed-Itineraries by default) is run with the Crown
+of Aragon gazetteer at its real size and in copies made 10 and 100 times
+larger, through:
+    fuzzy_gaz_name_match - the gazetteer name matching (formerly _max_lev)
+    attribute_lookup - latitude, longitude, and geo_id from the gazetteer
+    format_dates - the 'dates' column
+    itin_to_trips - the trips dataframe (after the lookup and dates)
+    check_existing_gaz - the gazetteer compared with the real gazetteer
+    geoname_id_lookup - the gazetteer lookup against a local stand-in for
+        geonames (LocalGeonames) so no internet or lookup credits are used
+
+Every benchmark is run a few times and the fastest time is kept, then run
+once more with tracemalloc to record the peak memory.  The results are
+saved as JSON, one entry per benchmark, dataset, and scale with the wall
+time (seconds), peak memory (MB), and rows per second.  Saving the JSON
+for two commits and entering the older one with --compare prints how much
+faster or slower each benchmark became.
+
+Example (from the top folder of the repository):
+    python Itinerary-Project-Code/benchmark_commands.py benchmarks.json
+        --scales 1 10 --compare old_benchmarks.json
+
+Function List:
+    main():
+        Reads the command line options, runs the benchmarks, saves the JSON.
+    run_benchmarks(itin_files, gaz_file, scales=(1, 10, 100), repeat=3):
+        Runs every benchmark on every itinerary at every scale and returns
+        a dictionary with the run details and a list of results.
+    compare_results(new, old):
+        Returns a DataFrame of the old and new times of each benchmark and
+        the ratio between them (above 1 means slower).
+    scale_frame(df, scale, name_col=None):
+        Returns a copy of a dataframe repeated 'scale' times.  Gazetteer
+        copies get numbered names and slightly moved coordinates so each
+        copy is a different place.
+
+Functions called by main Function List:
+    _benchmarks(itin, gaz_df, gaz_file, work_dir):
+        Returns the name, row count, and setup function of each benchmark.
+    _measure(setup, repeat):
+        Times one benchmark and measures its peak memory.
+    _commit():
+        Returns the current git commit of the repository (or None).
+
+Class:
+    LocalGeonames - a stand-in for the Geonames class that answers every
+        lookup with a made-up place at the entered coordinates.
+
+@author: Adam Franklin-Lyons
+    Marlboro College | Python 3.7
+
+Created on Sat Oct 17 19:05:26 2026
+"""
+
+from itinerary_class import Itinerary
+from gazetteer_class import Gazetteer
+from table_io_functions import write_table
+import argparse
+import contextlib
+import copy
+import datetime as dt
+import glob
+import json
+import os
+import platform
+import re
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import warnings
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+class LocalGeonames:
+    """
+    Answers nearby place lookups like the Geonames class, but without
+    contacting geonames.org: every place found is named after the entered
+    row's coordinates, so the name match fails and guesses are written as
+    they would be for a real lookup.
+    """
+
+    def __init__(self):
+        self.cache = None
+        self.limiter = None
+
+    def lookup_nearby_place(self, latitude, longitude, feature_class=None,
+                            feature_code=None, verbose='short'):
+        return {'name': 'Place {:.3f} {:.3f}'.format(latitude, longitude),
+                'distance': '0.50000',
+                'geonameId': int(abs(latitude * 1000) + abs(longitude))}
+
+def main():
+    """
+    Reads the output file, datasheets, gazetteer, scales, and the number of
+    repeats from the command line, runs the benchmarks, and saves the JSON.
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the Gazetteer '
+                                     'and Itinerary functions.')
+    parser.add_argument('out_file', help='JSON file for the results')
+    parser.add_argument('--itineraries', nargs='+', default=None,
+                        help='datasheets (default: Completed-Itineraries)')
+    parser.add_argument('--gazetteer', default=os.path.join(ROOT,
+                        'Gazetteers', 'Full_Crown_of_Aragon_Gazetteer.csv'))
+    parser.add_argument('--scales', nargs='+', type=int, default=[1, 10, 100])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--compare', default=None,
+                        help='earlier JSON results to compare with')
+    args = parser.parse_args()
+    itin_files = args.itineraries or sorted(glob.glob(os.path.join(ROOT,
+                    'Completed-Itineraries', '**', '*_datasheet.csv'),
+                    recursive=True))
+    results = run_benchmarks(itin_files, args.gazetteer, args.scales,
+                             args.repeat)
+    with open(args.out_file, 'w') as f:
+        json.dump(results, f, indent=2)
+    table = pd.DataFrame(results['results'])
+    print(table[['benchmark', 'dataset', 'scale', 'rows', 'wall_time',
+                 'peak_memory_mb', 'rows_per_sec']].to_string(index=False))
+    if args.compare:
+        with open(args.compare) as f:
+            print(compare_results(results, json.load(f)).to_string(
+                                                            index=False))
+
+def run_benchmarks(itin_files, gaz_file, scales=(1, 10, 100), repeat=3):
+    """
+    Runs every benchmark for each itinerary file at each scale.  The
+    itinerary and gazetteer are both scaled, the gazetteer is written to a
+    temporary folder so check_existing_gaz can read it as a file, and each
+    benchmark starts from a fresh copy of the data.  Returns the commit,
+    versions, settings, and the list of results.
+    """
+    results = []
+    gaz_real = pd.read_csv(gaz_file)
+    with tempfile.TemporaryDirectory() as work_dir, warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for itin_file in itin_files:
+            dataset = os.path.basename(itin_file).split('.')[0]
+            base_itin = Itinerary(itin_file)
+            for scale in scales:
+                itin = copy.copy(base_itin)
+                itin.itin_df = scale_frame(base_itin.itin_df, scale)
+                gaz_df = scale_frame(gaz_real, scale, 'modern_name')
+                for name, rows, setup in _benchmarks(itin, gaz_df, gaz_file,
+                                                     work_dir):
+                    wall_time, times, peak = _measure(setup, repeat)
+                    results.append({'benchmark': name, 'dataset': dataset,
+                                    'scale': scale, 'rows': rows,
+                                    'wall_time': wall_time,
+                                    'wall_times': times,
+                                    'peak_memory_mb': peak,
+                                    'rows_per_sec': rows / wall_time
+                                    if wall_time else None})
+                    print('{} {} x{}: {:.4f} s'.format(name, dataset, scale,
+                                                       wall_time))
+    return {'commit': _commit(), 'created': dt.datetime.now().isoformat(),
+            'python': platform.python_version(), 'pandas': pd.__version__,
+            'numpy': np.__version__, 'gazetteer': os.path.basename(gaz_file),
+            'repeat': repeat, 'results': results}
+
+def compare_results(new, old):
+    """
+    Lines up two sets of benchmark results by benchmark, dataset, and scale
+    and returns the old time, new time, and new/old ratio for each, so 2.0
+    means the benchmark takes twice as long as before.
+    """
+    keys = ['benchmark', 'dataset', 'scale']
+    both = pd.DataFrame(old['results'])[keys + ['wall_time']].merge(
+                pd.DataFrame(new['results'])[keys + ['wall_time']],
+                on=keys, suffixes=('_old', '_new'))
+    both['ratio'] = both['wall_time_new'] / both['wall_time_old']
+    return both
+
+def scale_frame(df, scale, name_col=None):
+    """
+    Repeats a dataframe 'scale' times.  With a name column (for gazetteers)
+    every copy after the first gets its number added to the names ('Vic 2')
+    and its coordinates moved by a few hundredths of a degree, so the
+    copies act like new places rather than exact duplicates.
+    """
+    if scale <= 1:
+        return df.copy()
+    copies = []
+    for num in range(scale):
+        part = df.copy()
+        if name_col and num:
+            part[name_col] = part[name_col].astype(str) + ' {}'.format(num)
+            for col in ['latitude', 'longitude']:
+                if col in part.columns:
+                    part[col] = pd.to_numeric(part[col], errors='coerce'
+                                              ) + 0.01 * num
+        copies.append(part)
+    return pd.concat(copies, ignore_index=True)
+
+def _benchmarks(itin, gaz_df, gaz_file, work_dir):
+    """
+    Returns (name, rows, setup) for each benchmark.  Each setup makes fresh
+    copies of the objects the benchmark changes and returns the function to
+    time, so the preparation is not included in the times.
+    """
+    attributes = ['latitude', 'longitude', 'geo_id']
+    rows = len(itin.itin_df)
+    prepared = copy.copy(itin)
+    prepared.itin_df = itin.itin_df.copy()
+    prepared.error_checks = list(itin.error_checks)
+    prepared.attribute_lookup(gaz_df, attributes[:])
+    prepared.format_dates()
+    gaz_path = os.path.join(work_dir, 'benchmark_gazetteer.csv')
+    write_table(gaz_df, gaz_path)
+    base_gaz = Gazetteer(gaz_path, None, monitor=False, cache_file=None)
+
+    def fresh(source):
+        new = copy.copy(source)
+        new.itin_df = source.itin_df.copy()
+        new.error_checks = list(source.error_checks)
+        return new
+
+    def fresh_gaz(drop_ids=False):
+        gaz = copy.copy(base_gaz)
+        gaz.gaz_df = base_gaz.gaz_df.copy()
+        gaz.error_checks = []
+        if drop_ids:
+            # Every earlier lookup result, including each numbered guess.
+            gaz.gaz_df = gaz.gaz_df.drop(columns=[
+                col for col in gaz.gaz_df.columns
+                if col in ['geo_id', 'name_match', 'geo_dist'] or
+                re.match(r'(guess|g_dist|geo_?id_guess)\d+$', str(col))])
+            gaz.empty = gaz.gaz_df.index
+            gaz.all_good = gaz._verify_all()
+            gaz.geonames = gaz.geonames_dump = LocalGeonames()
+        return gaz
+
+    def name_match():
+        new = fresh(itin)
+        return lambda: new.fuzzy_gaz_name_match(gaz_df)
+
+    def lookup():
+        new = fresh(itin)
+        return lambda: new.attribute_lookup(gaz_df, attributes[:])
+
+    def dates():
+        new = fresh(itin)
+        return new.format_dates
+
+    def trips():
+        new = fresh(prepared)
+        return new.itin_to_trips
+
+    def existing():
+        gaz = fresh_gaz()
+        return lambda: gaz.check_existing_gaz(gaz_file)
+
+    def id_lookup():
+        gaz = fresh_gaz(drop_ids=True)
+        return lambda: gaz.geoname_id_lookup()
+
+    gaz_rows = len(gaz_df)
+    return [('fuzzy_gaz_name_match', rows, name_match),
+            ('attribute_lookup', rows, lookup),
+            ('format_dates', rows, dates),
+            ('itin_to_trips', rows, trips),
+            ('check_existing_gaz', gaz_rows, existing),
+            ('geoname_id_lookup', gaz_rows, id_lookup)]
+
+def _measure(setup, repeat):
+    """
+    Runs a benchmark 'repeat' times (each from a fresh setup) and keeps the
+    fastest wall time, then runs it once more under tracemalloc for the
+    peak memory in MB.  Printing from the functions is hidden.
+    """
+    times = []
+    for _ in range(max(repeat, 1)):
+        func = setup()
+        with open(os.devnull, 'w') as quiet, contextlib.redirect_stdout(quiet):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+    func = setup()
+    tracemalloc.start()
+    with open(os.devnull, 'w') as quiet, contextlib.redirect_stdout(quiet):
+        func()
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return min(times), times, peak
+
+def _commit():
+    """
+    Returns the git commit the benchmarks ran on, or None outside a git
+    repository.
+    """
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       cwd=HERE, stderr=subprocess.DEVNULL
+                                       ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+if __name__ == '__main__':
+    main()
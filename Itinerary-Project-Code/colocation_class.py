@@ -0,0 +1,353 @@
+"""
+-*- coding: utf-8 -*-
+
+colocation_class.py
+
+Answers "who was where on the same days" across many itineraries at once,
+such as Joan I as prince and Pere IV as king, or the English bishops in
+the same years.  Every itinerary is compressed into its stays (see
+Itinerary.itin_to_stays): one row per run of days at a place, with the
+arrival and departure dates.  The stays of all the itineraries are kept in
+one table of date intervals sorted by arrival day, which the queries
+search with sorted joins instead of comparing every itinerary row with
+every other:
+    present_on - everyone recorded somewhere on a date
+    co_presence - every time two travellers were recorded at the same place
+        on overlapping days
+    meetings - the days two chosen travellers were at the same place (or
+        within max_km of each other)
+    nearest_traveller - the other travellers closest to a traveller (or to
+        a point) on a date
+
+Dates are kept as Julian Day Numbers (see date_functions.py), so the
+itineraries can use datetime dates or day numbers and any year.  Queries
+accept a datetime.date, a 'yyyy-mm-dd' string, or a day number, and the
+results give both the day numbers (start, end) and the dates as text
+(start_date, end_date).  Only the recorded days of each stay are known:
+the days spent travelling between two stays are not part of either one.
+
+Because every stay has an arrival and a departure, a stay that covers a
+date must have arrived within the longest stay length before it.  The
+searches therefore look at a narrow band of the sorted arrivals, found by
+binary search, rather than at every stay.
+
+Example:
+    index = CoLocationIndex({'Joan I (prince)': joan, 'Pere IV': pere})
+    index.co_presence()
+    index.meetings('Joan I (prince)', 'Pere IV', max_km=10)
+    index.nearest_traveller('1370-05-01', traveller='Pere IV')
+
+    Variable List:
+        self.stays - every stay of every itinerary, sorted by arrival, with
+            traveller, place (the modern_name or geo_id used to compare
+            places), modern_name, latitude, longitude, start, and end.
+        self.place - the column used to decide two stays are at the same
+            place ('modern_name' or 'geo_id').
+        self.calendar - the calendar of the date text in the results and of
+            entered date strings ('gregorian' or 'julian').
+
+    Function List:
+        add(self, traveller, itinerary):
+            Adds the stays of another itinerary (an Itinerary or a stays
+            DataFrame) to the index.
+        present_on(self, date):
+            Returns every stay that covers the date.
+        co_presence(self, start=None, end=None, travellers=None):
+            Returns every pair of different travellers recorded at the same
+            place on overlapping days, optionally only between two dates or
+            among some travellers.
+        meetings(self, traveller1, traveller2, max_km=0.0):
+            Returns the overlapping stays of two travellers at the same
+            place or within max_km kilometers of each other.
+        nearest_traveller(self, date, traveller=None, latitude=None,
+                          longitude=None, k=1):
+            Returns the k other travellers closest on the date.
+
+    Internal Functions:
+        _build(self, parts):
+            Joins and sorts the stays and keeps the arrays for searching.
+        _stay_rows(self, traveller, itinerary):
+            Turns an itinerary's stays into rows of the index.
+        _day_column(self, dates):
+            Converts a column of dates or day numbers to day numbers.
+        _overlaps(self, rows1, rows2):
+            The sorted join of two sets of stays that share any day.
+        _pair_frame(self, first, second):
+            Builds the result of co_presence and meetings.
+        _day(self, date):
+            Converts an entered date to a day number.
+        _date_text(self, days):
+            Converts day numbers to 'yyyy-mm-dd' text.
+
+@author: Adam Franklin-Lyons
+    Marlboro College | Python 3.7
+
+Created on Sat Oct 17 23:58:12 2026
+"""
+
+import datetime as dt
+import os
+import numpy as np
+import pandas as pd
+from date_functions import day_numbers, day_number_dates, period_day_numbers
+from distance_functions import haversine_distance
+from table_io_functions import normalize_geo_ids
+
+STAY_COLUMNS = ['traveller', 'place', 'modern_name', 'latitude', 'longitude',
+                'start', 'end']
+
+class CoLocationIndex(object):
+    """
+    Keeps the stays of many itineraries as date intervals, sorted by
+    arrival, for questions about who was where at the same time.
+    """
+
+    def __init__(self, itineraries=(), place='modern_name',
+                 calendar='gregorian'):
+        """
+        Takes a dictionary of traveller names and itineraries (Itinerary
+        objects or stays dataframes from itin_to_stays), or a list of
+        Itinerary objects named after their files, and indexes all of their
+        stays.  Places are compared by modern_name, or by geo_id with
+        place='geo_id'.
+        """
+        self.place = place
+        self.calendar = calendar
+        self.stays = pd.DataFrame(columns=STAY_COLUMNS)
+        if not isinstance(itineraries, dict):
+            itineraries = {os.path.basename(itin.name): itin
+                           for itin in itineraries}
+        parts = [self._stay_rows(traveller, itin)
+                 for traveller, itin in itineraries.items()]
+        self._build(parts)
+
+    def add(self, traveller, itinerary):
+        """
+        Adds the stays of one more itinerary (an Itinerary or a stays
+        dataframe) under the traveller's name and sorts the index again.
+        """
+        self._build([self.stays, self._stay_rows(traveller, itinerary)])
+
+    def present_on(self, date):
+        """
+        Returns every stay (of any traveller) that covers the date: those
+        that arrived on or before it and left on or after it.  Only the
+        stays that arrived within the longest stay length before the date
+        are checked.
+        """
+        day = self._day(date)
+        low = np.searchsorted(self._start, day - self._longest, 'left')
+        high = np.searchsorted(self._start, day, 'right')
+        rows = np.arange(low, high)
+        rows = rows[self._end[rows] >= day]
+        found = self.stays.iloc[rows].copy()
+        found['start_date'] = self._date_text(found['start'])
+        found['end_date'] = self._date_text(found['end'])
+        return found.reset_index(drop=True)
+
+    def co_presence(self, start=None, end=None, travellers=None):
+        """
+        Finds every time two different travellers were recorded at the same
+        place on at least one shared day.  The stays at each place are
+        joined with each other by date (see _overlaps), so places visited by
+        only one traveller cost nothing.  'start' and 'end' limit the
+        search to stays that touch those dates, and travellers to a list of
+        names.  Returns one row per pair of overlapping stays (see
+        _pair_frame), ordered by the first shared day.
+        """
+        keep = np.ones(len(self.stays), dtype=bool)
+        if start is not None:
+            keep &= self._end >= self._day(start)
+        if end is not None:
+            keep &= self._start <= self._day(end)
+        if travellers is not None:
+            keep &= self.stays['traveller'].isin(travellers).to_numpy()
+        rows = np.flatnonzero(keep)
+        places = self.stays['place'].to_numpy()[rows]
+        travellers = self.stays['traveller'].to_numpy()
+        first, second = [], []
+        for group in pd.Series(rows).groupby(places, sort=False).indices.values():
+            group = rows[group]
+            if len(set(travellers[group])) < 2:
+                continue
+            one, two = self._overlaps(group, group)
+            keep = (one < two) & (travellers[one] != travellers[two])
+            first.append(one[keep])
+            second.append(two[keep])
+        if not first:
+            return self._pair_frame(np.array([], dtype=int),
+                                    np.array([], dtype=int))
+        return self._pair_frame(np.concatenate(first), np.concatenate(second))
+
+    def meetings(self, traveller1, traveller2, max_km=0.0):
+        """
+        Finds the days two travellers could have met: their stays that share
+        any day, either at the same place or with places no more than
+        max_km kilometers apart (0 for the same place only).  As each
+        traveller is only in one place at a time, the date join is no
+        larger than the two itineraries together.  Returns the pairs (see
+        _pair_frame) with the distance between the places.
+        """
+        names = self.stays['traveller'].to_numpy()
+        one, two = self._overlaps(np.flatnonzero(names == traveller1),
+                                  np.flatnonzero(names == traveller2))
+        pairs = self._pair_frame(one, two)
+        close = pairs['same_place'] | (pairs['distance'] <= max_km)
+        return pairs[close.to_numpy()].reset_index(drop=True)
+
+    def nearest_traveller(self, date, traveller=None, latitude=None,
+                          longitude=None, k=1):
+        """
+        Finds where the traveller was recorded on the date (or uses the
+        entered latitude and longitude) and returns the k closest other
+        travellers recorded anywhere on that date, with the distance in
+        kilometers to their place.  Each traveller appears once, at their
+        closest stay.  Returns an empty dataframe if the traveller has no
+        stay covering the date.
+        """
+        present = self.present_on(date)
+        if traveller is not None:
+            own = present[present['traveller'] == traveller]
+            present = present[present['traveller'] != traveller]
+            if own.empty:
+                return present.iloc[:0].assign(distance=[])
+            latitude = own['latitude'].iloc[0]
+            longitude = own['longitude'].iloc[0]
+        present = present.assign(distance=haversine_distance(
+                                    latitude, longitude,
+                                    present['latitude'], present['longitude']))
+        present = present.sort_values('distance', kind='mergesort')
+        return present.drop_duplicates('traveller').head(k
+                                                 ).reset_index(drop=True)
+
+    def _build(self, parts):
+        """
+        Joins the stays together, sorts them by arrival day, and keeps the
+        arrival and departure arrays and the longest stay for the searches.
+        """
+        parts = [part for part in parts if len(part)]
+        if parts:
+            self.stays = pd.concat(parts, ignore_index=True)
+        self.stays = self.stays.sort_values(['start', 'end'], kind='mergesort'
+                                            ).reset_index(drop=True)
+        self._start = self.stays['start'].to_numpy(dtype=np.int64)
+        self._end = self.stays['end'].to_numpy(dtype=np.int64)
+        self._longest = int((self._end - self._start).max()
+                            ) if len(self.stays) else 0
+
+    def _stay_rows(self, traveller, itinerary):
+        """
+        Takes an Itinerary (whose stays are made with itin_to_stays) or an
+        existing stays dataframe and returns its rows for the index, with
+        the arrival and departure turned into day numbers.  Stays without a
+        place (or geo_id, when comparing by geo_id) are left out.
+        """
+        stays = itinerary
+        if not isinstance(itinerary, pd.DataFrame):
+            stays = itinerary.itin_to_stays()
+        rows = pd.DataFrame({'traveller': traveller,
+                             'modern_name': stays['modern_name'].astype(
+                                                                    object)})
+        for col in ['latitude', 'longitude']:
+            rows[col] = (pd.to_numeric(stays[col], errors='coerce')
+                         if col in stays.columns else np.nan)
+        if self.place == 'geo_id':
+            rows['place'] = (normalize_geo_ids(stays['geo_id'])
+                             if 'geo_id' in stays.columns else None)
+        else:
+            rows['place'] = rows['modern_name']
+        rows['start'] = self._day_column(stays['arrival'])
+        rows['end'] = self._day_column(stays['departure'])
+        rows = rows.dropna(subset=['place', 'start', 'end'])
+        return rows.astype({'start': np.int64, 'end': np.int64}
+                           )[STAY_COLUMNS]
+
+    def _day_column(self, dates):
+        """
+        Returns a float array of day numbers from a column of day numbers or
+        of datetime dates (with NaN for blanks).
+        """
+        if pd.api.types.is_numeric_dtype(dates):
+            return pd.to_numeric(dates).to_numpy(dtype=float, na_value=np.nan)
+        days = np.full(len(dates), np.nan)
+        known = dates.notna().to_numpy()
+        parts = [[getattr(date, part) for date in dates[known]]
+                 for part in ('day', 'month', 'year')]
+        days[known] = day_numbers(*parts, calendar='gregorian')
+        return days
+
+    def _overlaps(self, rows1, rows2):
+        """
+        Joins two sets of index rows (each in arrival order) on their dates:
+        for every stay in rows1, the stays in rows2 that arrived no later
+        than it left and no earlier than the longest rows2 stay before it
+        arrived are found by binary search, and those that also left on or
+        after its arrival are kept.  Returns two arrays of matching index
+        rows.
+        """
+        if not len(rows1) or not len(rows2):
+            return np.array([], dtype=int), np.array([], dtype=int)
+        start2 = self._start[rows2]
+        longest = int((self._end[rows2] - start2).max())
+        low = np.searchsorted(start2, self._start[rows1] - longest, 'left')
+        high = np.searchsorted(start2, self._end[rows1], 'right')
+        counts = high - low
+        first = np.repeat(rows1, counts)
+        steps = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) -
+                                                    counts, counts)
+        second = rows2[np.repeat(low, counts) + steps]
+        keep = self._end[second] >= self._start[first]
+        return first[keep], second[keep]
+
+    def _pair_frame(self, first, second):
+        """
+        Builds a dataframe of pairs of stays: both travellers and places,
+        whether the places are the same, the distance between them, the
+        first and last shared day (start, end, and as text), and the number
+        of shared days, ordered by the first shared day.
+        """
+        stays = self.stays
+        start = np.maximum(self._start[first], self._start[second])
+        end = np.minimum(self._end[first], self._end[second])
+        pairs = pd.DataFrame({
+            'traveller1': stays['traveller'].to_numpy()[first],
+            'place1': stays['modern_name'].to_numpy()[first],
+            'traveller2': stays['traveller'].to_numpy()[second],
+            'place2': stays['modern_name'].to_numpy()[second],
+            'same_place': (stays['place'].to_numpy()[first] ==
+                           stays['place'].to_numpy()[second]),
+            'distance': haversine_distance(
+                            stays['latitude'].to_numpy()[first],
+                            stays['longitude'].to_numpy()[first],
+                            stays['latitude'].to_numpy()[second],
+                            stays['longitude'].to_numpy()[second]),
+            'start': start, 'end': end,
+            'start_date': self._date_text(start),
+            'end_date': self._date_text(end),
+            'n_days': end - start + 1})
+        return pairs.sort_values(['start', 'traveller1', 'traveller2'],
+                                 kind='mergesort').reset_index(drop=True)
+
+    def _day(self, date):
+        """
+        Converts a datetime.date, a 'yyyy-mm-dd' string (in the index
+        calendar), or a day number to a day number.  Strings are checked by
+        period_day_numbers, so days that do not exist (such as 1352-02-31)
+        raise a ValueError, as do years or months without a day.
+        """
+        whole_day = (isinstance(date, (int, np.integer, dt.date)) or
+                     (isinstance(date, str) and date.count('-') == 2))
+        if not whole_day:
+            raise ValueError('Enter dates as a datetime.date, "yyyy-mm-dd", '
+                             'or a day number, not {!r}.'.format(date))
+        return period_day_numbers(date, self.calendar)[0]
+
+    def _date_text(self, days):
+        """
+        Converts an array of day numbers into 'yyyy-mm-dd' text in the
+        index calendar.
+        """
+        day, month, year = day_number_dates(np.asarray(days, dtype=np.int64),
+                                            self.calendar)
+        return ['{:04d}-{:02d}-{:02d}'.format(*parts) for parts in
+                zip(year, month, day)]
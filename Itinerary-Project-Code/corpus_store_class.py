@@ -0,0 +1,498 @@
+"""
+-*- coding: utf-8 -*-
+
+corpus_store_class.py
+
+Keeps the whole corpus (gazetteers, itineraries, and itinerary-codes.csv)
+in a single SQLite file, so that the tools can find places, dates, and
+itineraries without reading and joining every CSV again each time.  Like
+the GeonamesCache, the file is an ordinary SQLite database and needs no
+extra packages.
+
+Every gazetteer and itinerary row is saved whole (all of its columns, in
+order), along with separate indexed columns for the values used to look
+rows up:
+    gazetteers - modern_name, geo_id, latitude, and longitude
+    itineraries - itin_code, modern_name, geo_id, and the day number of the
+        date (see date_functions.py), which is blank for incomplete dates
+The indexes let SQLite go straight to the rows for a name, a geo_id, an
+itinerary, or a range of dates, so a lookup reads only the rows it needs
+however large the corpus grows.  Gazetteer and Itinerary can both be
+opened from the store and saved back to it (see store_output), and
+Itinerary.attribute_lookup and Gazetteer.itinerary_labels can take their
+gazetteer or itinerary names from the store instead of from dataframes.
+
+Example:
+    store = CorpusStore('itinerary_corpus.sqlite')
+    store.ingest('itinerary-codes.csv', 'Completed-Itineraries',
+                 ['Gazetteers/Full_Crown_of_Aragon_Gazetteer.csv'])
+    itin = Itinerary('CA_JIR', store=store)
+    itin.attribute_lookup('Full_Crown_of_Aragon_Gazetteer',
+                          ['latitude', 'longitude'], store=store)
+    store.records(modern_name='Zaragoza', start='1300', end='1310')
+
+    Variable List:
+        self.db_file - the SQLite file of the store.
+        self.calendar - the calendar used for the itinerary day numbers
+            ('gregorian' or 'julian').  Day numbers count the same days in
+            both, so itineraries saved in either calendar can be searched
+            together.
+
+    Function List:
+        save_gazetteer(self, name, gaz_df, source=None):
+            Saves (or replaces) a gazetteer dataframe under a name.
+        load_gazetteer(self, name):
+            Returns a saved gazetteer as a dataframe.
+        save_itinerary(self, itin_code, itin_df, source=None):
+            Saves (or replaces) an itinerary dataframe under its code.
+        load_itinerary(self, itin_code):
+            Returns a saved itinerary as a dataframe.
+        save_codes(self, codes_df):
+            Saves the itinerary codes table (itinerary-codes.csv).
+        load_codes(self):
+            Returns the saved itinerary codes table.
+        ingest(self, codes_file, corpus_dir=None, gaz_files=()):
+            Saves the codes file, every datasheet in the corpus folder under
+            its code, and the gazetteer files, all in one step.
+        contents(self):
+            Returns a dataframe listing every saved gazetteer and itinerary.
+        records(self, itin_codes=None, modern_name=None, geo_id=None,
+                start=None, end=None):
+            Returns the itinerary rows, across the corpus, for some
+            itineraries, a place, a geo_id, and/or a range of dates.
+        gazetteer_columns(self, name):
+            Returns the column names of a saved gazetteer.
+        gazetteer_attributes(self, name, keys, attributes,
+                             column='modern_name'):
+            Returns the attributes of the gazetteer rows matching the keys,
+            one row per key (used by Itinerary.attribute_lookup).
+        itinerary_names(self, itin_codes=None, match='modern_name'):
+            Returns the unique names (or geo_ids) of each itinerary with its
+            code (used by Gazetteer.itinerary_labels).
+        close(self):
+            Closes the database file.
+
+    Internal Functions:
+        _save_rows(self, kind, name, df, source, keys):
+            Replaces the rows of one table and lists it in the contents.
+        _load_rows(self, kind, name):
+            Reads the rows of one table back into a dataframe.
+        _frame(self, rows, columns):
+            Builds a dataframe from saved rows with the types read_table
+            would give.
+        _columns(self, kind, name):
+            Returns the saved column names of a table.
+        _text(df, col):
+            Returns a key column as text for the indexes.
+        _json_value(value):
+            Converts numpy numbers and dates for saving as JSON.
+
+@author: Adam Franklin-Lyons
+    Marlboro College | Python 3.7
+
+Created on Sun Oct 18 00:41:27 2026
+"""
+
+import datetime as dt
+import glob
+import json
+import os
+import sqlite3
+import time
+import numpy as np
+import pandas as pd
+from table_io_functions import read_table, normalize_geo_ids, _id_columns
+from date_functions import (date_parts, valid_dates, day_numbers,
+                            period_day_numbers)
+
+# The columns that are indexed, and the text that can be looked up by them.
+KEY_COLUMNS = ['modern_name', 'geo_id']
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS contents (kind TEXT, name TEXT, '
+    'columns TEXT, source TEXT, calendar TEXT, saved REAL, '
+    'PRIMARY KEY (kind, name))',
+    'CREATE TABLE IF NOT EXISTS gazetteer_rows (gazetteer TEXT, '
+    'row INTEGER, modern_name TEXT, geo_id TEXT, latitude REAL, '
+    'longitude REAL, record TEXT, PRIMARY KEY (gazetteer, row))',
+    'CREATE INDEX IF NOT EXISTS gaz_name_idx ON gazetteer_rows '
+    '(gazetteer, modern_name)',
+    'CREATE INDEX IF NOT EXISTS gaz_geo_id_idx ON gazetteer_rows '
+    '(gazetteer, geo_id)',
+    'CREATE TABLE IF NOT EXISTS itinerary_rows (itin_code TEXT, '
+    'row INTEGER, modern_name TEXT, geo_id TEXT, day_number INTEGER, '
+    'record TEXT, PRIMARY KEY (itin_code, row))',
+    'CREATE INDEX IF NOT EXISTS itin_name_idx ON itinerary_rows '
+    '(modern_name, day_number)',
+    'CREATE INDEX IF NOT EXISTS itin_geo_id_idx ON itinerary_rows '
+    '(geo_id, day_number)',
+    'CREATE INDEX IF NOT EXISTS itin_date_idx ON itinerary_rows '
+    '(day_number)',
+    'CREATE INDEX IF NOT EXISTS itin_code_date_idx ON itinerary_rows '
+    '(itin_code, day_number)']
+
+class CorpusStore(object):
+    """
+    A SQLite file holding the gazetteers, itineraries, and itinerary codes
+    of the corpus, indexed by place name, geo_id, itinerary code, and date.
+    """
+
+    def __init__(self, db_file='itinerary_corpus.sqlite',
+                 calendar='gregorian'):
+        """
+        Opens (or creates) the store in db_file.  Itinerary dates are
+        checked and numbered in the calendar when they are saved.
+        """
+        self.db_file = db_file
+        self.calendar = calendar
+        self._conn = sqlite3.connect(db_file)
+        with self._conn:
+            for statement in SCHEMA:
+                self._conn.execute(statement)
+
+    def save_gazetteer(self, name, gaz_df, source=None):
+        """
+        Saves every row of a gazetteer dataframe under the name, replacing
+        any gazetteer already saved with that name.  'source' notes where
+        it came from (such as the file name).
+        """
+        keys = pd.DataFrame({'modern_name': self._text(gaz_df, 'modern_name'),
+                             'geo_id': self._text(gaz_df, 'geo_id')})
+        for col in ['latitude', 'longitude']:
+            keys[col] = (pd.to_numeric(gaz_df[col], errors='coerce').values
+                         if col in gaz_df.columns else np.nan)
+        self._save_rows('gazetteer', name, gaz_df, source, keys)
+
+    def load_gazetteer(self, name):
+        """
+        Returns a saved gazetteer as a dataframe with the same columns, in
+        the same order, as it was saved.
+        """
+        return self._load_rows('gazetteer', name)
+
+    def save_itinerary(self, itin_code, itin_df, source=None):
+        """
+        Saves every row of an itinerary dataframe under its code, replacing
+        any itinerary already saved with that code.  The day number of each
+        complete, real date is saved for the date searches; other rows are
+        still saved, with no day number.
+        """
+        keys = pd.DataFrame({'modern_name': self._text(itin_df,
+                                                       'modern_name'),
+                             'geo_id': self._text(itin_df, 'geo_id')})
+        keys['day_number'] = None
+        if {'day', 'month', 'year'}.issubset(itin_df.columns):
+            day, month, year = date_parts(itin_df)
+            valid = valid_dates(day, month, year, self.calendar)
+            numbers = day_numbers(day, month, year, self.calendar)
+            keys['day_number'] = [int(number) if ok else None for number, ok
+                                  in zip(numbers, valid)]
+        self._save_rows('itinerary', itin_code, itin_df, source, keys)
+
+    def load_itinerary(self, itin_code):
+        """
+        Returns a saved itinerary as a dataframe with the same columns, in
+        the same order, as it was saved.
+        """
+        return self._load_rows('itinerary', itin_code)
+
+    def save_codes(self, codes_df):
+        """
+        Saves the itinerary codes table (the columns of itinerary-codes.csv)
+        in an itinerary_codes table indexed on itinerary_code, replacing the
+        codes saved before.
+        """
+        with self._conn:
+            codes_df.to_sql('itinerary_codes', self._conn, index=False,
+                            if_exists='replace')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS codes_idx ON '
+                               'itinerary_codes (itinerary_code)')
+
+    def load_codes(self):
+        """
+        Returns the saved itinerary codes table (empty if there is none).
+        """
+        try:
+            return pd.read_sql('SELECT * FROM itinerary_codes', self._conn)
+        except pd.errors.DatabaseError:
+            return pd.DataFrame(columns=['itinerary_project',
+                                         'itinerary_full_name',
+                                         'itinerary_code'])
+
+    def ingest(self, codes_file, corpus_dir=None, gaz_files=()):
+        """
+        Fills the store in one step: the codes file, every
+        '*_datasheet.csv' in the corpus folder (and its sub-folders), each
+        saved under the itinerary code matched to it as in
+        batch_corpus_commands.py (or its file name when no code matches),
+        and the gazetteer files, each saved under its file name without the
+        extension.  Returns the contents of the store.
+        """
+        from batch_corpus_commands import match_codes
+        codes_df = pd.read_csv(codes_file)
+        self.save_codes(codes_df)
+        file_paths = []
+        if corpus_dir:
+            file_paths = sorted(glob.glob(os.path.join(
+                            corpus_dir, '**', '*_datasheet.csv'),
+                            recursive=True))
+        for path, itin_code in match_codes(codes_df, file_paths).items():
+            name = os.path.basename(path).split('.')[0]
+            itin_df = read_table(path, error_bad_lines=False,
+                                 encoding='utf-8-sig')
+            self.save_itinerary(itin_code or name, itin_df, source=path)
+        for path in gaz_files:
+            name = os.path.basename(path).split('.')[0]
+            self.save_gazetteer(name, read_table(path, error_bad_lines=False),
+                                source=path)
+        return self.contents()
+
+    def contents(self):
+        """
+        Returns a dataframe with one row for every saved gazetteer and
+        itinerary: its kind, name, number of rows, source, and the time it
+        was saved.
+        """
+        contents = pd.read_sql('SELECT kind, name, source, calendar, saved '
+                               'FROM contents ORDER BY kind, name',
+                               self._conn)
+        counts = pd.read_sql(
+            "SELECT 'gazetteer' AS kind, gazetteer AS name, COUNT(*) AS rows "
+            "FROM gazetteer_rows GROUP BY gazetteer UNION ALL "
+            "SELECT 'itinerary', itin_code, COUNT(*) FROM itinerary_rows "
+            "GROUP BY itin_code", self._conn)
+        contents = contents.merge(counts, on=['kind', 'name'], how='left')
+        contents['saved'] = [dt.datetime.fromtimestamp(saved).isoformat(
+                                timespec='seconds') for saved in
+                             contents['saved']]
+        return contents
+
+    def records(self, itin_codes=None, modern_name=None, geo_id=None,
+                start=None, end=None):
+        """
+        Returns the itinerary rows of the whole corpus that match every
+        condition entered: some itinerary codes (a list), a modern_name, a
+        geo_id, and dates from the beginning of 'start' to the end of 'end'
+        (a year '1300', a month '1352-03', a day '1352-03-15', a date, or a
+        day number - see period_day_numbers).  Each condition is answered by
+        an index, and only the matching rows are read.  The rows are
+        returned in date order (undated rows last) with itin_code, row (the
+        position in the saved itinerary), and day_number columns before the
+        itinerary columns; itineraries with different columns leave the
+        missing ones blank.
+        Example: records(modern_name='Zaragoza', start='1300', end='1310')
+        """
+        where, values = [], []
+        if itin_codes is not None:
+            itin_codes = list(itin_codes)
+            where.append('itin_code IN ({})'.format(
+                                            ', '.join('?' * len(itin_codes))))
+            values += itin_codes
+        if modern_name is not None:
+            where.append('modern_name = ?')
+            values.append(str(modern_name))
+        if geo_id is not None:
+            where.append('geo_id = ?')
+            values.append(normalize_geo_ids(pd.Series([geo_id]))[0])
+        if start is not None:
+            where.append('day_number >= ?')
+            values.append(period_day_numbers(start, self.calendar)[0])
+        if end is not None:
+            where.append('day_number <= ?')
+            values.append(period_day_numbers(end, self.calendar)[1])
+        query = ('SELECT itin_code, row, day_number, record FROM '
+                 'itinerary_rows{} ORDER BY day_number IS NULL, day_number, '
+                 'itin_code, row'.format(' WHERE ' + ' AND '.join(where)
+                                         if where else ''))
+        found_rows = {}
+        for row in self._conn.execute(query, values):
+            found_rows.setdefault(row[0], []).append(row)
+        frames = []
+        for itin_code, found in found_rows.items():
+            frame = self._frame([row[3] for row in found],
+                                self._columns('itinerary', itin_code))
+            frame.insert(0, 'itin_code', itin_code)
+            frame.insert(1, 'row', [row[1] for row in found])
+            frame.insert(2, 'day_number', pd.array([row[2] for row in found],
+                                                   dtype='Int64'))
+            frames.append(frame)
+        if not frames:
+            return pd.DataFrame(columns=['itin_code', 'row', 'day_number'])
+        result = pd.concat(frames, ignore_index=True, sort=False)
+        return result.sort_values(['day_number', 'itin_code', 'row'],
+                                  kind='mergesort', na_position='last'
+                                  ).reset_index(drop=True)
+
+    def gazetteer_columns(self, name):
+        """
+        Returns the column names of a saved gazetteer without reading any of
+        its rows.
+        """
+        return self._columns('gazetteer', name)
+
+    def gazetteer_attributes(self, name, keys, attributes,
+                             column='modern_name'):
+        """
+        Looks up the attributes (column names) of the saved gazetteer rows
+        whose modern_name (or geo_id) is one of the keys, keeping the first
+        row for any repeated name as Itinerary._gaz_index does.  The keys
+        are put in a temporary table and joined to the gazetteer through its
+        index, so only the matching rows are read.  Returns a dataframe of
+        the attributes indexed by key, without the keys that were not found.
+        """
+        if column not in KEY_COLUMNS:
+            raise ValueError('Stored gazetteers can only be matched on {}, '
+                             'not "{}".'.format(' or '.join(KEY_COLUMNS),
+                                                column))
+        columns = self._columns('gazetteer', name)
+        keys = pd.Series(pd.unique(pd.Series(keys).dropna().astype(str)))
+        if column == 'geo_id':
+            keys = normalize_geo_ids(keys)
+        with self._conn:
+            self._conn.execute('CREATE TEMP TABLE IF NOT EXISTS lookup_keys '
+                               '(key TEXT)')
+            self._conn.execute('DELETE FROM lookup_keys')
+            self._conn.executemany('INSERT INTO lookup_keys VALUES (?)',
+                                   [(key,) for key in keys])
+            # SQLite takes the record from the row with the lowest number.
+            rows = self._conn.execute(
+                        'SELECT k.key, g.record, MIN(g.row) FROM lookup_keys '
+                        'k JOIN gazetteer_rows g ON g.gazetteer = ? AND '
+                        'g.{0} = k.key GROUP BY k.key'.format(column),
+                        (name,)).fetchall()
+        found = self._frame([row[1] for row in rows], columns)[attributes]
+        found.index = pd.Index([row[0] for row in rows], name=column)
+        return found
+
+    def itinerary_names(self, itin_codes=None, match='modern_name'):
+        """
+        Returns a dataframe of the unique names (or geo_ids, with
+        match='geo_id') of each saved itinerary with its code, in the order
+        the codes are entered (every saved itinerary by default) and the
+        names first appear.  Only the name and code columns are read, through
+        the indexes, not the whole itinerary.
+        """
+        if match not in KEY_COLUMNS:
+            raise ValueError('Stored itineraries can only be matched on {}, '
+                             'not "{}".'.format(' or '.join(KEY_COLUMNS),
+                                                match))
+        if itin_codes is None:
+            itin_codes = [row[0] for row in self._conn.execute(
+                            "SELECT name FROM contents WHERE kind = "
+                            "'itinerary' ORDER BY name")]
+        frames = [pd.read_sql('SELECT {0} AS name, ? AS itin_code FROM '
+                              'itinerary_rows WHERE itin_code = ? AND {0} IS '
+                              'NOT NULL GROUP BY {0} ORDER BY MIN(row)'.format(
+                                                                        match),
+                              self._conn, params=(itin_code, itin_code))
+                  for itin_code in itin_codes]
+        return pd.concat(frames, ignore_index=True) if frames else \
+            pd.DataFrame(columns=['name', 'itin_code'])
+
+    def close(self):
+        """
+        Closes the connection to the database file.
+        """
+        self._conn.close()
+
+    def _save_rows(self, kind, name, df, source, keys):
+        """
+        Replaces the rows saved under the name with the rows of df.  Each
+        row is saved whole as JSON (every value in column order, blanks as
+        null, dates as yyyy-mm-dd text) next to its indexed key columns, and
+        the column names are kept in the contents table.  Everything is
+        written in one transaction, so a failed save leaves the old rows.
+        """
+        table, name_col = ('gazetteer_rows', 'gazetteer') \
+            if kind == 'gazetteer' else ('itinerary_rows', 'itin_code')
+        values = df.astype(object).where(df.notna(), None).values.tolist()
+        records = [json.dumps(row, default=_json_value, ensure_ascii=False)
+                   for row in values]
+        keys = keys.astype(object).where(keys.notna(), None)
+        rows = [(name, position) + tuple(key) + (record,) for position,
+                (key, record) in enumerate(zip(keys.values.tolist(),
+                                               records))]
+        with self._conn:
+            self._conn.execute('DELETE FROM {} WHERE {} = ?'.format(
+                                                        table, name_col),
+                               (name,))
+            self._conn.executemany('INSERT INTO {} ({}, row, {}, record) '
+                                   'VALUES ({})'.format(
+                                        table, name_col,
+                                        ', '.join(keys.columns),
+                                        ', '.join('?' * (len(keys.columns) +
+                                                         3))), rows)
+            self._conn.execute('INSERT OR REPLACE INTO contents VALUES '
+                               '(?, ?, ?, ?, ?, ?)',
+                               (kind, name, json.dumps([str(col) for col in
+                                                        df.columns]),
+                                source, self.calendar, time.time()))
+
+    def _load_rows(self, kind, name):
+        """
+        Reads every row saved under the name, in the saved order.  Raises a
+        KeyError if nothing of that kind is saved under the name.
+        """
+        columns = self._columns(kind, name)
+        table, name_col = ('gazetteer_rows', 'gazetteer') \
+            if kind == 'gazetteer' else ('itinerary_rows', 'itin_code')
+        rows = self._conn.execute('SELECT record FROM {} WHERE {} = ? ORDER '
+                                  'BY row'.format(table, name_col), (name,))
+        return self._frame([row[0] for row in rows], columns)
+
+    def _frame(self, records, columns):
+        """
+        Turns saved JSON rows back into a dataframe.  As with read_table,
+        columns of numbers (with or without blanks) become number columns,
+        any other column stays as text, blank columns are empty number
+        columns, and geo_id columns are always text.
+        """
+        df = pd.DataFrame([json.loads(record) for record in records],
+                          columns=columns)
+        id_cols = _id_columns(df)
+        for col in df.columns:
+            if col in id_cols:
+                df[col] = normalize_geo_ids(df[col])
+            elif df[col].isna().all():
+                # Blank columns are read from a CSV as empty number columns.
+                df[col] = df[col].astype(float)
+            elif df[col].dtype == object:
+                try:
+                    df[col] = pd.to_numeric(df[col])
+                except (ValueError, TypeError):
+                    pass
+        return df
+
+    def _columns(self, kind, name):
+        """
+        Returns the saved column names of a gazetteer or itinerary.
+        """
+        row = self._conn.execute('SELECT columns FROM contents WHERE kind = ? '
+                                 'AND name = ?', (kind, name)).fetchone()
+        if row is None:
+            raise KeyError('There is no {} saved as "{}" in {}.'.format(
+                                                kind, name, self.db_file))
+        return json.loads(row[0])
+
+    @staticmethod
+    def _text(df, col):
+        """
+        Returns a column as text for the indexed key columns (geo_ids without
+        float endings), or blanks if the dataframe does not have it.
+        """
+        if col not in df.columns:
+            return [None] * len(df)
+        if col == 'geo_id':
+            return normalize_geo_ids(df[col]).values
+        values = df[col].astype(object)
+        return values.where(values.isna(), values.astype(str)).values
+
+def _json_value(value):
+    """
+    Converts the values JSON cannot save directly: numpy numbers become
+    Python numbers and dates become yyyy-mm-dd text.
+    """
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (dt.date, pd.Timestamp)):
+        return value.isoformat()[:10]
+    return str(value)
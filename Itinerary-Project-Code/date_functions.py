@@ -0,0 +1,165 @@
+"""
+-*- coding: utf-8 -*-
+
+date_functions.py
+
+Date functions that check and convert whole day, month, and year columns
+at once instead of building a datetime.date one row at a time.  Dates can be
+checked against the Gregorian calendar (what datetime.date uses for every
+year) or the Julian calendar used in the medieval sources, where every
+fourth year is a leap year (so 29 February 1300 is a real date).
+
+Dates can be kept as day numbers (Julian Day Numbers: the count of days
+since 1 January 4713 BC in the Julian calendar).  These are plain integers,
+so subtracting two gives the number of days between them and sorting them
+sorts the dates, without the year limits of pandas datetimes.
+
+Function List:
+    date_parts(df, columns=('day', 'month', 'year')):
+        Returns the day, month, and year columns as float arrays with any
+        non-numeric cells turned into NaN.
+    valid_dates(day, month, year, calendar='gregorian'):
+        Returns a True/False array marking the complete, real dates.
+    day_numbers(day, month, year, calendar='gregorian'):
+        Returns the Julian Day Number of every date as an integer array.
+        Only meaningful where valid_dates is True.
+    day_number_dates(numbers, calendar='gregorian'):
+        Turns Julian Day Numbers back into day, month, and year arrays.
+    period_day_numbers(period, calendar='gregorian'):
+        Returns the first and last day number of a year, month, or day.
+
+Functions called by main Function List:
+    _leap_years(year, calendar):
+        Returns a True/False array of leap years for the calendar.
+
+@author: Adam Franklin-Lyons
+    Marlboro College | Python 3.7
+
+Created on Sat Oct 17 15:21:09 2026
+"""
+
+import datetime as dt
+import numpy as np
+import pandas as pd
+
+# Days in each month of a common year (index 0 is unused).
+MONTH_DAYS = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+CALENDARS = ['gregorian', 'julian']
+
+def date_parts(df, columns=('day', 'month', 'year')):
+    """
+    Takes a dataframe and returns the day, month, and year columns as float
+    arrays.  Every cell is coerced to a number, so text or other bad entries
+    become NaN just as they would for pd.to_numeric with errors='coerce'.
+    """
+    return [pd.to_numeric(df[col], errors='coerce').values.astype(float)
+            for col in columns]
+
+def valid_dates(day, month, year, calendar='gregorian'):
+    """
+    Checks every date at once and returns True where the day, month, and
+    year are whole numbers that make a real date in the calendar: years
+    from 1 to 9999, months from 1 to 12, and days that exist in the month
+    (including 29 February in leap years).  Blank or partial dates return
+    False.
+    """
+    if calendar not in CALENDARS:
+        raise ValueError('The calendar must be "gregorian" or "julian", '
+                         'not "{}".'.format(calendar))
+    day, month, year = (np.asarray(col, dtype=float)
+                        for col in (day, month, year))
+    with np.errstate(invalid='ignore'):
+        whole = ((day % 1 == 0) & (month % 1 == 0) & (year % 1 == 0))
+        valid = (whole & (year >= 1) & (year <= 9999) &
+                 (month >= 1) & (month <= 12) & (day >= 1))
+    month_num = np.where(valid, month, 1).astype(int)
+    year_num = np.where(valid, year, 1).astype(int)
+    last_day = (MONTH_DAYS[month_num] +
+                ((month_num == 2) & _leap_years(year_num, calendar)))
+    return valid & (np.where(valid, day, 0) <= last_day)
+
+def day_numbers(day, month, year, calendar='gregorian'):
+    """
+    Returns the Julian Day Number for every date as an int64 array.  Both
+    calendars count on the same scale, so a Julian calendar date and the
+    Gregorian date for the same day have the same number.  Invalid or
+    blank dates return meaningless numbers, so check them with valid_dates
+    first.
+    """
+    day, month, year = (np.nan_to_num(np.asarray(col, dtype=float)
+                                      ).astype(np.int64)
+                        for col in (day, month, year))
+    shift = (14 - month) // 12
+    year = year + 4800 - shift
+    month = month + 12 * shift - 3
+    number = day + (153 * month + 2) // 5 + 365 * year + year // 4
+    if calendar == 'julian':
+        return number - 32083
+    return number - year // 100 + year // 400 - 32045
+
+def day_number_dates(numbers, calendar='gregorian'):
+    """
+    Converts Julian Day Numbers back to day, month, and year integer arrays
+    in the chosen calendar (the reverse of day_numbers).
+    """
+    numbers = np.asarray(numbers, dtype=np.int64)
+    if calendar == 'julian':
+        base = numbers + 1401
+    else:
+        base = (numbers + 1401 +
+                (((4 * numbers + 274277) // 146097) * 3) // 4 - 38)
+    era = 4 * base + 3
+    part = 5 * ((era % 1461) // 4) + 2
+    day = (part % 153) // 5 + 1
+    month = (part // 153 + 2) % 12 + 1
+    year = era // 1461 - 4716 + (14 - month) // 12
+    return day, month, year
+
+def period_day_numbers(period, calendar='gregorian'):
+    """
+    Takes a period of time and returns the day numbers of its first and last
+    day.  The period can be text for a whole year ('1352'), a month
+    ('1352-03'), or a day ('1352-03-15') in the chosen calendar, a
+    datetime.date, or a day number (which is both the first and last day).
+    Example: '1352-03' returns the day numbers of 1 and 31 March 1352.
+    Months outside 1-12, years below 1, and days that do not exist raise a
+    ValueError.
+    """
+    if isinstance(period, (int, np.integer)):
+        return int(period), int(period)
+    if isinstance(period, dt.date):
+        number = day_numbers([period.day], [period.month], [period.year])[0]
+        return int(number), int(number)
+    try:
+        parts = [int(part) for part in str(period).split('-')]
+    except ValueError:
+        parts = []
+    if not 1 <= len(parts) <= 3:
+        raise ValueError('Enter the period as "yyyy", "yyyy-mm", '
+                         '"yyyy-mm-dd", a date, or a day number, not '
+                         '{!r}.'.format(period))
+    year, month, day = (parts + [None, None])[:3]
+    check = [1 if part is None else part for part in (day, month)]
+    if not valid_dates([check[0]], [check[1]], [year], calendar)[0]:
+        raise ValueError('{} is not a date in the {} calendar.'.format(
+                                                        period, calendar))
+    if day is not None:
+        number = day_numbers([day], [month], [year], calendar)[0]
+        return int(number), int(number)
+    # The period ends the day before the next month or year begins.
+    start = [1, check[1], year]
+    after = [1, month + 1, year] if month is not None else [1, 1, year + 1]
+    if after[1] == 13:
+        after = [1, 1, year + 1]
+    first, following = day_numbers(*zip(start, after), calendar=calendar)
+    return int(first), int(following - 1)
+
+def _leap_years(year, calendar):
+    """
+    Every fourth year is a leap year in the Julian calendar; the Gregorian
+    calendar skips century years not divisible by 400.
+    """
+    leap = year % 4 == 0
+    if calendar == 'gregorian':
+        leap &= (year % 100 != 0) | (year % 400 == 0)
+    return leap
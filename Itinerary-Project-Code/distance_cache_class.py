@@ -0,0 +1,270 @@
+"""
+-*- coding: utf-8 -*-
+
+distance_cache_class.py
+
+A store of the distances between pairs of places, keyed by their geo_ids,
+so that trips between places already seen (Barcelona to Zaragoza, Valencia
+to Barcelona, and so on, repeated thousands of times across the corpus)
+reuse the distance rather than recalculating it.  The distances come from
+two places:
+    matrix - an optional table of the distance between every pair of places
+        in a gazetteer, built once with build_matrix and saved to a .npz
+        file so that later runs (or every process of a batch run) load it
+        instead of doing any calculation
+    memory - every other pair is calculated the first time it is needed and
+        kept in a least-recently-used store of up to max_size pairs
+Distances are the same in both directions, so each pair is only stored
+once, and every lookup works on whole columns of trips at once.  Trips
+where either place has no geo_id are calculated directly.
+
+Each stored distance also keeps the coordinates it was calculated from.
+The same geo_id is sometimes entered with slightly different coordinates
+(two names for one place in a gazetteer, or coordinates typed into an
+itinerary), so a stored distance is only used when the coordinates are
+the same as well; otherwise it is calculated again.  The distances are
+therefore always the same as those calculated without the cache.
+
+Example:
+    cache = DistanceCache('aragon_distances.npz')
+    if cache.matrix is None:
+        cache.build_matrix(gaz_df)
+        cache.save_matrix()
+    trips = itin.itin_to_trips(distance_cache=cache)
+
+    Variable List:
+        self.matrix_file - the .npz file of the saved matrix (or None).
+        self.matrix - the distance between every pair of matrix places in
+            kilometers (a square numpy array) or None.
+        self.matrix_ids - the geo_id (as text) of each row of the matrix.
+        self.matrix_method - 'haversine' or 'ellipsoid', the method used
+            for the matrix.
+        self.matrix_coords - the latitude and longitude of each row of the
+            matrix.
+        self.max_size - the most pairs kept in memory.
+        self.pairs - the pairs kept in memory, oldest first, each with its
+            distance and the coordinates of both places.
+        self.hits - the number of trips whose distance was stored.
+        self.misses - the number of trips that had to be calculated.
+
+    Function List:
+        distances(self, ids1, ids2, lat1, long1, lat2, long2,
+                  method='haversine'):
+            Returns the distances for whole columns of place pairs, using
+            stored distances wherever possible.
+        trip_distances(self, trip_df, method='haversine'):
+            The same for a trips dataframe (see Itinerary.itin_to_trips).
+        build_matrix(self, gaz_df, method='haversine'):
+            Calculates the distance between every pair of gazetteer places
+            with geo_ids and coordinates.
+        save_matrix(self, file_name=None):
+            Saves the matrix as a .npz file.
+        load_matrix(self, file_name):
+            Reads a saved matrix.
+        stats(self):
+            Returns the hits, misses, and sizes of the stores.
+
+    Internal Functions:
+        _from_matrix(self, ids1, ids2, coords, result, method):
+            Fills in the distances of pairs in the matrix.
+        _from_memory(self, keys, rows, coords, result, method):
+            Fills in the remaining distances from memory, calculating and
+            storing the new ones.
+
+@author: Adam Franklin-Lyons
+    Marlboro College | Python 3.7
+
+Created on Sat Oct 17 22:48:19 2026
+"""
+
+from collections import OrderedDict
+import os
+import numpy as np
+import pandas as pd
+from distance_functions import haversine_distance, ellipsoid_distance
+from table_io_functions import normalize_geo_ids
+
+METHODS = {'haversine': haversine_distance, 'ellipsoid': ellipsoid_distance}
+
+class DistanceCache(object):
+    """
+    Keeps the distances between pairs of places (by geo_id) in memory and,
+    optionally, in a saved matrix for a whole gazetteer.
+    """
+
+    def __init__(self, matrix_file=None, max_size=100000):
+        """
+        Prepares an empty store of up to max_size pairs.  If matrix_file is
+        entered and already exists, the saved matrix is loaded as well; a
+        matrix built later is saved to that file by save_matrix.
+        """
+        self.matrix_file = matrix_file
+        self.matrix = None
+        self.matrix_ids = np.array([], dtype=object)
+        self.matrix_method = None
+        self.matrix_coords = np.empty((0, 2))
+        self._positions = {}
+        self.max_size = max_size
+        self.pairs = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if matrix_file and os.path.exists(matrix_file):
+            self.load_matrix(matrix_file)
+
+    def distances(self, ids1, ids2, lat1, long1, lat2, long2,
+                  method='haversine'):
+        """
+        Takes two columns of geo_ids and the coordinates of both places and
+        returns an array of distances in kilometers.  Pairs in the matrix
+        are read from it, pairs already in memory are read from there, and
+        only the rest are calculated (all at once) and stored.  Rows without
+        both geo_ids, or with coordinates that differ from the stored ones,
+        are always calculated.
+        """
+        if method not in METHODS:
+            raise ValueError('The distance method must be "haversine" or '
+                             '"ellipsoid", not "{}".'.format(method))
+        ids1 = normalize_geo_ids(pd.Series(np.asarray(ids1, dtype=object))
+                                 ).values
+        ids2 = normalize_geo_ids(pd.Series(np.asarray(ids2, dtype=object))
+                                 ).values
+        coords = [np.asarray(col, dtype=float) for col in
+                  (lat1, long1, lat2, long2)]
+        result = np.full(len(ids1), np.nan)
+        keyed = pd.notna(ids1) & pd.notna(ids2)
+        done = self._from_matrix(ids1, ids2, coords, result, method) & keyed
+        rows = np.flatnonzero(keyed & ~done)
+        # Each key lists the lower geo_id first, with its coordinates.
+        keys = [(method, a, b, la, ga, lb, gb) if a <= b else
+                (method, b, a, lb, gb, la, ga) for a, b, la, ga, lb, gb in
+                zip(ids1[rows], ids2[rows], *[col[rows] for col in coords])]
+        self._from_memory(keys, rows, coords, result, method)
+        loose = np.flatnonzero(~keyed)
+        if loose.size:
+            result[loose] = METHODS[method](*[col[loose] for col in coords])
+        return result
+
+    def trip_distances(self, trip_df, method='haversine', origin='origin_',
+                       dest='dest_'):
+        """
+        Returns the distance of every trip in a trips dataframe, using the
+        origin and destination geo_id columns as the keys.  Trips dataframes
+        without geo_ids are calculated as trip_distances would.
+        """
+        coords = [trip_df[side + col] for side in (origin, dest)
+                  for col in ('latitude', 'longitude')]
+        if origin + 'geo_id' not in trip_df.columns:
+            blank = [None] * len(trip_df)
+            return self.distances(blank, blank, *coords, method=method)
+        return self.distances(trip_df[origin + 'geo_id'],
+                              trip_df[dest + 'geo_id'], *coords,
+                              method=method)
+
+    def build_matrix(self, gaz_df, method='haversine'):
+        """
+        Calculates the distance between every pair of places in a gazetteer
+        dataframe that has a geo_id and coordinates (the first row of any
+        repeated geo_id is used).  A gazetteer of 1000 places makes a
+        matrix of a million distances, about 8 MB.  Returns the matrix.
+        """
+        ids = normalize_geo_ids(gaz_df['geo_id'])
+        lat, lng = [pd.to_numeric(gaz_df[col], errors='coerce').values
+                    for col in ('latitude', 'longitude')]
+        keep = (ids.notna().values & ~np.isnan(lat) & ~np.isnan(lng) &
+                ~ids.duplicated().values)
+        lat, lng = lat[keep], lng[keep]
+        self.matrix_coords = np.column_stack([lat, lng])
+        self.matrix = METHODS[method](lat[:, None], lng[:, None],
+                                      lat[None, :], lng[None, :])
+        self.matrix_ids = ids.values[keep]
+        self.matrix_method = method
+        self._positions = {geo_id: pos for pos, geo_id in
+                           enumerate(self.matrix_ids)}
+        return self.matrix
+
+    def save_matrix(self, file_name=None):
+        """
+        Saves the matrix, its geo_ids and coordinates, and its method in a
+        compressed .npz file (matrix_file by default).
+        """
+        file_name = file_name or self.matrix_file
+        if self.matrix is None or not file_name:
+            raise ValueError('There is no matrix or file name to save.')
+        np.savez_compressed(file_name, matrix=self.matrix,
+                            ids=self.matrix_ids.astype(str),
+                            coords=self.matrix_coords,
+                            method=np.array(self.matrix_method))
+
+    def load_matrix(self, file_name):
+        """
+        Reads a matrix saved by save_matrix.
+        """
+        with np.load(file_name, allow_pickle=False) as saved:
+            self.matrix = saved['matrix']
+            self.matrix_ids = saved['ids'].astype(object)
+            self.matrix_coords = saved['coords']
+            self.matrix_method = str(saved['method'])
+        self._positions = {geo_id: pos for pos, geo_id in
+                           enumerate(self.matrix_ids)}
+
+    def stats(self):
+        """
+        Returns a dictionary of the hits, misses, pairs in memory, and
+        places in the matrix.
+        """
+        return {'hits': self.hits, 'misses': self.misses,
+                'pairs': len(self.pairs),
+                'matrix_places': len(self.matrix_ids)}
+
+    def _from_matrix(self, ids1, ids2, coords, result, method):
+        """
+        Fills result with the matrix distance of every pair whose places are
+        both in the matrix with the same coordinates (if it was built with
+        the same method) and returns an array of True/False for the rows
+        filled.
+        """
+        if self.matrix is None or method != self.matrix_method:
+            return np.zeros(len(ids1), dtype=bool)
+        pos1 = pd.Series(ids1).map(self._positions).values
+        pos2 = pd.Series(ids2).map(self._positions).values
+        found = ~(pd.isna(pos1) | pd.isna(pos2))
+        for pos, lat, lng in [(pos1, coords[0], coords[1]),
+                              (pos2, coords[2], coords[3])]:
+            rows = np.flatnonzero(found)
+            place = self.matrix_coords[pos[rows].astype(int)]
+            found[rows] = ((place[:, 0] == lat[rows]) &
+                           (place[:, 1] == lng[rows]))
+        result[found] = self.matrix[pos1[found].astype(int),
+                                    pos2[found].astype(int)]
+        self.hits += int(found.sum())
+        return found
+
+    def _from_memory(self, keys, rows, coords, result, method):
+        """
+        Fills in the rows whose keys (the method, the sorted geo_ids, and
+        their coordinates) are stored in memory, moving them to the newest
+        end, then calculates the rest in one call and stores each new pair.
+        The oldest pairs are dropped past max_size.
+        """
+        missing = []
+        for key, row in zip(keys, rows):
+            stored = self.pairs.get(key)
+            if stored is None:
+                missing.append(row)
+            else:
+                self.pairs.move_to_end(key)
+                result[row] = stored
+        self.hits += len(rows) - len(missing)
+        self.misses += len(missing)
+        if not missing:
+            return None
+        missing = np.array(missing, dtype=int)
+        result[missing] = METHODS[method](*[col[missing] for col in coords])
+        where = dict(zip(rows, keys))
+        for row in missing:
+            key = where[row]
+            if key not in self.pairs and not np.isnan(result[row]):
+                self.pairs[key] = result[row]
+        while len(self.pairs) > self.max_size:
+            self.pairs.popitem(last=False)
+        return None
@@ -0,0 +1,321 @@
+"""
+-*- coding: utf-8 -*-
+
+duplicate_finder_class.py
+
+Finds places that are entered more than once in a gazetteer, such as a
+gazetteer merged from several projects.  The merge in check_existing_gaz
+only joins rows with the same geo_id, and the 70% Levenshtein test of
+_name_match misses shortened or reordered names ('abalate' and 'albalate de
+cinca').  Here the possible duplicates are found in three steps.
+
+Blocking - instead of comparing every pair of rows (far too many for a
+large gazetteer), only rows that share a block become candidate pairs:
+    spatial - places within radius_km of each other (a KD-tree, see
+        Gazetteer.spatial_index)
+    name - names sharing at least min_shared three letter pieces (n-grams)
+        such as 'bal' or 'ate'.  Pieces found in more than max_block names
+        ('san' or 'ell') say little about a match and are skipped, so the
+        number of pairs grows with the number of rows rather than its
+        square.
+    geo_id - rows with the same geo_id
+Scoring - each candidate pair is compared with three name measures on the
+lowercased names without accents or punctuation:
+    levenshtein - the lev.ratio used throughout the project
+    token_set - the words both names share count as a perfect match, so
+        word order and extra words matter less ('Sant Cugat' and 'Cugat,
+        Sant')
+    prefix - the shorter name against the same number of words at the
+        start of the longer name ('abalate' and 'albalate')
+The score is the average of the three, and when both places have
+coordinates it is weighted together with how close they are (1 for the
+same spot, 0 at radius_km or further).
+Clustering - pairs scoring at least the threshold are joined into clusters
+(every row linked to another through any chain of pairs), numbered from 1
+in order of their best pair.
+
+Example:
+    finder = DuplicateFinder(gaz_df, radius_km=5)
+    pairs = finder.candidate_pairs()
+    clusters = finder.clusters(pairs)
+
+    Variable List:
+        self.gaz_df - the gazetteer dataframe being checked.
+        self.keys - the simplified name of every row ('' for blank names).
+        self.radius_km - the distance for spatial blocks and closeness.
+        self.threshold - the score needed for a pair to join a cluster.
+        self.max_block - the largest name block that is used.
+        self.min_shared - the n-grams two names must share to be compared.
+
+    Function List:
+        candidate_pairs(self):
+            Returns a DataFrame of every candidate pair with its distance,
+            the three name measures, and the score, best score first.
+        clusters(self, pairs=None):
+            Returns a Series (on the gazetteer index) with the cluster
+            number of every row in a cluster and blanks for all others.
+
+    Internal Functions:
+        _spatial_pairs(self):
+            Returns the pairs of rows within radius_km of each other.
+        _name_pairs(self):
+            Returns the pairs of rows sharing enough uncommon n-grams.
+        _geo_id_pairs(self):
+            Returns the pairs of rows with the same geo_id.
+        _score(self, pairs):
+            Adds the name measures, distance, and score to the pairs.
+
+Functions:
+    simplify_name(name):
+        Lowercases a name and removes accents and punctuation.
+    token_set_ratio(name1, name2):
+        The similarity of two names by the words they share.
+    prefix_ratio(name1, name2):
+        The similarity of the shorter name and the start of the longer one.
+
+@author: Adam Franklin-Lyons
+    Marlboro College | Python 3.7
+
+Created on Sat Oct 17 22:15:06 2026
+"""
+
+import re
+import unicodedata
+import numpy as np
+import pandas as pd
+import Levenshtein as lev
+from distance_functions import (haversine_distance, unit_sphere_points,
+                                chord_length)
+from table_io_functions import normalize_geo_ids
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+# The length of the name pieces used for the name blocks.
+NGRAM = 3
+# The columns of the pairs dataframe.
+PAIR_COLUMNS = ['row_a', 'row_b', 'name_a', 'name_b', 'geo_id_a', 'geo_id_b',
+                'same_geo_id', 'distance', 'levenshtein', 'token_set',
+                'prefix', 'score']
+
+class DuplicateFinder:
+
+    def __init__(self, gaz_df, radius_km=5.0, threshold=0.75, max_block=50,
+                 min_shared=2):
+        """
+        Takes a gazetteer dataframe (with at least a modern_name column;
+        latitude, longitude, and geo_id are used when present) and
+        simplifies every name once for the blocks and scores.
+        """
+        self.gaz_df = gaz_df
+        self.radius_km = radius_km
+        self.threshold = threshold
+        self.max_block = max_block
+        self.min_shared = min_shared
+        self.keys = [simplify_name(name) for name in gaz_df['modern_name']]
+        if {'latitude', 'longitude'}.issubset(gaz_df.columns):
+            self._lat, self._lng = [pd.to_numeric(gaz_df[col],
+                                    errors='coerce').values.astype(float)
+                                    for col in ['latitude', 'longitude']]
+        else:
+            self._lat = self._lng = np.full(len(gaz_df), np.nan)
+
+    def candidate_pairs(self):
+        """
+        Joins the spatial, name, and geo_id blocks into one list of pairs
+        (each pair once, as row positions with the lower one first), scores
+        them, and returns them best first.  Pairs of rows with the same name
+        and coordinates score 1.
+        """
+        blocks = [self._spatial_pairs(), self._name_pairs(),
+                  self._geo_id_pairs()]
+        pairs = np.unique(np.vstack(blocks), axis=0)
+        return self._score(pairs)
+
+    def clusters(self, pairs=None):
+        """
+        Joins every pair scoring at least the threshold into clusters with a
+        simple union-find: each row points toward the first row of its
+        cluster, so any chain of pairs ends up in one cluster.  Returns a
+        nullable integer Series on the gazetteer index, numbered from 1 in
+        the order of the best pair of each cluster, with blanks for rows
+        without a duplicate.
+        """
+        if pairs is None:
+            pairs = self.candidate_pairs()
+        positions = {row: pos for pos, row in enumerate(self.gaz_df.index)}
+        parent = list(range(len(self.gaz_df)))
+
+        def root(pos):
+            while parent[pos] != pos:
+                parent[pos] = parent[parent[pos]]
+                pos = parent[pos]
+            return pos
+
+        good = pairs[pairs['score'] >= self.threshold]
+        for row_a, row_b in zip(good['row_a'], good['row_b']):
+            first, second = root(positions[row_a]), root(positions[row_b])
+            if first != second:
+                parent[max(first, second)] = min(first, second)
+        numbers = {}
+        for row in good['row_a']:
+            numbers.setdefault(root(positions[row]), len(numbers) + 1)
+        return pd.Series([numbers.get(root(pos)) for pos in
+                          range(len(parent))], index=self.gaz_df.index,
+                         dtype='Int64')
+
+    def _spatial_pairs(self):
+        """
+        Returns an array of the row position pairs within radius_km of each
+        other from a KD-tree of the coordinates.  Without scipy (or without
+        coordinates) there are no spatial pairs.
+        """
+        rows = np.flatnonzero(~(np.isnan(self._lat) | np.isnan(self._lng)))
+        if cKDTree is None or rows.size < 2:
+            return np.empty((0, 2), dtype=int)
+        tree = cKDTree(unit_sphere_points(self._lat[rows], self._lng[rows]))
+        pairs = tree.query_pairs(chord_length(self.radius_km),
+                                 output_type='ndarray')
+        return np.sort(rows[pairs], axis=1)
+
+    def _name_pairs(self):
+        """
+        Puts every row into the block of each n-gram of its simplified name
+        (spaces removed), skips the blocks larger than max_block, and
+        returns the pairs of rows that share at least min_shared of the
+        remaining blocks (or all of them for names with fewer n-grams).
+        """
+        blocks = {}
+        grams = []
+        for pos, key in enumerate(self.keys):
+            word = key.replace(' ', '')
+            found = {word[num:num + NGRAM] for num in
+                     range(max(len(word) - NGRAM + 1, 0))}
+            grams.append(len(found))
+            for gram in found:
+                blocks.setdefault(gram, []).append(pos)
+        pieces = []
+        for members in blocks.values():
+            if 1 < len(members) <= self.max_block:
+                members = np.array(members)
+                first, second = np.triu_indices(len(members), 1)
+                pieces.append(np.column_stack([members[first],
+                                               members[second]]))
+        if not pieces:
+            return np.empty((0, 2), dtype=int)
+        pairs, shared = np.unique(np.vstack(pieces), axis=0,
+                                  return_counts=True)
+        grams = np.array(grams)
+        needed = np.minimum(self.min_shared, np.minimum(grams[pairs[:, 0]],
+                                                        grams[pairs[:, 1]]))
+        return pairs[shared >= needed]
+
+    def _geo_id_pairs(self):
+        """
+        Returns the pairs of rows that have the same geo_id, as the merge of
+        check_existing_gaz would join them.
+        """
+        if 'geo_id' not in self.gaz_df.columns:
+            return np.empty((0, 2), dtype=int)
+        ids = normalize_geo_ids(self.gaz_df['geo_id']).reset_index(
+                                                        drop=True).dropna()
+        pieces = []
+        for positions in ids.groupby(ids).indices.values():
+            if len(positions) > 1:
+                positions = ids.index.values[positions]
+                first, second = np.triu_indices(len(positions), 1)
+                pieces.append(np.column_stack([positions[first],
+                                               positions[second]]))
+        if not pieces:
+            return np.empty((0, 2), dtype=int)
+        return np.vstack(pieces)
+
+    def _score(self, pairs):
+        """
+        Builds the pairs dataframe: the gazetteer index, name, and geo_id of
+        both rows, whether the geo_ids are the same (blank if either is
+        missing), the distance in kilometers, the three name measures, and
+        the score.  Pairs where a name is blank only score on closeness.
+        """
+        first, second = pairs[:, 0], pairs[:, 1]
+        names = self.gaz_df['modern_name'].values
+        frame = pd.DataFrame({'row_a': self.gaz_df.index[first],
+                              'row_b': self.gaz_df.index[second],
+                              'name_a': names[first],
+                              'name_b': names[second]})
+        if 'geo_id' in self.gaz_df.columns:
+            ids = normalize_geo_ids(self.gaz_df['geo_id']).values
+            frame['geo_id_a'], frame['geo_id_b'] = ids[first], ids[second]
+            same = pd.Series(ids[first] == ids[second], dtype='boolean')
+            same[~(pd.notna(ids[first]) & pd.notna(ids[second]))] = pd.NA
+            frame['same_geo_id'] = same.values
+        else:
+            frame['geo_id_a'] = frame['geo_id_b'] = None
+            frame['same_geo_id'] = pd.array([pd.NA] * len(frame),
+                                            dtype='boolean')
+        frame['distance'] = haversine_distance(self._lat[first],
+                                               self._lng[first],
+                                               self._lat[second],
+                                               self._lng[second])
+        measures = [(lev.ratio(self.keys[a], self.keys[b]),
+                     token_set_ratio(self.keys[a], self.keys[b]),
+                     prefix_ratio(self.keys[a], self.keys[b]))
+                    if self.keys[a] and self.keys[b] else (np.nan,) * 3
+                    for a, b in zip(first, second)]
+        measures = np.array(measures, dtype=float).reshape(-1, 3)
+        frame['levenshtein'] = measures[:, 0]
+        frame['token_set'] = measures[:, 1]
+        frame['prefix'] = measures[:, 2]
+        name_score = measures.mean(axis=1)
+        closeness = 1 - np.minimum(frame['distance'].values /
+                                   self.radius_km, 1)
+        score = np.where(np.isnan(closeness), name_score,
+                         0.75 * name_score + 0.25 * closeness)
+        frame['score'] = np.where(np.isnan(name_score), 0.25 * closeness,
+                                  score)
+        frame = frame[PAIR_COLUMNS].sort_values(['score', 'distance'],
+                                                ascending=[False, True],
+                                                kind='mergesort')
+        return frame.reset_index(drop=True)
+
+def simplify_name(name):
+    """
+    Returns the name in lowercase without accents ('Alagón' becomes
+    'alagon') and with punctuation replaced by single spaces.  Blank or
+    non-text names return ''.
+    """
+    if not isinstance(name, str):
+        return ''
+    name = unicodedata.normalize('NFKD', name.lower())
+    name = ''.join(char for char in name if not unicodedata.combining(char))
+    return ' '.join(re.split(r'[\W_]+', name)).strip()
+
+def token_set_ratio(name1, name2):
+    """
+    Compares the words of two names as sets: the shared words (sorted) are
+    compared with each name's shared words plus its other words, and with
+    each other, and the best lev.ratio is kept.  Names where one holds all
+    the words of the other score 1.
+    """
+    words1, words2 = set(name1.split()), set(name2.split())
+    shared = ' '.join(sorted(words1 & words2))
+    whole1 = ' '.join(filter(None, [shared, ' '.join(sorted(words1 -
+                                                              words2))]))
+    whole2 = ' '.join(filter(None, [shared, ' '.join(sorted(words2 -
+                                                              words1))]))
+    ratios = [lev.ratio(whole1, whole2)]
+    if shared:
+        ratios += [lev.ratio(shared, whole1), lev.ratio(shared, whole2)]
+    return max(ratios)
+
+def prefix_ratio(name1, name2):
+    """
+    Compares the shorter name (in words) with the same number of words at
+    the start of the longer name, so 'abalate' is compared with 'albalate'
+    rather than all of 'albalate de cinca'.
+    """
+    words1, words2 = name1.split(), name2.split()
+    if len(words1) > len(words2):
+        words1, words2 = words2, words1
+    return lev.ratio(' '.join(words1), ' '.join(words2[:len(words1)]))
@@ -6,7 +6,8 @@ gazetteer_class.py
 A class meant to wrap up several functions for organizing and searching a
 gazetteer of place names generated for medieval travel and locations.
 The class based on a Pandas dataframe, reading in a csv to the class and
-exporting the modified data back to a new csv.
+exporting the modified data back to a new csv.  Parquet and Feather files
+also work for both (chosen by the file extension - see table_io_functions).
 
 The class also uses a secondary class called "geonames_lookup" that creates
 url's to call data from geonames.org.  The basic search used in the gazetteer
@@ -16,6 +17,26 @@ and other attributes.  The gazetteer processes only those first three,
 dropping the other attributes after lookup.  The name_lookup will not run
 unless the proper columns are present.
 
+Instead of geonames.org, the gazetteer can also look up places in a
+downloaded geonames dump file by entering the file as geonames_dump (see
+geonames_dump_class.py).  Everything else works the same, but no username
+or internet connection is needed and there are no lookup limits.
+
+Gazetteers that are revised by hand can be opened with incremental=True.
+Each row then keeps a row_hash (a short code made from the modern_name and
+the coordinates) in the saved file, and the next run only verifies and
+looks up the rows that were added or changed since then.  Rows whose
+coordinates changed have their old geo_id, name_match, and guess columns
+cleared first, and rows whose name changed have their itin_list cleared so
+they are labelled again.
+
+Proximity questions can also be answered from the gazetteer itself rather
+than from geonames.org: the latitude and longitude of every place are held
+in a KD-tree (built once with scipy and rebuilt only when the coordinates
+change), which finds the nearest places, the places within a distance,
+places entered twice under different names, and the places closest to
+itinerary rows that have coordinates but no name.
+
 The program also outputs the index name or number for all online searches
 executed.  The creation of the class only needs to set monitor to False to
 turn this off, but it helps me know where in a long list of url searches
@@ -34,14 +55,40 @@ the program is.
             see: http://www.geonames.org/export/web-services.html
         self.empty - tracks which cells in the geo_id column are filled in or
             not to prevent duplicate searches of already discovered matches.
+        self.cache_file - the SQLite file where geonames answers are saved
+            (see GeonamesCache) or None to always search online.  The file
+            is only opened (and created) by the first geoname_id_lookup.
+        self.journal - the answers read from (and being added to) the lookup
+            journal file, keyed by search type and row (see _read_journal).
+        self.journal_file - the journal file for the current lookup or None.
+        self.geonames - the Geonames lookup used for every search, created
+            once with the cache so repeated coordinates are not re-queried
+            and with a RateLimiter that keeps every search (in any thread)
+            within the geonames hourly and daily limits.  With a
+            geonames_dump this is a GeonamesDump for offline searches.
+        self.geonames_dump - the loaded GeonamesDump or None when searching
+            geonames.org (shared with gazetteers opened for comparison).
+        self.incremental - True/False - whether to only process the rows
+            that were added or changed since the row_hash column was saved.
+        self.row_hashes - the current row_hash of every row (see
+            _row_hashes), saved to the row_hash column as rows are finished.
+        self.changed - the rows whose saved row_hash is missing or different
+            from the current one (every row when incremental is False).
+        self.instrument - an Instrument (see instrument_class.py) shared with
+            self.geonames that records the time of each main function and
+            each step of the geonames lookup, or None.
 
     Function List:
         csv_output(self, out_file_name, name_lookup=False) - requires a file
-            name where it prints the gaz_df DataFrame.  The function can
+            name where it prints the gaz_df DataFrame (as a csv, parquet, or
+            feather file depending on the extension).  The function can
             optionally be instructed to do a name search in the geonames.org
             database; 'double' does the first name search and then a broader
             version of the same search for any geographic name, not just
             populated places.
+        store_output(self, store, name=None):
+            Saves the gaz_df in a CorpusStore (see corpus_store_class.py)
+            under the gazetteer's name.
         check_existing_gaz(self, existing_gaz_file, save=False,
                            merge=False, drop_matches=True, merge_file=None):
             Takes two Gazetteers, one self and a second, and does a full
@@ -54,14 +101,46 @@ the program is.
             will output a single unified gazetteer with exact matches dropped
             as duplicates and possible matches unified with a similar_names
             column for checking.  The output includes a summary txt file.
-        itinerary_labels(self, itin_df, itin_code, match='modern_name'):
+        itinerary_labels(self, itin_df, itin_code, match='modern_name',
+                         store=None):
             Takes a given itinerary, goes through the Gazetteer, and adds the
             entered itinerary code to the itin_list column.  If the column
             does not exist it creates the column, and if there are already
             entries, it adds new labels separated by semi-colons.  Blank
             entries are filled with the new code; entries not found print a
-            message with the missing name.
-        geoname_id_lookup(self, number='single'):
+            message with the missing name.  With a CorpusStore, the names of
+            the itinerary saved under itin_code are used instead of itin_df.
+        bulk_itinerary_labels(self, itineraries, match='modern_name',
+                              store=None):
+            The same labelling for many itineraries at once, entered as a
+            list of (itin_df, itin_code) pairs (or a dictionary of codes and
+            itinerary dataframes).  All of the itineraries are joined to the
+            gazetteer names in one pass, so labelling a full gazetteer with
+            every itinerary in itinerary-codes.csv takes one step.  With a
+            CorpusStore, itineraries is a list of saved itin_codes (or None
+            for all of them).
+        nearest_places(self, latitudes, longitudes, k=1, max_km=None):
+            Returns the k closest gazetteer places to each set of
+            coordinates, with their distances in kilometers.
+        places_within(self, latitudes, longitudes, radius_km):
+            Returns every gazetteer place within radius_km of each set of
+            coordinates.
+        coordinate_duplicates(self, other=None, radius_km=1.0):
+            Returns the pairs of places within radius_km of each other,
+            inside this gazetteer or between it and another gazetteer, and
+            whether their names are similar.
+        find_duplicates(self, radius_km=5.0, threshold=0.75, save=False,
+                        out_file_name=None):
+            Finds likely duplicate places by their coordinates, names, and
+            geo_ids (see duplicate_finder_class.py), numbers each group of
+            duplicates in a dup_cluster column, and returns the scored pairs.
+        snap_itinerary(self, itin_df, max_km=2.0,
+                       attributes=('modern_name', 'geo_id')):
+            Fills in the names and geo_ids of itinerary rows that only have
+            coordinates from the closest gazetteer place within max_km.
+        spatial_index(self):
+            Returns the KD-tree of the gazetteer coordinates (built once).
+        geoname_id_lookup(self, number='single', workers=1, journal=None):
             Runs every row of the gazetteer dataframe through an online lookup
             for matching lat_long coordinates (_geoname_search).  All hits are
             then run through a name match (_name_match) - all names
@@ -71,7 +150,11 @@ the program is.
             be checked manually.  Changing number to 'double' will provide
             a second, more general, guess in a second set of guess columns
             with possible names, geo_ids, and distances.  These do not run
-            a string similarity test, but only fill in the guesses.
+            a string similarity test, but only fill in the guesses.  Setting
+            workers above 1 runs that many lookups at once in threads.  A
+            journal file (or True for the default name) saves each answer as
+            it arrives so that a run stopped by the geonames limits can be
+            picked up again later without repeating finished rows.
         error_output(self, tofile=False, filename=None):
             Prints out the lists of errors generated by other columns,
             including line by line errors such as when geonames returns a
@@ -79,28 +162,56 @@ the program is.
             out in interactive python, otherwise a txt file is generated.
 
     Internal Functions:
-        _match_gaz_lines(self, ref_gaz_df, gaz_row):
-            Takes the geo_id of a gazetteer row and searches for a similar
-            match in a reference gazetteer.  If the geo_ids match, the function
-            tests the modern_name similarity as well.
+        _match_gaz_frame(self, ref_gaz_df):
+            Joins the whole gazetteer to a reference gazetteer on geo_id (as
+            text, so 2657355 and 2657355.0 match) and tests the modern_name
+            similarity of every matched pair at once.
         _merge_dataframes(self, merge_gaz, file_name, drop_matches=True):
             Takes the self dataframe and merges it with a previous gazetteer.
             Making drop_matches False will leave all rows, simply
             concatenating the two frames.  Leaving it True will unify all
             geo_id matches with similar names.
+        _add_codes(label, codes):
+            Adds new itinerary codes to an itin_list entry without repeats.
+        _place_frame(self, queries, ranks, positions, extra, lat, lng):
+            Builds the DataFrame of places found by the spatial queries.
+        _coordinates(latitudes, longitudes=None):
+            Returns float arrays of coordinates from a dataframe or columns.
+        _row_hashes(self):
+            Returns a 'name-coordinates' hash for every row.
+        _invalidate_changed(self):
+            Clears the lookup results of rows with new coordinates and the
+            labels of rows with new names, and sets which rows to look up.
         _ping(self):
             Sends a single search to geonames to check if there is internet
             and if the geonames website is available.  Failed searches
             prevent the program from running any further lookups.
+        _search_rows(self, feature, workers=1):
+            Runs _geoname_search on every row still missing a geo_id, either
+            one at a time or in a pool of threads.
+        _journal_search(self, row, feature='P'):
+            Returns the journal answer for the row if there is one, otherwise
+            runs _geoname_search and writes any good answer to the journal.
+        _read_journal(self, journal_file):
+            Reads the saved answers from a lookup journal file.
         _geoname_search(self, row, feature='P'):
             Takes one line of a gazetteer dataframe, sending the lat/long
             coordinates to geonames and returning the most likely populated
             place.
+        _open_cache(self):
+            Opens the geonames cache file the first time it is needed.
+        _cache_report(self):
+            Adds the geonames cache hits and misses to the error checks.
+        _stage(self, name, **fields):
+            Times a step of a function with the instrument (if there is one).
         _geoname_error_test(self, url_return):
             Checks if the returned json data from geonames contains any error
             warnings.  In particular, this will print out the messages of
             particular error codes such as invalid usernames or insufficient
             lookup tokens (max tends to be around 250 per hour).
+        _name_matches(self, names, ref_names):
+            The same 70% similarity test as _name_match for two whole columns
+            of names, testing each different pair of names only once.
         _name_match(self, geo_row, ref_item, ref_key=None):
             This function takes a reference name and compares it to the
             'modern_name' in a Gazetteer row.  If they are 70% similar
@@ -134,42 +245,117 @@ Created on Tue May 21 20:27:31 2019
 """
 
 import pandas as pd
-from geonames_lookup_class import Geonames
+import json
+import os
+import hashlib
+import re
+import threading
+import numpy as np
+from table_io_functions import read_table, write_table, normalize_geo_ids
+from geonames_lookup_class import Geonames, GeonamesCache, RateLimiter
+from geonames_dump_class import GeonamesDump
+from duplicate_finder_class import DuplicateFinder
+from instrument_class import timed_stage
+from distance_functions import (haversine_distance, unit_sphere_points,
+                                chord_length)
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 import Levenshtein as lev
 from requests.exceptions import ConnectionError
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
 
 class Gazetteer:
 
-    def __init__(self, gaz_file, geoname_username, monitor=True):
+    def __init__(self, gaz_file, geoname_username, monitor=True,
+                 cache_file='geonames_cache.sqlite', geonames_dump=None,
+                 incremental=False, instrument=None, store=None):
         """
         Import a gazetteer file into a Pandas DataFrame.
         This also requires a Geonames ID for lookup purposes - without a
-        valid name, the geonames lookup feature will not function.
+        valid name, the geonames lookup feature will not function.  All
+        geonames answers are saved in the cache_file so that running the
+        same gazetteer again does not use up more geonames lookups; set
+        cache_file to None to turn the cache off.  The cache file is not
+        opened until the first geoname_id_lookup, so gazetteers used
+        offline never create it.  Entering a geonames dump
+        file (or an already loaded GeonamesDump) as geonames_dump runs all
+        lookups offline from that file instead.  With incremental set to
+        True, only rows added or changed since the last save (by their
+        row_hash) are verified and looked up.  An Instrument entered as
+        instrument records the time taken by each function and geonames
+        call.  With a CorpusStore as store, gaz_file is the name of a
+        gazetteer saved in the store (see corpus_store_class.py) and it is
+        loaded from there.
         """
-        self.gaz_df = pd.read_csv(gaz_file, error_bad_lines=False)
+        self.instrument = instrument
+        if store is not None:
+            self.gaz_df = store.load_gazetteer(gaz_file)
+        else:
+            self.gaz_df = read_table(gaz_file, error_bad_lines=False)
         self.name = gaz_file.split('.')[0]
         self.count = 0
         self.monitor = monitor
         self.user_name = geoname_username
+        self.cache_file = cache_file
+        if geonames_dump and not isinstance(geonames_dump, GeonamesDump):
+            geonames_dump = GeonamesDump(geonames_dump)
+        self.geonames_dump = geonames_dump
+        if geonames_dump:
+            self.geonames = geonames_dump
+        else:
+            self.geonames = Geonames(geoname_username, cache=None,
+                                     limiter=RateLimiter(),
+                                     instrument=instrument)
         self.error_checks = []
+        self.journal = {}
+        self.journal_file = None
+        self._journal_lock = threading.Lock()
+        self.incremental = incremental
+        self._spatial = None
+        self.row_hashes = self._row_hashes()
+        if incremental and 'row_hash' in self.gaz_df.columns:
+            self.changed = self.gaz_df.index[self.gaz_df['row_hash'].astype(
+                                        object) != self.row_hashes]
+        else:
+            self.changed = self.gaz_df.index
         self.all_good = self._verify_all()
         if 'geo_id' in self.gaz_df.columns.tolist():
             self.empty = self.gaz_df[self.gaz_df['geo_id'].isna()].index
         else: self.empty = self.gaz_df.index
+        if incremental:
+            self._invalidate_changed()
 
+    @timed_stage
     def csv_output(self, out_file_name=None, name_lookup=False):
         """
         Prints the data to a csv - this can run all other functions
         directly by calling 'name_lookup' which either can be True for
         a simple lookup or 'double' to do the spot search as well.
+        Out files ending in .parquet or .feather are saved in that format
+        instead (see table_io_functions.py).
         """
         if name_lookup:
             outcome = self.geoname_id_lookup(name_lookup)
             print(outcome)
         if out_file_name==None:
             out_file_name = (self.name + '_processed.csv')
-        self.gaz_df.to_csv(out_file_name, index=False)
+        write_table(self.gaz_df, out_file_name)
 
+    @timed_stage
+    def store_output(self, store, name=None):
+        """
+        Saves the gaz_df in a CorpusStore (see corpus_store_class.py),
+        replacing any gazetteer saved under the same name.  The default name
+        is the gazetteer file name without its folder or extension.
+        """
+        if name is None:
+            name = os.path.basename(self.name)
+        store.save_gazetteer(name, self.gaz_df, source=self.name)
+
+    @timed_stage
     def check_existing_gaz(self, existing_gaz_file, save=False,
                            merge=False, drop_matches=True, merge_file=None):
         """
@@ -185,7 +371,10 @@ class Gazetteer:
         as False, only the summary message is output.
         """
         message = ['Results of the Existing Gazeteer match process:']
-        exist_gaz = Gazetteer(existing_gaz_file, self.user_name)
+        exist_gaz = Gazetteer(existing_gaz_file, self.user_name,
+                              cache_file=self.cache_file,
+                              geonames_dump=self.geonames_dump,
+                              instrument=self.instrument)
         gaz_list = [self, exist_gaz]
 
         # Checks if both Gazetteers contain correct columns and geo_ids
@@ -202,9 +391,9 @@ class Gazetteer:
                     print('There were errors - check output file.')
                     return None
         # Reorganizes exact matches and partial matches into columns in self
-        zipped_matches = zip(*self.gaz_df.apply(lambda x:
-                    self._match_gaz_lines(exist_gaz.gaz_df, x), axis=1))
-        self.gaz_df['match'], self.gaz_df['exist_name'] = zipped_matches
+        matched = self._match_gaz_frame(exist_gaz.gaz_df)
+        self.gaz_df['match'] = matched['match']
+        self.gaz_df['exist_name'] = matched['exist_name']
         matches = self.gaz_df[self.gaz_df['match']].index
         found_names = self.gaz_df[self.gaz_df['exist_name'].notna()].index
         dif_names = found_names.difference(matches)
@@ -224,24 +413,32 @@ class Gazetteer:
             self._merge_dataframes(exist_gaz, merge_file, drop_matches)
         return None
 
-    def _match_gaz_lines(self, ref_gaz_df, gaz_row):
-        """
-        compares a gazetteer row with an existing gazetteer by matching the
-        geo_id column.  If there is an id match, the function checks the names
-        in each row for a 70% similarity.  Poorly matching names still get
-        recorded in the match column, but with a "False" in the hit column
-        to allow for easy filtering between the two, especially during a
-        possible merge.
-        """
-        hit = False
-        name = ref_gaz_df.loc[ref_gaz_df.geo_id==gaz_row.geo_id, 'modern_name']
-        if not name.empty:
-            name = name.values[0]
-            # The _name_match function returns True for a %70 similarity
-            hit = self._name_match(gaz_row, name)
-        else:
-            name = None
-        return hit, name
+    def _match_gaz_frame(self, ref_gaz_df):
+        """
+        compares the gazetteer with an existing gazetteer by matching the
+        geo_id column.  Both geo_id columns are first turned into text (see
+        normalize_geo_ids) so that ids read as numbers in one file and as
+        floats or text in the other still match.  The existing gazetteer is
+        then indexed once by geo_id (keeping the first row for repeated ids)
+        and joined to every row at the same time.  If there is an id match,
+        the names in each row are checked for a 70% similarity.  Poorly
+        matching names still get recorded in the exist_name column, but with
+        a "False" in the match column to allow for easy filtering between
+        the two, especially during a possible merge.  Returns a DataFrame
+        with 'match' and 'exist_name' columns on the gazetteer index.
+        """
+        ref_ids = pd.DataFrame({'geo_id': normalize_geo_ids(
+                                                    ref_gaz_df['geo_id']),
+                                'exist_name': ref_gaz_df['modern_name']})
+        ref_ids = ref_ids.dropna(subset=['geo_id']).drop_duplicates(
+                                            subset='geo_id', keep='first')
+        ids = normalize_geo_ids(self.gaz_df['geo_id'])
+        exist_name = ids.map(ref_ids.set_index('geo_id')['exist_name'])
+        exist_name = exist_name.where(exist_name.notna(), None)
+        # The _name_matches function returns True for a %70 similarity
+        match = self._name_matches(self.gaz_df['modern_name'], exist_name)
+        return pd.DataFrame({'match': match, 'exist_name': exist_name},
+                            index=self.gaz_df.index)
 
     def _merge_dataframes(self, merge_gaz, file_name, drop_matches=True):
         """
@@ -275,43 +472,329 @@ class Gazetteer:
         if not file_name:
             file_name = '{}_and_{}__merged.csv'.format(self.name,
                                                       merge_gaz.name)
-        output_gaz.to_csv(file_name, index=False)
+        write_table(output_gaz, file_name)
         return output_gaz
 
-    def itinerary_labels(self, itin_df, itin_code, match='modern_name'):
+    def itinerary_labels(self, itin_df, itin_code, match='modern_name',
+                         store=None):
         """
         Takes a given itinerary, goes through the Gazetteer, and adds the
         itinerary code to the itin_list column.  If the columns does not exist
         it creates the column, and if there are already entries, it adds new
         labels separated by semi-colons.  Blank entries are filled with the
         new code and entries not found print a message with the missing name
-        and skip that entry.
+        and skip that entry.  With a CorpusStore as store, itin_df can be
+        None: the names of the itinerary saved under itin_code are read from
+        the store instead.
+        """
+        if store is not None:
+            self.bulk_itinerary_labels([itin_code], match, store)
+        else:
+            self.bulk_itinerary_labels([(itin_df, itin_code)], match)
+
+    @timed_stage
+    def bulk_itinerary_labels(self, itineraries, match='modern_name',
+                              store=None):
+        """
+        Adds the codes of many itineraries to the itin_list column at once.
+        The itineraries are a list of (itin_df, itin_code) pairs or a
+        dictionary of {itin_code: itin_df}.  Every unique name of every
+        itinerary is put in one table with its code and joined to the
+        gazetteer names, the codes are grouped by gazetteer row, and the
+        itin_list column is written once.  Codes already in a row are kept
+        first, new codes follow in the order the itineraries were entered,
+        and no code is listed twice.  Names not found in the Gazetteer are
+        listed in the error_checks.
+
+        With a CorpusStore as store, itineraries is a list of the codes of
+        saved itineraries (None for every one) and only their unique names
+        are read from the store's indexes (see CorpusStore.itinerary_names),
+        rather than whole itinerary dataframes.
         """
         message = ['Running "Itinerary Labels" against entered itinerary:']
-        names = itin_df[match].dropna().unique()
         if 'itin_list' not in self.gaz_df.columns:
             self.gaz_df['itin_list'] = None
-
-        # Takes each unique name in the Itinerary for adding to the Gazetteer.
-        for name in names:
-            try:
-                test = self.gaz_df[match]==name
-                label = self.gaz_df.loc[test,'itin_list'].values[0]
-                # Checks if the Itinerary code already exists prior to adding.
-                if itin_code in label:
-                    None
-                else:
-                    new_label = label + "; " + itin_code
-                    self.gaz_df.loc[test,'itin_list'] = new_label
-            except IndexError:
-                message.append('{} not found in Gazetteer'.format(name))
-            except TypeError:
-                # This should return a TypeError when the value is None
-                # meaning the cell had no previous codes to append to.
-                self.gaz_df.loc[test,'itin_list'] = itin_code
+        if store is not None:
+            names = store.itinerary_names(itineraries, match)
+        else:
+            if isinstance(itineraries, dict):
+                itineraries = [(itin_df, code) for code, itin_df
+                               in itineraries.items()]
+            frames = [pd.DataFrame({'name': itin_df[match].dropna().unique(),
+                                    'itin_code': itin_code})
+                      for itin_df, itin_code in itineraries]
+            # With no itineraries entered, nothing is labelled.
+            names = (pd.concat(frames, ignore_index=True) if frames else
+                     pd.DataFrame(columns=['name', 'itin_code']))
+        gaz_names = pd.DataFrame({'name': self.gaz_df[match].values,
+                                  'row': self.gaz_df.index})
+        found = names.merge(gaz_names, on='name', how='left')
+        for name, code in found.loc[found['row'].isna(),
+                                    ['name', 'itin_code']].values:
+            message.append('{} not found in Gazetteer ({})'.format(name, code))
+        # One list of new codes (in the entered order) per gazetteer row.
+        new_codes = found.dropna(subset=['row']).groupby('row', sort=False
+                                                 )['itin_code'].agg(list)
+        rows = self.gaz_df.index[self.gaz_df.index.isin(new_codes.index)]
+        labels = [self._add_codes(label, new_codes[row]) for label, row
+                  in zip(self.gaz_df.loc[rows, 'itin_list'], rows)]
+        self.gaz_df.loc[rows, 'itin_list'] = pd.Series(labels, index=rows,
+                                                       dtype=object)
         self.error_checks += message
 
-    def geoname_id_lookup(self, number='single'):
+    @staticmethod
+    def _add_codes(label, codes):
+        """
+        Joins the codes already in an itin_list entry ('CA_MI; CA_JIR') with
+        the new codes, dropping repeats but keeping the order.
+        """
+        old = [] if pd.isna(label) else [code.strip() for code in
+                                         str(label).split(';')]
+        return '; '.join(dict.fromkeys([code for code in old + list(codes)
+                                        if code]))
+
+    def spatial_index(self):
+        """
+        Returns the KD-tree of the gazetteer coordinates along with the
+        positions (in gaz_df) of the rows it holds.  Each place becomes a
+        point on a sphere with a radius of 1 (see unit_sphere_points), so the
+        tree answers great circle questions in a few steps however large the
+        gazetteer is.  Rows without coordinates are left out.  The tree is
+        built the first time it is needed and kept until the coordinates or
+        the rows of gaz_df change.  Returns (None, empty array) if no row
+        has coordinates.
+        """
+        if cKDTree is None:
+            raise ImportError('The spatial index requires scipy '
+                              '(conda install scipy).')
+        lat, lng = self._coordinates(self.gaz_df)
+        index = self._spatial
+        if (index is None or not index['rows_index'].equals(self.gaz_df.index)
+                or not np.array_equal(index['lat'], lat, equal_nan=True)
+                or not np.array_equal(index['lng'], lng, equal_nan=True)):
+            rows = np.flatnonzero(~(np.isnan(lat) | np.isnan(lng)))
+            tree = None
+            if rows.size:
+                tree = cKDTree(unit_sphere_points(lat[rows], lng[rows]))
+            index = self._spatial = {'tree': tree, 'rows': rows, 'lat': lat,
+                                     'lng': lng,
+                                     'rows_index': self.gaz_df.index}
+        return index['tree'], index['rows']
+
+    @timed_stage
+    def nearest_places(self, latitudes, longitudes, k=1, max_km=None):
+        """
+        Finds the k closest gazetteer places to each pair of coordinates
+        (single numbers or whole columns) without any geonames lookup.
+        Places further than max_km kilometers are left out.  Returns a
+        DataFrame with one row per place found: the query (the position of
+        the coordinates entered), the rank (1 for the closest), the gaz_row
+        (the gaz_df index), the modern_name and geo_id of the place, and the
+        haversine distance in kilometers.
+        """
+        lat, lng = self._coordinates(latitudes, longitudes)
+        tree, rows = self.spatial_index()
+        valid = np.flatnonzero(~(np.isnan(lat) | np.isnan(lng)))
+        k = min(k, rows.size)
+        if tree is None or not valid.size or k < 1:
+            return self._place_frame([], [], [], ['rank'], lat, lng)
+        bound = np.inf if max_km is None else chord_length(max_km)
+        dist, pos = tree.query(unit_sphere_points(lat[valid], lng[valid]),
+                               k=k, distance_upper_bound=bound)
+        pos = pos.reshape(len(valid), k)
+        found = pos < rows.size
+        queries = np.repeat(valid, k).reshape(-1, k)[found]
+        ranks = np.tile(np.arange(1, k + 1), (len(valid), 1))[found]
+        return self._place_frame(queries, ranks, rows[pos[found]],
+                                 ['rank'], lat, lng)
+
+    @timed_stage
+    def places_within(self, latitudes, longitudes, radius_km):
+        """
+        Finds every gazetteer place within radius_km kilometers of each pair
+        of coordinates (single numbers or whole columns).  Returns the same
+        DataFrame as nearest_places (without the rank), ordered by query and
+        then by distance.
+        """
+        lat, lng = self._coordinates(latitudes, longitudes)
+        tree, rows = self.spatial_index()
+        valid = np.flatnonzero(~(np.isnan(lat) | np.isnan(lng)))
+        if tree is None or not valid.size:
+            return self._place_frame([], [], [], [], lat, lng)
+        found = tree.query_ball_point(unit_sphere_points(lat[valid],
+                                                         lng[valid]),
+                                      chord_length(radius_km))
+        counts = [len(near) for near in found]
+        positions = np.array([pos for near in found for pos in near],
+                             dtype=int)
+        result = self._place_frame(np.repeat(valid, counts), [],
+                                   rows[positions], [], lat, lng)
+        return result.sort_values(['query', 'distance'], kind='mergesort'
+                                  ).reset_index(drop=True)
+
+    @timed_stage
+    def coordinate_duplicates(self, other=None, radius_km=1.0):
+        """
+        Finds places that sit within radius_km kilometers of each other,
+        either inside this gazetteer or (with other, a Gazetteer or a
+        gazetteer DataFrame) between this gazetteer and another one.  Places
+        with the same coordinates under different names (or the same place
+        entered twice) are found even when their geo_ids are missing or
+        different, unlike check_existing_gaz.  Returns a DataFrame of pairs
+        with the gaz_row, modern_name, and geo_id of each side, the distance
+        in kilometers, and same_name (True if the names are more than 70%
+        similar, see _name_matches), ordered by distance.
+        """
+        tree, rows = self.spatial_index()
+        radius = chord_length(radius_km)
+        if isinstance(other, Gazetteer):
+            other = other.gaz_df
+        if other is None:
+            other_df = self.gaz_df
+            pairs = (tree.query_pairs(radius, output_type='ndarray')
+                     if tree is not None else np.empty((0, 2), dtype=int))
+            left, right = rows[pairs[:, 0]], rows[pairs[:, 1]]
+        else:
+            other_df = other
+            o_lat, o_lng = self._coordinates(other_df)
+            o_rows = np.flatnonzero(~(np.isnan(o_lat) | np.isnan(o_lng)))
+            found = []
+            if tree is not None and o_rows.size:
+                found = tree.query_ball_point(unit_sphere_points(
+                                    o_lat[o_rows], o_lng[o_rows]), radius)
+            left = rows[np.array([pos for near in found for pos in near],
+                                 dtype=int)]
+            right = np.repeat(o_rows, [len(near) for near in found])
+        lat, lng = self._coordinates(self.gaz_df)
+        o_lat, o_lng = self._coordinates(other_df)
+        pairs = pd.DataFrame({'gaz_row': self.gaz_df.index[left],
+                              'modern_name': self.gaz_df['modern_name'
+                                                         ].values[left],
+                              'other_row': other_df.index[right],
+                              'other_name': other_df['modern_name'
+                                                     ].values[right]})
+        for frame, side, col in [(self.gaz_df, left, 'geo_id'),
+                                 (other_df, right, 'other_geo_id')]:
+            if 'geo_id' in frame.columns:
+                pairs[col] = normalize_geo_ids(frame['geo_id']).values[side]
+        pairs['distance'] = haversine_distance(lat[left], lng[left],
+                                               o_lat[right], o_lng[right])
+        pairs['same_name'] = self._name_matches(pairs['modern_name'],
+                                                pairs['other_name']).values
+        self.error_checks.append('{} pairs of places are within {} km of '
+                                 'each other.'.format(len(pairs), radius_km))
+        return pairs.sort_values('distance', kind='mergesort'
+                                 ).reset_index(drop=True)
+
+    @timed_stage
+    def find_duplicates(self, radius_km=5.0, threshold=0.75, save=False,
+                        out_file_name=None):
+        """
+        Looks for places entered more than once in the gazetteer (most
+        useful for a gazetteer merged from several projects) with the
+        DuplicateFinder (see duplicate_finder_class.py).  Unlike the geo_id
+        merge of check_existing_gaz, rows are compared when they are within
+        radius_km of each other, share uncommon pieces of their names, or
+        share a geo_id, and each pair is scored on three name measures and
+        its distance.  Rows in a group of likely duplicates (pairs scoring
+        at least the threshold) get the same number in a dup_cluster
+        column.  Returns the pairs dataframe, best score first; with save
+        it is also written to out_file_name (the gazetteer name with
+        '_duplicates.csv' by default).
+        """
+        finder = DuplicateFinder(self.gaz_df, radius_km, threshold)
+        pairs = finder.candidate_pairs()
+        clusters = finder.clusters(pairs)
+        self.gaz_df['dup_cluster'] = clusters
+        self.error_checks.append('{} possible duplicate pairs were checked; '
+                                 '{} rows are in {} clusters of likely '
+                                 'duplicates.'.format(len(pairs),
+                                 int(clusters.notna().sum()),
+                                 clusters.nunique()))
+        if save:
+            write_table(pairs, out_file_name or self.name +
+                        '_duplicates.csv')
+        return pairs
+
+    @timed_stage
+    def snap_itinerary(self, itin_df, max_km=2.0,
+                       attributes=('modern_name', 'geo_id')):
+        """
+        Fills in the attributes (the modern_name and geo_id by default) of
+        itinerary rows that have latitude and longitude but no modern_name,
+        taking them from the closest gazetteer place within max_km
+        kilometers.  Rows that already have a name are left alone.  The
+        distance to the chosen place is added in a snap_dist column and the
+        rows with no place close enough are listed in the error_checks.
+        Returns a new itinerary dataframe.
+        """
+        itin_df = itin_df.copy()
+        attributes = [col for col in attributes if col in self.gaz_df.columns]
+        lat, lng = self._coordinates(itin_df)
+        unnamed = (itin_df['modern_name'].isna().values & ~np.isnan(lat)
+                   & ~np.isnan(lng))
+        targets = np.flatnonzero(unnamed)
+        nearest = self.nearest_places(lat[targets], lng[targets],
+                                      max_km=max_km)
+        rows = itin_df.index[targets[nearest['query'].values]]
+        for col in attributes:
+            values = self.gaz_df.loc[nearest['gaz_row'], col].values
+            if col in itin_df.columns:
+                itin_df[col] = itin_df[col].astype(object)
+            else:
+                itin_df[col] = None
+            itin_df.loc[rows, col] = values
+        itin_df['snap_dist'] = np.nan
+        itin_df.loc[rows, 'snap_dist'] = nearest['distance'].values
+        missed = itin_df.index[targets].difference(rows)
+        self.error_checks.append('{} itinerary rows were matched to the '
+                                 'closest gazetteer place.'.format(len(rows)))
+        if not missed.empty:
+            self.error_checks.append('No gazetteer place is within {} km of '
+                                     'these itinerary rows:\n{}'.format(
+                                     max_km, (missed + 2).tolist()))
+        return itin_df
+
+    def _place_frame(self, queries, ranks, positions, extra, lat, lng):
+        """
+        Builds the DataFrame returned by nearest_places and places_within
+        from the query numbers, ranks (when extra is ['rank']), and gaz_df
+        positions of the places found, adding the distances between the
+        query coordinates (lat, lng) and each place.
+        """
+        queries = np.asarray(queries, dtype=int)
+        positions = np.asarray(positions, dtype=int)
+        g_lat, g_lng = self._coordinates(self.gaz_df)
+        frame = pd.DataFrame({'query': queries})
+        if extra:
+            frame['rank'] = np.asarray(ranks, dtype=int)
+        frame['gaz_row'] = self.gaz_df.index[positions]
+        frame['modern_name'] = self.gaz_df['modern_name'].values[positions]
+        if 'geo_id' in self.gaz_df.columns:
+            frame['geo_id'] = normalize_geo_ids(self.gaz_df['geo_id']
+                                                ).values[positions]
+        frame['distance'] = haversine_distance(lat[queries], lng[queries],
+                                               g_lat[positions],
+                                               g_lng[positions])
+        return frame
+
+    @staticmethod
+    def _coordinates(latitudes, longitudes=None):
+        """
+        Returns float arrays of latitudes and longitudes from a dataframe
+        with latitude and longitude columns, or from entered numbers or
+        columns.  Text and blanks become NaN.
+        """
+        if longitudes is None:
+            latitudes, longitudes = (latitudes['latitude'],
+                                     latitudes['longitude'])
+        return [pd.to_numeric(pd.Series(np.atleast_1d(np.asarray(col,
+                                        dtype=object))), errors='coerce'
+                              ).values.astype(float)
+                for col in (latitudes, longitudes)]
+
+    @timed_stage
+    def geoname_id_lookup(self, number='single', workers=1, journal=None):
         """
         Runs every row of the gazetteer dataframe through an online lookup for
         matching lat_long coordinates (_geoname_search).  All hits are then
@@ -327,38 +810,113 @@ class Gazetteer:
         than %70 similarity from the first attempt will not re-run the
         online lookup in the second attempt.
 
+        Setting workers to more than 1 sends that many lookups to geonames at
+        the same time (see _search_rows).  The shared RateLimiter still keeps
+        the total within the geonames credit limits, and once geonames
+        reports that the hourly, daily, or weekly limit is used up the
+        remaining rows are skipped just as in a single lookup.
+
+        Setting journal to a file name (or True for the default name: the
+        gazetteer name with '_lookup_journal.jsonl') writes every answer
+        from geonames to the journal as soon as it arrives.  Running the
+        lookup again with the same journal (for instance after the hourly
+        limit has reset) reads those answers back in place of searching
+        geonames again, so only the unfinished rows use up lookups.  Rows
+        whose coordinates have changed since they were journaled are
+        searched again.
+
         Note: Every row lookup does an error check to see if geonames returned
         useable data. If there is an internet problem or a systemic failure
         to look up useable data, the function will return a warning about the
         failure along with messages generated by its helper functions.
         (see: _ping and _geoname_error_test)
         """
+        self._open_cache()
+        if journal is True:
+            journal = self.name + '_lookup_journal.jsonl'
+        self.journal_file = journal
+        self.journal = self._read_journal(journal)
+        if self.incremental and self.empty.empty:
+            self.error_checks.append('No new or changed rows need a '
+                                     'geonames lookup.')
+            return 'Success!'
         # First run a function that checks the internet and runs a dummy
         # example through the geonames website.
         ping = self._ping()
         if self.all_good and ping:
             # Checks all rows of the dataframe in Geonames 'Populated Places.'
-            self.gaz_df['geonames_find'] = self.gaz_df.loc[self.empty].apply(
-                            lambda x: self._geoname_search(x, 'P'), axis=1)
+            with self._stage('geonames_search', feature='P',
+                             rows=len(self.empty)):
+                found = self._search_rows('P', workers)
+            self.gaz_df['geonames_find'] = found
+            if self.incremental:
+                # Rows without an answer keep their old hash to run again.
+                done = found.index[found.map(lambda x: self._dict_get(x,
+                                            'geonameId') is not None)]
+                self.gaz_df.loc[done, 'row_hash'] = self.row_hashes[done]
             # Checks all returned Geonames data against the existing df name.
-            self.gaz_df.loc[self.empty, 'name_match'] = self.gaz_df.loc[
+            with self._stage('name_match', rows=len(self.empty)):
+                self.gaz_df.loc[self.empty, 'name_match'] = self.gaz_df.loc[
                                 self.empty].apply(lambda x: self._name_match(
                                 x, x.geonames_find, 'name'), axis=1)
             # Auto-enters geo_ids in hits and puts non-hits into guess columns.
-            self._reorganize_cols(1)
+            with self._stage('reorganize_cols', rows=len(self.empty)):
+                self._reorganize_cols(1)
 
             # re-runs the same search on 'Spots' - multiple types of human
             # places.  NOTE: there might be a better way to run this search!
             if number=='double' and self.all_good:
-                self.gaz_df['geonames_find'] = self.gaz_df.loc[self.empty
-                    ].apply(lambda x: self._geoname_search(x, 'S'), axis=1)
-                self._reorganize_cols(2)
+                with self._stage('geonames_search', feature='S',
+                                 rows=len(self.empty)):
+                    self.gaz_df['geonames_find'] = self._search_rows('S',
+                                                                     workers)
+                with self._stage('reorganize_cols', rows=len(self.empty)):
+                    self._reorganize_cols(2)
+            self._cache_report()
             return 'Success!'
         else:
             # Runs when the internet fails or the gazetteer lacks key data.
             print('The geonames lookup failed.')
+            self._cache_report()
             return 'Failure!'
 
+    def _open_cache(self):
+        """
+        Opens the GeonamesCache in cache_file for the geonames.org lookup the
+        first time it is needed.  Nothing is opened with a geonames_dump, a
+        cache_file of None, or a cache already open.
+        """
+        if (self.cache_file and not self.geonames_dump and
+                getattr(self.geonames, 'cache', None) is None):
+            self.geonames.cache = GeonamesCache(self.cache_file)
+
+    def _cache_report(self):
+        """
+        Adds the number of geonames answers that came from the cache rather
+        than geonames.org to the error_checks list.
+        """
+        if self.geonames.cache:
+            stats = self.geonames.cache.stats()
+            self.error_checks.append('Geonames cache: {hits} saved lookups, '
+                                     '{misses} online lookups, {entries} '
+                                     'answers in the cache.'.format(**stats))
+        if self.instrument:
+            limiter = self.geonames.limiter
+            self.instrument.event('geonames', cache=self.geonames.cache.stats()
+                                  if self.geonames.cache else None,
+                                  credits_used=limiter.credits_used
+                                  if limiter else None)
+
+    def _stage(self, name, **fields):
+        """
+        Returns a 'with' block that records a step of a function (ex: the
+        geonames searches) as a stage named 'Gazetteer.<name>' with the
+        instrument, or does nothing if there is no instrument.
+        """
+        if self.instrument is None:
+            return nullcontext()
+        return self.instrument.stage('Gazetteer.' + name, **fields)
+
     def error_output(self, tofile=False, filename=None):
         """
         Takes the errors gathered together at any point in the use of the
@@ -392,8 +950,11 @@ class Gazetteer:
         to the entered gazetteer.  If this returns a NoneType (the result
         when the geonames URL fails), it stops the program from proceeding
         to look up all the other names and creating a list of NoneTypes
-        which will then crash the "_reoganize_columns" function.
+        which will then crash the "_reoganize_columns" function.  Offline
+        lookups in a geonames dump need no internet and skip the test.
         """
+        if self.geonames_dump:
+            return True
         # Because I needed a static location with no obvious human objects...
         st_claus = pd.Series({'name':'Claus', 'latitude':90, 'longitude':0})
         # So you know...Santa Claus.
@@ -412,6 +973,67 @@ class Gazetteer:
                   'before proceeding.')
             return False
 
+    def _search_rows(self, feature, workers=1):
+        """
+        Looks up every row in self.empty with _geoname_search and returns the
+        results as a Series on the same index.  With one worker the rows run
+        in order as a normal apply; with more, the rows are handed to a pool
+        of threads that share the pooled connection, cache, and rate limiter
+        of self.geonames.  Rows reached after a usage limit error return None
+        without calling geonames because _geoname_search checks all_good.
+        """
+        rows = self.gaz_df.loc[self.empty]
+        if workers <= 1:
+            return rows.apply(lambda x: self._journal_search(x, feature),
+                              axis=1)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            found = list(pool.map(lambda x: self._journal_search(x[1],
+                                            feature), rows.iterrows()))
+        return pd.Series(found, index=rows.index, dtype=object)
+
+    def _journal_search(self, row, feature='P'):
+        """
+        Checks the journal for an answer saved for this row and search type
+        (and the same coordinates) before searching geonames.  New answers
+        that include a geonameId are added to the journal file one line at a
+        time, so everything found before a failure is kept.  Without a
+        journal file this is the same as _geoname_search.
+        """
+        if not self.journal_file:
+            return self._geoname_search(row, feature)
+        key = '{}|{}'.format(feature, row.name)
+        saved = self.journal.get(key)
+        if saved and (saved['latitude'], saved['longitude']) == (
+                                    row.latitude, row.longitude):
+            return saved['result']
+        location = self._geoname_search(row, feature)
+        if isinstance(location, dict) and 'geonameId' in location:
+            line = {'key': key, 'latitude': row.latitude,
+                    'longitude': row.longitude, 'result': location}
+            with self._journal_lock:
+                self.journal[key] = line
+                with open(self.journal_file, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(line) + '\n')
+        return location
+
+    def _read_journal(self, journal_file):
+        """
+        Reads a lookup journal (one JSON answer per line) into a dictionary
+        keyed by search type and row.  A missing file is an empty journal and
+        a half-written last line (from a run that was cut off) is skipped.
+        """
+        journal = {}
+        if not journal_file or not os.path.exists(journal_file):
+            return journal
+        with open(journal_file, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                journal[entry['key']] = entry
+        return journal
+
     def _geoname_search(self, row, feature='P'):
         """
         This is the actual Geonames lookup.  It calls a geonames lookup class
@@ -426,10 +1048,9 @@ class Gazetteer:
         if self.monitor:
             self.count = row.name
             print(self.count)
-        # Creates an instance of the Geonames class for creating the URL's.
-        # Would this be faster as a "self" variable created at the beginning?
+        # Uses the shared Geonames lookup (and its cache) for the URL's.
+        geo_id_lookup = self.geonames
         if self.all_good:
-            geo_id_lookup = Geonames(self.user_name)
             location = geo_id_lookup.lookup_nearby_place(row.latitude,
                                 row.longitude, feature_class=feature)
         else:
@@ -490,6 +1111,27 @@ class Gazetteer:
             print(message[0])
             return False
 
+    def _name_matches(self, names, ref_names):
+        """
+        Takes two Series of names on the same index and returns a Series of
+        True/False for every row, True where the names are more than 70%
+        similar by the same Levenshtein test as _name_match.  Each different
+        pair of names is only compared once and blank or non-text names
+        are False.
+        """
+        pairs = pd.DataFrame({'name': names, 'ref': ref_names})
+        unique = pairs.dropna().drop_duplicates()
+        similar = {}
+        for name, ref in zip(unique['name'], unique['ref']):
+            try:
+                similar[(name, ref)] = lev.ratio(name.lower(),
+                                                 ref.lower()) > 0.7
+            except (AttributeError, TypeError):
+                similar[(name, ref)] = False
+        return pd.Series([similar.get(pair, False) for pair in
+                          zip(pairs['name'], pairs['ref'])],
+                         index=pairs.index, dtype=bool)
+
     def _name_match(self, geo_row, ref_item, ref_key=None):
         """
         This function takes a reference name and compares it to the
@@ -521,6 +1163,65 @@ class Gazetteer:
         else:
             return False
 
+    def _row_hashes(self):
+        """
+        Makes a row_hash for every row from its modern_name and coordinates.
+        The hash has two halves, 'name-coordinates' (ex: 'a3f09c1e-5b7d2e40'),
+        so a later run can tell whether the name, the coordinates, or both
+        were changed.  Coordinates are compared as numbers, so 51.5 and
+        51.50 give the same hash.
+        """
+        cols = self.gaz_df.reindex(columns=['modern_name', 'latitude',
+                                            'longitude'])
+        names = cols['modern_name'].astype(str).str.strip()
+        coords = (pd.to_numeric(cols['latitude'], errors='coerce').astype(str)
+                  + ',' + pd.to_numeric(cols['longitude'], errors='coerce'
+                                        ).astype(str))
+        halves = [[hashlib.blake2b(text.encode('utf-8'),
+                                   digest_size=4).hexdigest()
+                   for text in col] for col in (names, coords)]
+        return pd.Series(['-'.join(pair) for pair in zip(*halves)],
+                         index=self.gaz_df.index, dtype=object)
+
+    def _invalidate_changed(self):
+        """
+        Prepares an incremental run.  Rows whose saved coordinates half of
+        the row_hash no longer matches have their geo_id, geo_dist,
+        name_match, and guess columns cleared, since those came from the old
+        coordinates.  Rows whose name half changed have their itin_list
+        cleared so itinerary_labels fills it again.  Only changed rows
+        without a geo_id are left in self.empty for the lookup; the other
+        changed rows are finished and get their new row_hash right away.
+        """
+        if 'row_hash' not in self.gaz_df.columns:
+            self.gaz_df['row_hash'] = None
+        saved = self.gaz_df['row_hash'].astype(object)
+        old = saved.where(saved.notna(), '-').astype(str).str.split('-',
+                                                            n=1, expand=True)
+        new = self.row_hashes.str.split('-', n=1, expand=True)
+        known = saved.notna()
+        moved = self.gaz_df.index[known & (old[1] != new[1])]
+        renamed = self.gaz_df.index[known & (old[0] != new[0])]
+        lookup_cols = [col for col in self.gaz_df.columns
+                       if col in ['geo_id', 'geo_dist', 'name_match'] or
+                       re.match(r'(guess|g_dist|geo_?id_guess)\d+$', col)]
+        for col in lookup_cols:
+            self.gaz_df[col] = self.gaz_df[col].astype(object)
+            self.gaz_df.loc[moved, col] = None
+        if 'itin_list' in self.gaz_df.columns:
+            self.gaz_df['itin_list'] = self.gaz_df['itin_list'].astype(object)
+            self.gaz_df.loc[renamed, 'itin_list'] = None
+        if 'geo_id' in self.gaz_df.columns:
+            self.empty = self.changed.intersection(
+                            self.gaz_df.index[self.gaz_df['geo_id'].isna()])
+        else:
+            self.empty = self.changed
+        finished = self.changed.difference(self.empty)
+        self.gaz_df.loc[finished, 'row_hash'] = self.row_hashes[finished]
+        self.error_checks.append('Incremental run: {} new or changed rows, {} '
+                                 'to look up.'.format(len(self.changed),
+                                                      len(self.empty)))
+
     def _reorganize_cols(self, num):
         """
         This function takes apart the list created by the geonames lookup
@@ -555,12 +1256,16 @@ class Gazetteer:
             self.gaz_df.loc[matches, 'geo_id'] = temp_geodf[matches
                     ].apply(lambda x: self._dict_get(x, 'geonameId'))
         # The last three create the guess columns for name, id, and distance.
-        self.gaz_df['guess{}'.format(num)] = temp_geodf[fails].apply(
-                    lambda x: self._dict_get(x, 'name'))
-        self.gaz_df['g_dist{}'.format(num)] = temp_geodf[fails].apply(
-                    lambda x: self._dict_get(x, 'distance'))
-        self.gaz_df['geo_id_guess{}'.format(num)] = temp_geodf[fails
-                    ].apply(lambda x: self._dict_get(x, 'geonameId'))
+        guesses = {'guess{}': 'name', 'g_dist{}': 'distance',
+                   'geo_id_guess{}': 'geonameId'}
+        for col, key in guesses.items():
+            col = col.format(num)
+            guess = temp_geodf[fails].apply(lambda x: self._dict_get(x, key))
+            # Incremental runs keep the guesses of the rows not looked up.
+            if self.incremental and col in self.gaz_df.columns:
+                self.gaz_df.loc[fails, col] = guess.astype(object)
+            else:
+                self.gaz_df[col] = guess
 
     def _dict_get(self, dict_item, key):
         """
@@ -586,7 +1291,7 @@ class Gazetteer:
         """
         no_flag1 = self._verify_columns()
         no_flag2 = self._verify_lat_long()
-        flag3 = 'guess2' in self.gaz_df.columns
+        flag3 = 'guess2' in self.gaz_df.columns and not self.incremental
         if flag3:
             self.error_checks.append('This Gazetteer has already been run '
                                      'and has guesses for geo_ids entered.')
@@ -629,10 +1334,12 @@ class Gazetteer:
         message = ["Lat-Long results for {}:".format(self.name)]
         try:
             # Checks for out of bounds numbers in the lat/long coordinates
-            bad_lats = self.gaz_df[(90 < self.gaz_df['latitude']) |
-                        (self.gaz_df['latitude'] < -90)]
-            bad_longs = self.gaz_df[(180 < self.gaz_df['longitude']) |
-                        (self.gaz_df['longitude'] < -180 )]
+            # (only in the new or changed rows for incremental runs).
+            checked = self.gaz_df.loc[self.changed]
+            bad_lats = checked[(90 < checked['latitude']) |
+                        (checked['latitude'] < -90)]
+            bad_longs = checked[(180 < checked['longitude']) |
+                        (checked['longitude'] < -180 )]
             # Out of bounds numbers set the flag to False
             if not (bad_lats.empty and bad_longs.empty):
                 no_flag = False
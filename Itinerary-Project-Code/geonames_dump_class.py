@@ -0,0 +1,192 @@
+"""
+-*- coding: utf-8 -*-
+
+geonames_dump_class.py
+
+An offline stand-in for the Geonames class.  Instead of calling
+findNearbyJSON on geonames.org, it reads one of the geonames data dumps
+(allCountries, or a single country such as ES or GB, either the .txt file
+or the .zip download) from http://download.geonames.org/export/dump/ and
+answers nearby place lookups on the local computer.  No username, internet
+connection, or lookup limits are involved.
+
+Only the columns the gazetteer uses are kept (geonameId, name, latitude,
+longitude, feature class, feature code, and country) as numpy arrays, with
+the repeated codes stored as categories.  Nearest places are found with a
+KD-tree built on the points of a unit sphere, so each lookup takes a few
+microseconds no matter how many places are in the dump.  A separate tree
+is built (once, the first time it is needed) for each feature class and
+feature code filter.
+
+The lookup returns the same dictionary keys as geonames.org ('name',
+'distance', 'geonameId' and a few others), so the Gazetteer can use it in
+place of the online lookup:
+    Gazetteer(gaz_file, None, geonames_dump='ES.zip')
+
+    Variable List:
+        self.places - a DataFrame of the dump columns listed above.
+        self.cache - always None (there is nothing to save), but kept so the
+            class can be used anywhere a Geonames object is used.
+        self.limiter - always None for the same reason.
+
+    Function List:
+        lookup_nearby_place(self, latitude, longitude, feature_class=None,
+                            feature_code=None, verbose='short'):
+            Returns a dictionary for the closest place to the coordinates,
+            optionally only among one feature class ('P', 'S', etc.) and
+            feature code.  Returns None if no place fits the filter.
+        lookup_nearby_places(self, latitudes, longitudes, feature_class=None,
+                             feature_code=None):
+            The same lookup for whole columns of coordinates at once,
+            returning a list of dictionaries.
+
+    Internal Functions:
+        _read_dump(self, dump):
+            Reads the kept columns of a dump file or of the file in a zip.
+        _tree(self, feature_class, feature_code):
+            Returns the KD-tree and row positions for a filter.
+        _unit_xyz(latitudes, longitudes):
+            Converts coordinates to points on a sphere with a radius of 1.
+
+@author: Adam Franklin-Lyons
+    Marlboro College | Python 3.7
+
+Created on Sat Oct 17 14:02:47 2026
+"""
+
+import csv
+import os
+import zipfile
+import numpy as np
+import pandas as pd
+from distance_functions import haversine_distance, unit_sphere_points
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+# Column positions and names of the geonames dump files that are kept.
+DUMP_COLUMNS = {0: 'geonameId', 1: 'name', 4: 'lat', 5: 'lng',
+                6: 'fcl', 7: 'fcode', 8: 'countryCode'}
+
+class GeonamesDump(object):
+    """
+    Answers geonames nearby place lookups from a downloaded geonames dump
+    rather than from the geonames.org web services.
+    """
+
+    def __init__(self, dump_file, countries=None, feature_classes=None):
+        """
+        Reads a geonames dump file.  'countries' (ex: ['ES', 'FR']) and
+        'feature_classes' (ex: ['P', 'S']) can limit the places kept in
+        memory when working from the full allCountries file.  A .zip
+        download is read directly: geonames zips hold a readme.txt as well
+        as the places, so the file named after the zip (ES.txt in ES.zip) is
+        opened from inside it.
+        """
+        if cKDTree is None:
+            raise ImportError('The offline geonames lookup requires scipy '
+                              '(conda install scipy).')
+        self.cache = None
+        self.limiter = None
+        if str(dump_file).lower().endswith('.zip'):
+            inner = os.path.splitext(os.path.basename(dump_file))[0] + '.txt'
+            with zipfile.ZipFile(dump_file) as archive:
+                with archive.open(inner) as dump:
+                    places = self._read_dump(dump)
+        else:
+            places = self._read_dump(dump_file)
+        places.columns = [DUMP_COLUMNS[col] for col in places.columns]
+        if countries:
+            places = places[places['countryCode'].isin(countries)]
+        if feature_classes:
+            places = places[places['fcl'].isin(feature_classes)]
+        for col in ['fcl', 'fcode', 'countryCode']:
+            places[col] = places[col].astype('category')
+        self.places = places.reset_index(drop=True)
+        # Plain arrays of each column are much quicker for single lookups.
+        self._columns = {col: np.asarray(self.places[col])
+                         for col in self.places.columns}
+        self._trees = {}
+
+    def _read_dump(self, dump):
+        """
+        Reads the kept columns of a dump file (a file name or an open file).
+        """
+        return pd.read_csv(dump, sep='\t', header=None,
+                           usecols=list(DUMP_COLUMNS),
+                           quoting=csv.QUOTE_NONE, keep_default_na=False,
+                           dtype={0: np.int32, 1: str, 4: np.float64,
+                                  5: np.float64, 6: str, 7: str, 8: str})
+
+    def lookup_nearby_place(self, latitude, longitude, feature_class=None,
+                            feature_code=None, verbose='short'):
+        """
+        Finds the closest place to the coordinates, optionally filtering
+        for feature class and feature code, and returns it in the same
+        dictionary form as geonames.org.  'verbose' is accepted to match
+        the Geonames class but the answer is always the short style.
+        """
+        return self.lookup_nearby_places([latitude], [longitude],
+                                         feature_class, feature_code)[0]
+
+    def lookup_nearby_places(self, latitudes, longitudes, feature_class=None,
+                             feature_code=None):
+        """
+        Finds the closest place for every pair of coordinates in one KD-tree
+        query and returns a list of dictionaries (or None where nothing
+        matches the filter or the coordinates are missing).
+        """
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        tree, rows = self._tree(feature_class, feature_code)
+        results = [None] * len(latitudes)
+        valid = np.flatnonzero(~(np.isnan(latitudes) | np.isnan(longitudes)))
+        if tree is None or not valid.size:
+            return results
+        found = rows[tree.query(self._unit_xyz(latitudes[valid],
+                                               longitudes[valid]))[1]]
+        cols = self._columns
+        distances = haversine_distance(latitudes[valid], longitudes[valid],
+                                       cols['lat'][found], cols['lng'][found])
+        for num, row, dist in zip(valid, found, distances):
+            results[num] = {'name': cols['name'][row],
+                            'distance': '{:.5f}'.format(dist),
+                            'geonameId': int(cols['geonameId'][row]),
+                            'lat': str(cols['lat'][row]),
+                            'lng': str(cols['lng'][row]),
+                            'fcl': cols['fcl'][row],
+                            'fcode': cols['fcode'][row],
+                            'countryCode': cols['countryCode'][row]}
+        return results
+
+    def _tree(self, feature_class, feature_code):
+        """
+        Returns the KD-tree for the places that fit the filter along with
+        their row numbers in self.places.  Trees are built the first time
+        a filter is used and kept for later lookups.
+        """
+        key = (feature_class, feature_code)
+        if key not in self._trees:
+            mask = np.ones(len(self.places), dtype=bool)
+            if feature_class:
+                mask &= (self.places['fcl'] == feature_class).values
+            if feature_code:
+                mask &= (self.places['fcode'] == feature_code).values
+            rows = np.flatnonzero(mask)
+            tree = None
+            if rows.size:
+                tree = cKDTree(self._unit_xyz(self._columns['lat'][rows],
+                                              self._columns['lng'][rows]))
+            self._trees[key] = (tree, rows)
+        return self._trees[key]
+
+    @staticmethod
+    def _unit_xyz(latitudes, longitudes):
+        """
+        Converts latitudes and longitudes to x, y, z points on a sphere with
+        a radius of 1.  The closest point in straight-line distance is also
+        the closest along the surface, so the KD-tree finds the same place
+        a great circle search would.
+        """
+        return unit_sphere_points(latitudes, longitudes)
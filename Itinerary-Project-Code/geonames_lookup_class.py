@@ -14,6 +14,26 @@ the class takes arguments depending on the type of lookup, ex:
         Defaults for feat_class and feat_code are none, verbose is "short"
             Verbose can also take Medium, Long, or Full.
 
+Nearby place lookups can be saved in a GeonamesCache (a small SQLite file)
+so that the same coordinates are never sent to geonames.org twice:
+    cache = GeonamesCache('geonames_cache.sqlite')
+    Geonames(username, cache=cache).lookup_nearby_place(lat, long)
+Cached answers expire after 'ttl' seconds (90 days by default) and the
+least recently used answers are dropped once there are more than
+'max_entries' saved.  cache.stats() returns the hits and misses so far.
+
+All calls share one pooled requests.Session, so the class can be used from
+several threads at once (see Gazetteer.geoname_id_lookup with workers).  A
+RateLimiter keeps the calls inside the geonames credit limits (1000 per hour
+and 10000 per day on a free account).  If the next credit would take longer
+than 'max_wait' seconds to come free, the lookup returns the same error
+dictionary geonames sends for an hourly (19) or daily (18) limit instead of
+calling geonames.org.
+
+An Instrument (see instrument_class.py) entered as 'instrument' records the
+time of every call to geonames.org along with the credits used, the cache
+hits and misses, and any lookups refused by the RateLimiter.
+
 NOTE: Currently only the lookup_nearby_place function can return both a
 proper URL lookup as well as possible errors from geonames (such as too
 many searches per day or per hour on a free account).  The two other
@@ -27,7 +47,11 @@ Created on Tue May 21 16:01:10 2019
 """
 
 import requests
+from requests.adapters import HTTPAdapter
 import json
+import sqlite3
+import threading
+import time
 
 class Geonames(object):
     """
@@ -35,8 +59,16 @@ class Geonames(object):
     API.  Each instantiation of the class requires a username to function.
     """
 
-    def __init__(self, username):
+    def __init__(self, username, cache=None, limiter=None, pool_size=10,
+                 instrument=None):
         self.GEONAMES_USER = username
+        self.cache = cache
+        self.limiter = limiter
+        self.instrument = instrument
+        # One pooled session reuses connections across lookups and threads.
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(pool_connections=1,
+                                                  pool_maxsize=pool_size))
         self.GEONAMES_API = "http://api.geonames.org/"
         self._base_feature_url = "{}getJSON?geonameId={{}}&username={}\
                 &style=full".format(self.GEONAMES_API,
@@ -53,7 +85,7 @@ class Geonames(object):
         Looks up a feature based on its geonames id
         """
         url = self._base_feature_url.format(geoname_id)
-        response = requests.get(url)
+        response = self.session.get(url)
         return self._decode_feature(response.text)
 
     def _decode_feature(self, response_text):
@@ -72,8 +104,20 @@ class Geonames(object):
                             feature_code=None, verbose='short'):
         """
         Looks up places near a specific geographic location, optionally
-        filtering for feature class and feature code.
+        filtering for feature class and feature code.  If the class has a
+        cache, saved answers are returned without calling geonames.org and
+        new answers with a geonameId are saved.  Errors (such as running out
+        of lookups) are never saved.
         """
+        if self.cache:
+            key = self.cache.make_key(latitude, longitude, feature_class,
+                                      feature_code, verbose)
+            result = self.cache.get(key)
+            if self.instrument:
+                self.instrument.count('cache_hits' if result is not None
+                                      else 'cache_misses')
+            if result is not None:
+                return result
         feature_filter = ''
         if feature_class:
             feature_filter += "&featureClass={}".format(feature_class)
@@ -83,8 +127,24 @@ class Geonames(object):
             feature_filter += "&style={}".format(verbose)
         url = self._base_nearby_url.format(latitude, longitude,
                                            feature_filter)
-        response = requests.get(url)
-        return self._decode_nearby_place(response)
+        if self.limiter:
+            error_value = self.limiter.acquire()
+            if error_value:
+                if self.instrument:
+                    self.instrument.count('limiter_refusals')
+                return {'message': 'The rate limiter ran out of geonames '
+                                   'credits.', 'value': error_value}
+        start = time.perf_counter()
+        response = self.session.get(url)
+        if self.instrument:
+            self.instrument.http_request(time.perf_counter() - start,
+                                         getattr(response, 'status_code',
+                                                 None))
+            self.instrument.count('credits')
+        result = self._decode_nearby_place(response)
+        if self.cache and isinstance(result, dict) and 'geonameId' in result:
+            self.cache.put(key, result)
+        return result
 
     def _decode_nearby_place(self, response):
         """
@@ -105,7 +165,7 @@ class Geonames(object):
         Finds the neighborhood record for a specific geographic location.
         """
         url = self._base_neighbourhood_url.format(latitude, longitude)
-        response = requests.get(url)
+        response = self.session.get(url)
         return self._decode_neighbourhood(response.text)
 
     def _decode_neighbourhood(self, response_text):
@@ -115,3 +175,159 @@ class Geonames(object):
         if 'status' not in raw_result:
             result = response_text.json()['geonames'][0]
         return result
+
+class GeonamesCache(object):
+    """
+    A persistent store of geonames answers kept in a SQLite file.  Each
+    answer is saved under the lookup that produced it (latitude, longitude,
+    feature class, feature code, and style) along with the time it was saved
+    and the time it was last used.  Answers older than 'ttl' seconds are
+    treated as missing, and once the file holds more than 'max_entries'
+    answers the least recently used ones are removed.  The hits and misses
+    counters track how many lookups the cache has saved.
+    """
+
+    def __init__(self, cache_file='geonames_cache.sqlite',
+                 ttl=90*24*60*60, max_entries=50000):
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(cache_file, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute('CREATE TABLE IF NOT EXISTS responses '
+                               '(key TEXT PRIMARY KEY, response TEXT, '
+                               'created REAL, accessed REAL)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS accessed_idx '
+                               'ON responses (accessed)')
+            self._conn.execute('DELETE FROM responses WHERE created < ?',
+                               (time.time() - self.ttl,))
+
+    @staticmethod
+    def make_key(latitude, longitude, feature_class=None, feature_code=None,
+                 verbose='short'):
+        """
+        Creates the cache key for a nearby place lookup.  Coordinates are
+        rounded to 7 decimal places (about a centimeter) so that the same
+        spot read from different files produces the same key.
+        """
+        return '{:.7f}|{:.7f}|{}|{}|{}'.format(float(latitude),
+                                               float(longitude),
+                                               feature_class or '',
+                                               feature_code or '',
+                                               verbose or '')
+
+    def get(self, key):
+        """
+        Returns the saved dictionary for the key, or None if the key has not
+        been saved or has expired.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute('SELECT response, created FROM '
+                                     'responses WHERE key = ?',
+                                     (key,)).fetchone()
+            if row and now - row[1] <= self.ttl:
+                self._conn.execute('UPDATE responses SET accessed = ? '
+                                   'WHERE key = ?', (now, key))
+                self.hits += 1
+                return json.loads(row[0])
+            if row:
+                self._conn.execute('DELETE FROM responses WHERE key = ?',
+                                   (key,))
+            self.misses += 1
+        return None
+
+    def put(self, key, result):
+        """
+        Saves a geonames answer under the key and removes the least recently
+        used answers if the cache has grown past max_entries.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO responses VALUES '
+                               '(?, ?, ?, ?)', (key, json.dumps(result),
+                                                now, now))
+            size = self._conn.execute('SELECT COUNT(*) FROM responses'
+                                      ).fetchone()[0]
+            if size > self.max_entries:
+                self._conn.execute('DELETE FROM responses WHERE key IN '
+                                   '(SELECT key FROM responses ORDER BY '
+                                   'accessed LIMIT ?)',
+                                   (size - self.max_entries,))
+
+    def stats(self):
+        """
+        Returns a dictionary with the hits, misses, hit rate, and number of
+        answers currently saved.
+        """
+        with self._lock:
+            size = self._conn.execute('SELECT COUNT(*) FROM responses'
+                                      ).fetchone()[0]
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'entries': size}
+
+    def clear(self):
+        """
+        Removes every saved answer and resets the counters.
+        """
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM responses')
+        self.hits = 0
+        self.misses = 0
+
+class RateLimiter(object):
+    """
+    A token bucket for each geonames credit limit.  Every bucket starts full
+    and refills evenly over its period (1000 credits per hour, 10000 per
+    day by default).  acquire() takes one credit from every bucket, waiting
+    for the credits to refill if necessary.  The class is thread safe so a
+    single limiter can be shared by every lookup thread.
+    """
+
+    # Geonames error values for the hourly and daily credit limits.
+    ERROR_VALUES = {60*60: 19, 24*60*60: 18}
+
+    def __init__(self, per_hour=1000, per_day=10000, max_wait=60):
+        now = time.monotonic()
+        self.max_wait = max_wait
+        self.credits_used = 0
+        # Each bucket is [period, capacity, tokens, last refill time].
+        self._buckets = [[period, limit, float(limit), now] for period, limit
+                         in ((60*60, per_hour), (24*60*60, per_day)) if limit]
+        self._lock = threading.Lock()
+
+    def acquire(self, credits=1):
+        """
+        Takes the credits from every bucket and returns None.  If any bucket
+        would take longer than max_wait seconds to refill enough, nothing is
+        taken and the geonames error value for that limit is returned (19
+        for hourly or 18 for daily).
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait = 0
+            for bucket in self._buckets:
+                period, limit, tokens, last = bucket
+                bucket[2] = min(limit, tokens + (now - last) * limit / period)
+                bucket[3] = now
+                if bucket[2] < credits:
+                    bucket_wait = (credits - bucket[2]) * period / limit
+                    if bucket_wait > self.max_wait:
+                        return self.ERROR_VALUES.get(period, 19)
+                    wait = max(wait, bucket_wait)
+            # Sleeping inside the lock keeps the other threads in line.
+            if wait:
+                time.sleep(wait)
+            now = time.monotonic()
+            for bucket in self._buckets:
+                period, limit, tokens, last = bucket
+                bucket[2] = min(limit, tokens + (now - last) * limit / period)
+                bucket[2] -= credits
+                bucket[3] = now
+            self.credits_used += credits
+        return None
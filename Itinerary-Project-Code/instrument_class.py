@@ -0,0 +1,244 @@
+"""
+-*- coding: utf-8 -*-
+
+instrument_class.py
+
+A record of where the time goes when a gazetteer or itinerary is processed.
+The Gazetteer, Itinerary, and Geonames classes all accept an Instrument and
+report to it as they work:
+    stages - every main function (format_dates, geoname_id_lookup, etc.)
+        and the slow steps inside geoname_id_lookup, with the time taken,
+        the number of rows, and optionally the peak memory
+    http - every call to geonames.org with its time, collected into a
+        histogram of response times
+    counters - geonames credits used, cache hits and misses, and lookups
+        refused by the rate limiter
+
+Everything is kept in memory (see summary) and, if a log_file is entered,
+written as it happens to a JSON lines file with one event per line, ex:
+    {"event": "stage", "name": "Itinerary.format_dates", "seconds": 0.012,
+     "rows": 3733, "time": 1602963000.1}
+For a closer look, profile=True runs cProfile during the stages (see
+profile_report) and trace_memory=True records the peak memory of each
+stage with tracemalloc.  Both slow the program down, so they are off
+unless asked for.
+
+Example:
+    inst = Instrument('joan_events.jsonl')
+    itin = Itinerary('Joan_I_royal_itinerary_datasheet.csv', instrument=inst)
+    itin.format_dates()
+    inst.summary()
+
+    Variable List:
+        self.log_file - the JSON lines file for the events (or None).
+        self.events - every event recorded so far, as dictionaries.
+        self.stages - the number of calls, total seconds, and total rows for
+            each stage name.
+        self.http - the number of geonames calls, total seconds, errors,
+            and the histogram counts for each LATENCY_BUCKETS limit.
+        self.counters - the totals of everything counted (credits, etc.).
+        self.profiler - the cProfile.Profile used when profile is True.
+        self.trace_memory - True/False - whether to record peak memory.
+
+    Function List:
+        stage(self, name, rows=None, **fields):
+            A 'with' block that times everything inside it and records a
+            stage event.  Extra fields can be added to the returned
+            dictionary inside the block.
+        event(self, kind, **fields):
+            Records any other event.
+        count(self, name, amount=1):
+            Adds to a counter.
+        http_request(self, seconds, status=None):
+            Records one geonames call in the response time histogram.
+        summary(self):
+            Returns the stage, http, and counter totals as a dictionary.
+        profile_report(self, file_name=None, sort='cumulative', limit=30):
+            Returns (or saves) the cProfile statistics as text.
+        close(self):
+            Closes the log file.
+
+Function:
+    timed_stage(method):
+        A decorator for Gazetteer and Itinerary functions that records the
+        function as a stage of the object's instrument.
+
+@author: Adam Franklin-Lyons
+    Marlboro College | Python 3.7
+
+Created on Sat Oct 17 20:12:44 2026
+"""
+
+from contextlib import contextmanager
+import cProfile
+import functools
+import io
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+
+# Upper limits (in seconds) of the geonames response time histogram.
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+class Instrument(object):
+    """
+    Collects timing and count events from the Gazetteer, Itinerary, and
+    Geonames classes and optionally writes them to a JSON lines file.
+    """
+
+    def __init__(self, log_file=None, profile=False, trace_memory=False):
+        self.log_file = log_file
+        self.events = []
+        self.stages = {}
+        self.http = {'calls': 0, 'seconds': 0.0, 'errors': 0,
+                     'histogram': [0] * (len(LATENCY_BUCKETS) + 1)}
+        self.counters = {}
+        self.profiler = cProfile.Profile() if profile else None
+        self.trace_memory = trace_memory
+        self._depth = 0
+        self._lock = threading.Lock()
+        self._log = open(log_file, 'a', encoding='utf-8') if log_file else None
+
+    @contextmanager
+    def stage(self, name, rows=None, **fields):
+        """
+        Times the code inside the 'with' block and records it as a stage.
+        Stages can be inside other stages; the profiler and memory tracing
+        are started by the outermost one.  The dictionary given by the block
+        is saved with the event, so rows or other fields can be filled in
+        once they are known.
+        """
+        record = dict(fields, name=name, rows=rows)
+        outer = self._depth == 0
+        self._depth += 1
+        started_tracing = False
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            elif outer and hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+        if self.profiler and outer:
+            self.profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            if self.profiler and outer:
+                self.profiler.disable()
+            if self.trace_memory:
+                record['peak_memory_mb'] = (tracemalloc.get_traced_memory()[1]
+                                            / 2**20)
+                if started_tracing:
+                    tracemalloc.stop()
+            self._depth -= 1
+            with self._lock:
+                totals = self.stages.setdefault(name, {'calls': 0,
+                                                       'seconds': 0.0,
+                                                       'rows': 0})
+                totals['calls'] += 1
+                totals['seconds'] += record['seconds']
+                totals['rows'] += record['rows'] or 0
+            self.event('stage', **record)
+
+    def event(self, kind, **fields):
+        """
+        Records an event of any kind with the time it happened and writes it
+        to the log file (if there is one).
+        """
+        line = dict(fields, event=kind, time=time.time())
+        with self._lock:
+            self.events.append(line)
+            if self._log:
+                self._log.write(json.dumps(line, default=str) + '\n')
+                self._log.flush()
+
+    def count(self, name, amount=1):
+        """
+        Adds the amount to a named counter (ex: 'credits' or 'cache_hits').
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def http_request(self, seconds, status=None):
+        """
+        Records one call to geonames.org: its time goes into the histogram
+        and the totals, and calls with an HTTP status other than 200 are
+        counted as errors.
+        """
+        bucket = next((num for num, limit in enumerate(LATENCY_BUCKETS)
+                       if seconds <= limit), len(LATENCY_BUCKETS))
+        with self._lock:
+            self.http['calls'] += 1
+            self.http['seconds'] += seconds
+            self.http['histogram'][bucket] += 1
+            if status is not None and status != 200:
+                self.http['errors'] += 1
+        self.event('http', seconds=seconds, status=status)
+
+    def summary(self):
+        """
+        Returns a dictionary of the stage totals, the geonames calls (with
+        the histogram labelled by its upper limits and the average time),
+        the counters, and the cache hit rate.
+        """
+        with self._lock:
+            labels = ['<={}s'.format(limit) for limit in LATENCY_BUCKETS]
+            labels.append('>{}s'.format(LATENCY_BUCKETS[-1]))
+            calls = self.http['calls']
+            http = dict(self.http, histogram=dict(zip(labels,
+                                                   self.http['histogram'])),
+                        mean_seconds=self.http['seconds'] / calls
+                        if calls else 0.0)
+            hits = self.counters.get('cache_hits', 0)
+            looked_up = hits + self.counters.get('cache_misses', 0)
+            return {'stages': {name: dict(totals) for name, totals
+                               in self.stages.items()},
+                    'http': http, 'counters': dict(self.counters),
+                    'cache_hit_rate': hits / looked_up if looked_up else 0.0}
+
+    def profile_report(self, file_name=None, sort='cumulative', limit=30):
+        """
+        Returns the cProfile statistics (the 'limit' slowest functions by
+        'sort') as text, also saving them to file_name if one is entered.
+        Returns None if the instrument was not created with profile=True.
+        """
+        if not self.profiler:
+            return None
+        text = io.StringIO()
+        pstats.Stats(self.profiler, stream=text).sort_stats(sort
+                                                ).print_stats(limit)
+        if file_name:
+            with open(file_name, 'w') as f:
+                f.write(text.getvalue())
+        return text.getvalue()
+
+    def close(self):
+        """
+        Closes the log file.  Events are still collected in memory.
+        """
+        if self._log:
+            self._log.close()
+            self._log = None
+
+def timed_stage(method):
+    """
+    Records every call of a Gazetteer or Itinerary function as a stage named
+    after the class and function (ex: 'Itinerary.format_dates') with the
+    number of rows in the object's dataframe.  Objects without an
+    instrument run the function unchanged.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        instrument = getattr(self, 'instrument', None)
+        if instrument is None:
+            return method(self, *args, **kwargs)
+        frame = getattr(self, 'itin_df', getattr(self, 'gaz_df', None))
+        name = '{}.{}'.format(type(self).__name__, method.__name__)
+        with instrument.stage(name, rows=None if frame is None
+                              else len(frame)):
+            return method(self, *args, **kwargs)
+    return wrapper
@@ -28,6 +28,7 @@ Created on Tue Jul  2 13:36:40 2019
 
 from gazetteer_class import Gazetteer
 from itinerary_class import Itinerary
+from table_io_functions import write_table
 import os
 import sys
 import pandas as pd
@@ -35,11 +36,13 @@ import pandas as pd
 Command_Dict = {'process a gazetteer': 'run_gaz',
                     'main gazetteer filename': 'gaz_file',
                     'geonames login id': 'geonames_id',
+                    'only process new or changed rows': 'incremental',
                     'compare gazetteers': 'comp_gazs',
                     'reference gazetteer filename': 'ref_gaz_file',
                     'save output gazetteer': 'save_gaz',
                     'lookup geonames ids': 'check_ids',
                     'secondary geonames lookup': 'double_ids',
+                    'simultaneous geonames lookups': 'lookup_workers',
                     'populate itinerary ids': 'itin_ids',
                     'itinerary id code': 'itin_code',
                     'itinerary file for reference': 'ref_itin_file',
@@ -126,11 +129,13 @@ def gaz_functions(choice_dict):
     run_gaz - (T/F)
     gaz_file - <str>
     geonames_id - <str>
+    incremental - (T/F) (optional, defaults to False)
     comp_gazs - (T/F)
     ref_gaz_file - <str>
     save_gaz -  - <'save', 'both', or 'merge'>
     check_ids - (T/F)
     double_ids - (T/F)
+    lookup_workers - <int> (optional, defaults to 1 if blank or not a number)
     itin_ids - (T/F)
     itin_code - <str>
     ref_itin_file - <str>
@@ -138,7 +143,8 @@ def gaz_functions(choice_dict):
     g_error_file - <str>
     """
     gaz_path = get_current_path(choice_dict['gaz_file'])
-    main_gaz = Gazetteer(gaz_path, choice_dict['geonames_id'])
+    main_gaz = Gazetteer(gaz_path, choice_dict['geonames_id'],
+                         incremental=choice_dict.get('incremental') == True)
     if choice_dict['comp_gazs'] == True:
         refgaz_path = get_current_path(choice_dict['ref_gaz_file'])
         if choice_dict['save_gaz'] == 'save':
@@ -147,10 +153,13 @@ def gaz_functions(choice_dict):
             main_gaz.check_existing_gaz(refgaz_path, save='both')
         elif choice_dict['save_gaz'] == 'merge':
             main_gaz.check_existing_gaz(refgaz_path, merge=True)
-    if choice_dict['double_ids'] == True:
-        main_gaz.geoname_id_lookup(number='double')
-    elif choice_dict['check_ids'] == True:
-        main_gaz.geoname_id_lookup()
+    if choice_dict['double_ids'] == True or choice_dict['check_ids'] == True:
+        workers = str(choice_dict.get('lookup_workers', '')).strip()
+        workers = int(workers) if workers.isdigit() and int(workers) else 1
+        if choice_dict['double_ids'] == True:
+            main_gaz.geoname_id_lookup(number='double', workers=workers)
+        else:
+            main_gaz.geoname_id_lookup(workers=workers)
     if choice_dict['itin_ids'] == True:
         itin_path = get_current_path(choice_dict['ref_itin_file'])
         itin = Itinerary(itin_path)
@@ -212,22 +221,22 @@ def itin_functions(choice_dict):
         else:
             itin_gaz_df = main_itin.itin_to_gaz()
         output_path = get_current_path(choice_dict['gaz_file_out'])
-        itin_gaz_df.to_csv(output_path, index=False)
+        write_table(itin_gaz_df, output_path)
     if choice_dict['itin_to_trips'] == True:
         if choice_dict['keep_dates'] == True:
             itin_trips_df = main_itin.itin_to_trips(date_style='all')
         else:
             itin_trips_df = main_itin.itin_to_trips()
-        itin_trips_df.to_csv(choice_dict['trips_file'], index=False)
+        write_table(itin_trips_df, choice_dict['trips_file'])
     if choice_dict['final_itin_save'] == 'same':
         filename = (main_itin.name + '_processed.csv')
         itin_out_path = get_current_path(filename)
-        main_itin.itin_df.to_csv(itin_out_path, index=False)
+        main_itin.csv_output(itin_out_path)
     elif choice_dict['final_itin_save'] == 'none':
         None
     else:
         itin_out_path = get_current_path(choice_dict['final_itin_save'])
-        main_itin.itin_df.to_csv(itin_out_path, index=False)
+        main_itin.csv_output(itin_out_path)
     if choice_dict['i_error_output'] == True:
         file_path = get_current_path(choice_dict['i_error_file'])
         main_itin.error_output(tofile=True, filename=file_path)
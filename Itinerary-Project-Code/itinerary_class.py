@@ -19,26 +19,41 @@ Variables List:
         data; is a True/False value
     self.name - a truncated version of the input filename used for default
         output files and error message txt files.
+    self.instrument - an Instrument (see instrument_class.py) that records
+        the time and row count of each main function, or None.
+    self.compact - True/False - whether the itin_df is kept in compact
+        column types (see compact_frame).
+    self._records - the date and place index of the itin_df rows (see
+        record_index), or None until it is first needed.
 
 Function List:
     fuzzy_gaz_name_match(self, gaz_df):
         This function adds a column to the itinerary dataframe that labels
         each name in the modern_name column with the highest matching ratio
-        name in the gazetteer.
-    attribute_lookup(self, gazetteer_dataframe, attributes):
+        name in the gazetteer (see name_match_class.py).
+    attribute_lookup(self, gazetteer_dataframe, attributes,
+                     column='modern_name', store=None):
         This function takes a separate gazetteer and identifies the named
         attribute in the gazetteer for each row in the itinerary.  It creates
         a new column in the Itinerary with that information, leaving a None
-        if no entry is found in the Gazetteer.
-    format_dates(self):
+        if no entry is found in the Gazetteer.  Rows are matched on the
+        'modern_name' column by default, but 'geo_id' also works.  With a
+        CorpusStore (see corpus_store_class.py), the gazetteer is the name
+        of one saved in the store and is searched through its indexes.
+    format_dates(self, calendar='gregorian', date_type=None):
         Takes the day, month, and year columns and creates a date(yyyy-mm-dd)
         cell in a new column for every row.  The new dataframe drops any
-        NaN rows missing date information
-    itin_to_gaz(self):
+        NaN rows missing date information.  Dates can be checked against the
+        'julian' calendar and stored as integer day numbers with
+        date_type='day_number' (see date_functions.py), which is the
+        default for compact itineraries.
+    itin_to_gaz(self, add_code=False, itin_code=None):
         Takes every unique location in the Itinerary and creates a Gazetteer
         dataframe for export.  If the itinerary includes Lat/Long or geo_ids
-        these are included in the output dataframe.
-    itin_to_trips(self, date_style='full_date'):
+        these are included in the output dataframe.  With add_code, the
+        itin_code is entered in an itin_code column for every place.
+    itin_to_trips(self, date_style='full_date', distance='haversine',
+                  sort=True, distance_cache=None):
         Separates out all individual trips in the itinerary, ignoring blanks
         and repeated locations.  The output dataframe has origin and
         destination columns for date, name, lat, long, and geo_id.  The output
@@ -46,7 +61,46 @@ Function List:
         or can be run leaving in day/month/year columns.  Using 'months' for
         date_style returns only months and days (not recommended for trips).
         Using full_date returns formatted dates; using 'all' returns formatted
-        dates but also maintains the day/month/year columns.
+        dates but also maintains the day/month/year columns.  Distances
+        are 'haversine' (spherical) by default or 'ellipsoid' for WGS84.
+        With sort=False the rows are kept in their current order rather
+        than sorted by date.  Trips join the end of each stay to the start
+        of the next (see itin_to_stays).  A DistanceCache (see
+        distance_cache_class.py) reuses the distances of place pairs
+        already seen.
+    itin_to_stays(self, sort=True):
+        Compresses the dated itinerary into stays: one row for each run of
+        days at the same place with its arrival and departure dates, the
+        number of days, and the number of rows recorded there.
+    travel_check(self, trip_df=None, max_km_day=100, window=15,
+                 z_limit=3.0, min_km_day=40):
+        Flags trips that are too fast to be possible, either over a fixed
+        number of km per day or far above the trips around them (see
+        travel_check_functions.py).  The flagged trips are listed in the
+        error_checks and returned as a dataframe.
+    record_index(self, calendar='gregorian', rebuild=False):
+        Returns the index of the rows by date and by place used by the
+        queries below, building it the first time it is needed and again
+        whenever the itin_df is replaced or changed by the class itself.
+        rebuild=True is needed after editing itin_df cells by hand.
+    records_between(self, start=None, end=None, place=None,
+                    calendar='gregorian'):
+        Returns the rows dated between two periods (years, months, or days)
+        in date order, optionally only those at one place.
+    records_on(self, period, place=None, calendar='gregorian'):
+        Returns the rows dated in a single year, month, or day.
+    place_records(self, place):
+        Returns every row at a place (dated or not) in itinerary order.
+    compact_frame(self):
+        Changes the itin_df to smaller column types: categories for
+        repeated names, small whole numbers for day, month, and year, and
+        Int64 for numeric geo_ids.  Every other function works the same on
+        the compact itin_df.
+    csv_output(self, out_file_name=None):
+        Saves the itinerary dataframe as a csv (or as a parquet or feather
+        file, depending on the extension of the file name).
+    store_output(self, store, itin_code=None):
+        Saves the itinerary dataframe in a CorpusStore under its code.
     error_output(self, tofile=False, filename=None):
         This creates a txt file with all errors accumulated in running the
         various functions.  It will record specific line errors for problems
@@ -56,29 +110,29 @@ Function List:
         itinerary file name is created.
 
 Functions called by main Function List:
-    def _max_lev(self, itin_name, gaz_df):
-        Takes a name and a dataframe with a 'modern_name' column and compares
-        the name to every entry in the modern_name column.  It retuns the
-        best ratio match in the column.  If there is an exact match, instead
-        of the name it enters 'exact match,' if there is no match better than
-        50% it enters a None.
-    _gaz_lookup(self, gaz_df, attribute, row_index, column='modern_name'):
-        Looks up the desired attribute where the row_index matches the
-        modern_name column (or other column as desired - modern_name is the
-        current default)
-    _date_formater(self, row):
-        takes the day, month, and year and returns a single date(yyyy-mm-dd)
+    _gaz_index(self, gaz_df, attributes, column='modern_name'):
+        Builds a lookup table of the desired attributes from the gazetteer,
+        indexed on the modern_name column (or other column as desired -
+        modern_name is the current default) and keeping the first row for
+        any repeated name.
+    _date_column(self, valid, day, month, year, calendar, date_type):
+        Builds the 'dates' column from the checked day, month, and year
+        arrays as either datetime dates or integer day numbers.
     _trips_date_style(self, date_style):
         Determines whether the trips dataframe will be output with fully
         formatted dates or only month and year columns. (accepts 'month',
         'full_date', or 'all').
+    _stay_runs(self, date_col, ref, sort=True):
+        Returns the dated rows in travel order along with the first and last
+        row of each run of rows at the same place.
     _undated_locations(self):
         Records all rows in which there is a location listed without a
         complete date.  These locations are dropped if date_style is full_date
         but will be kept in the 'month' style.
-    _distance_calc(self, trip_row):
-        Returns a great circle distance between two pairs of lat/long
-        coordinates, called as part of the trips dataframe.
+    _distance_calc(self, trip_df, method='haversine', cache=None):
+        Returns the distances between the origin and destination lat/long
+        coordinates of every trip in a single array calculation (see
+        distance_functions.py), or from a DistanceCache.
     _verify_cols(self):
         Only checks if all columns needed in other functions exist and have
         the proper names - returns an error and prevents other functions
@@ -104,53 +158,86 @@ Created on Tue May 21 20:27:31 2019
 
 import pandas as pd
 import datetime as dt
-from numpy import cos, sin, arcsin, sqrt, radians
-# from pyproj import Geod
-import Levenshtein as lev
+import os
+import numpy as np
+from table_io_functions import (read_table, write_table, compact_types,
+                                normalize_geo_ids)
+from distance_functions import trip_distances
+from date_functions import (date_parts, valid_dates, day_numbers,
+                            period_day_numbers)
+from travel_check_functions import flag_trips
+from name_match_class import NameMatcher
+from instrument_class import timed_stage
 
 class Itinerary:
 
-    def __init__(self, file_name, latlong=False):
-        """Import a gazetteer file into a Pandas DataFrame"""
-        self.itin_df = pd.read_csv(file_name, error_bad_lines=False,
-                                     encoding='utf-8-sig')
+    def __init__(self, file_name, latlong=False, instrument=None,
+                 itin_df=None, compact=False, store=None):
+        """
+        Import an itinerary file (csv, parquet, or feather) into a Pandas
+        DataFrame.  An Instrument entered as instrument records the time
+        taken by each of the main functions.  An itin_df that has already
+        been read (such as one chunk of a large file, see
+        itinerary_stream_class.py) is used as it is instead of reading the
+        file again.  With compact=True the dataframe is stored in smaller
+        column types (see compact_frame).  With a CorpusStore as store,
+        file_name is the itin_code of an itinerary saved in the store (see
+        corpus_store_class.py) and it is loaded from there.
+        """
+        self.instrument = instrument
+        if itin_df is None and store is not None:
+            itin_df = store.load_itinerary(file_name)
+        elif itin_df is None:
+            itin_df = read_table(file_name, error_bad_lines=False,
+                                 encoding='utf-8-sig')
+        self.itin_df = itin_df
         self.name = file_name.split('.')[0]
         self.latlong = latlong
         self.no_flag, self.error_checks = self._verify_cols()
+        self.compact = False
+        self._records = None
+        if compact:
+            self.compact_frame()
+
+    def compact_frame(self):
+        """
+        Stores the itinerary in compact column types (see compact_types in
+        table_io_functions.py).  Place names, book references, and other
+        text that repeats are kept as categories, so each name is stored
+        once however many days are spent there; day, month, and year become
+        nullable Int8/Int16 columns and numeric geo_ids become Int64 rather
+        than text or floats.  Days, months, or years with text in them are
+        left as they are so format_dates can still report them.  From then
+        on, format_dates stores the dates as Int32 day numbers and looked up
+        attributes are compacted as they are added.  The memory used before
+        and after is added to the error_checks.
+        """
+        before = self.itin_df.memory_usage(deep=True).sum()
+        self.itin_df = compact_types(self.itin_df)
+        after = self.itin_df.memory_usage(deep=True).sum()
+        self.compact = True
+        self.error_checks.append('The itinerary was compacted from {:.2f} MB '
+                                 'to {:.2f} MB.'.format(before / 2**20,
+                                                        after / 2**20))
 
+    @timed_stage
     def fuzzy_gaz_name_match(self, gaz_df):
         """
         For each modern_name in the itinerary, this function adds a column
         to the itinerary dataframe that has the highest matching ratio
-        name in the gazetteer.
+        name in the gazetteer.  If there is an exact match, instead of the
+        name it enters 'exact match,' if there is no match better than 50%
+        it enters a None.  The gazetteer names are indexed once by the
+        NameMatcher and each unique itinerary name is only matched once.
         """
         values = self.itin_df['modern_name'].notna()
-        self.itin_df['gaz_match'] = self.itin_df.loc[values,
-                                            'modern_name'].apply(lambda x:
-                                            self._max_lev(x, gaz_df))
-
-    def _max_lev(self, itin_name, gaz_df):
-        """
-        Takes a name and a dataframe with a 'modern_name' column and compares
-        the name to every entry in the modern_name column.  It retuns the
-        best ratio match in the column.  If there is an exact match, instead
-        of the name it enters 'exact match,' if there is no match better than
-        50% it enters a None.
-        """
-        name_series = gaz_df['modern_name'].apply(str)
-        lev_series = name_series.apply(lambda x: lev.ratio(x.lower(),
-                                                 str(itin_name).lower()))
-        max_lev = lev_series.max()
-        if max_lev == 1:
-            name = 'exact match'
-        elif max_lev > 0.5:
-            row_num = lev_series.idxmax()
-            name = gaz_df.loc[row_num, 'modern_name']
-        else:
-            name = None
-        return name
+        matcher = NameMatcher(gaz_df['modern_name'])
+        self.itin_df['gaz_match'] = matcher.match_series(
+                                        self.itin_df.loc[values, 'modern_name'])
 
-    def attribute_lookup(self, gaz_df, attributes):
+    @timed_stage
+    def attribute_lookup(self, gaz_df, attributes, column='modern_name',
+                         store=None):
         """
         The input gazetteer needs to include a column that has matched names
         from the itinerary dataframe.  Generally, this will be something like
@@ -164,8 +251,16 @@ class Itinerary:
         list of errors.
         Place Lat and Long as columns in the itin_frame from gaz_frame
         Return modified itin_frame
+
+        The gazetteer is indexed once (see _gaz_index) and every attribute is
+        then filled in for the whole itinerary in a single pass rather than
+        searching the gazetteer again for each row.  geo_ids are matched as
+        text, so numeric ids of a compact itinerary still find their rows.
+        With a CorpusStore as store, gaz_df is the name of a gazetteer saved
+        in it, and only the rows for the itinerary's names are read through
+        the store's indexes (see CorpusStore.gazetteer_attributes).
         """
-        blanks = self.itin_df[self.itin_df['modern_name'].isna()].index
+        blanks = self.itin_df[self.itin_df[column].isna()].index
         message = []
         # Attributes can be either string or list - this forces a list.
         try:
@@ -173,17 +268,32 @@ class Itinerary:
         except AttributeError:
             attributes = list(attributes)
         # Checks that the attributes match column names in the Gazetteer.
-        for name in attributes:
-            if name in gaz_df.columns: None
-            else:
+        gaz_columns = (store.gazetteer_columns(gaz_df) if store is not None
+                       else gaz_df.columns)
+        for name in attributes[:]:
+            if name not in gaz_columns:
                 attributes.remove(name)
                 message.append('The gazetteer used for the attribute lookup'
                                ' does not contain {}s.'.format(name))
+        keys = self.itin_df[column]
+        if column == 'geo_id':
+            keys = normalize_geo_ids(keys)
+        # One row per name holding every attribute, looked up all at once.
+        if store is not None:
+            found = store.gazetteer_attributes(gaz_df, keys, attributes,
+                                               column)
+        else:
+            if column == 'geo_id':
+                gaz_df = gaz_df.assign(geo_id=normalize_geo_ids(
+                                                            gaz_df[column]))
+            found = self._gaz_index(gaz_df, attributes, column)
+        found = found.reindex(keys.values)
         for name in attributes:
             message.append('Looking up {} in the gazetteer.'.format(name))
-            self.itin_df[name] = self.itin_df['modern_name'].apply(
-                    lambda x: self._gaz_lookup(gaz_df, name, x))
-            # Compiles the errors where the lookup function below failed.
+            self.itin_df[name] = found[name].values
+            if name == 'modern_name':
+                self._records = None
+            # Compiles the errors where the gazetteer had no matching row.
             errors = self.itin_df[self.itin_df[name].isna()].index
             errors = errors.difference(blanks)
             if errors.empty:
@@ -193,29 +303,31 @@ class Itinerary:
                                'Gazetteer:'.format(name))
                 for i in errors:
                     message.append('Error on line {}; {} \n'.format(i,
-                                      self.itin_df['modern_name'][i]))
+                                      self.itin_df[column][i]))
         # If latitude and longitude looked up correctly, change class variable
         if {'latitude','longitude'}.issubset(attributes):
             self.latlong = True
+        if self.compact:
+            self.itin_df = compact_types(self.itin_df, attributes)
         self.error_checks += message
         print('See the output text file for possibe errors.')
         return message
 
-    def _gaz_lookup(self, gaz_df, attribute, row_ref, column='modern_name'):
+    def _gaz_index(self, gaz_df, attributes, column='modern_name'):
         """
-        This function uses the modern name in the itinerary row (supplied as
-        'row_ref'), and finds the gazetteer row that matches that name from
-        the supplied gaz_df.  It then returns the value from the gazetteer
-        row that matches the 'attribute' column.  Missing names or other
-        index errors return None.  This function could theoretically be also
-        used to match other columns (like geo_id) in the gazetteer dataframe.
+        This function takes the gazetteer and returns a dataframe of only the
+        requested attribute columns, indexed by the 'column' values (the
+        modern_name by default, but geo_id works as well).  As with a search
+        of the gazetteer, only the first row is kept when a name appears more
+        than once and blank names are dropped, so any itinerary name missing
+        from the index returns a blank value in the lookup.
         """
-        try:
-            return gaz_df.loc[gaz_df[column]==row_ref, attribute].values[0]
-        except IndexError:
-            return None
+        gaz_index = gaz_df.dropna(subset=[column]).drop_duplicates(
+                                            subset=column, keep='first')
+        return gaz_index.set_index(column, drop=False)[attributes]
 
-    def format_dates(self):
+    @timed_stage
+    def format_dates(self, calendar='gregorian', date_type=None):
         """
         Takes the columns: year, month, day
         If all three are present, the function creates a new column 'date'
@@ -223,56 +335,84 @@ class Itinerary:
         The 'date' column is in the datetime type but without times.
         All incomplete dates or bad date entries will be left empty and
         logged in the "error_checks" list.
+
+        The three columns are converted to numbers and checked all at once
+        (see date_functions.py) rather than one row at a time.  'calendar'
+        can be 'gregorian' (the default, matching datetime.date) or 'julian'
+        which accepts the leap days of century years such as 29 February
+        1300.  'date_type' can be 'date' (datetime dates) or 'day_number',
+        which stores each date as its Julian Day Number in a small nullable
+        integer column - these sort and subtract like dates and have no
+        trouble with Julian leap days.  Without a date_type, compact
+        itineraries use 'day_number' and all others use 'date'.
         """
+        if date_type is None:
+            date_type = 'day_number' if self.compact else 'date'
         self._verify_cols()
         message = []
         # Structures dates as yyyy-mm-dd from three independent columns.
-        self.itin_df['dates'] = self.itin_df.apply(lambda x:
-                                        self._date_formater(x), axis=1)
+        day, month, year = date_parts(self.itin_df)
+        valid = valid_dates(day, month, year, calendar)
+        self.itin_df['dates'] = self._date_column(valid, day, month, year,
+                                                  calendar, date_type)
         date_filter = self.itin_df[['day','month','year']].isna().any(axis=1)
         blanks = self.itin_df[date_filter].index
         message.append('The following dates are incomplete: \n{}'.format(
                                                     (blanks + 2).tolist()))
         blank_dates = self.itin_df.dates.isna()
         bad_dates = self.itin_df[blank_dates].index.difference(blanks)
+        # Julian leap days are real dates that datetime.date cannot hold.
+        leap_days = self.itin_df[valid & blank_dates.values].index
+        bad_dates = bad_dates.difference(leap_days)
         message.append('The following dates contain errors:\n{}'.format(
                                                     (bad_dates + 2).tolist()))
+        if not leap_days.empty:
+            message.append('The following dates are Julian leap days that '
+                           'can only be kept with date_type="day_number":'
+                           '\n{}'.format((leap_days + 2).tolist()))
         cols = self.itin_df.columns.tolist()
         cols = cols[-1:] + cols[:-1]
         self.itin_df = self.itin_df[cols]
         self.error_checks += message
 
-    def _date_formater(self, row):
+    def _date_column(self, valid, day, month, year, calendar='gregorian',
+                     date_type='date'):
         """
-        Requires a Series or Dataframe row containing 'day', 'month', and
-        'year' in its index or columns and attempts to return a formatted
-        date type. All entries are coerced to integers.  Any failed integer
-        or bad date (ie: February 30th) returns None for the date.
+        Takes the day, month, and year arrays along with the array of valid
+        dates and returns the values for the 'dates' column.  With 'date'
+        every valid row becomes a datetime.date (yyyy-mm-dd) and all others
+        are None.  Julian leap days that datetime.date does not accept are
+        also left as None.  With 'day_number' every valid row becomes its
+        Julian Day Number (counted in the chosen calendar) in a nullable
+        Int32 column with blanks for all others.
         Example: {year:'1291', month:'8', day:'14'} returns
-             datetime.date(1291, 8, 14)
+             datetime.date(1291, 8, 14) or 2192814 (Gregorian)
         """
-        try:
-            # Forces all values in the three columns to integer for dt.date
-            row = pd.to_numeric(row[['day','month','year']],
-                                downcast='integer', errors='coerce')
-            date = dt.date(row.year, row.month, row.day)
-            return date
-        # dt.date with NaN instead of numeric values throws a TypeError
-        except TypeError:
-            return None
-        # Days out of range (July 34th, etc) throw a ValueError
-        except ValueError:
-            print('{} has a date value out of range.'.format(row.name))
-            return None
+        if date_type == 'day_number':
+            numbers = day_numbers(day, month, year, calendar)
+            dates = pd.Series(np.where(valid, numbers, 0),
+                              index=self.itin_df.index).astype('Int32')
+            return dates.where(valid)
+        elif date_type != 'date':
+            raise ValueError('The date_type must be "date" or "day_number", '
+                             'not "{}".'.format(date_type))
+        dates = np.full(len(valid), None, dtype=object)
+        # Only dates that datetime.date also accepts can be built.
+        real = valid & valid_dates(day, month, year, 'gregorian')
+        dates[real] = [dt.date(int(y), int(m), int(d)) for d, m, y in
+                       zip(day[real], month[real], year[real])]
+        return dates
 
-    def itin_to_gaz(self):
+    @timed_stage
+    def itin_to_gaz(self, add_code=False, itin_code=None):
         """
         Converts an itinerary into a gazetteer.  The function takes all unique
         entries in the itinerary, attaches their latitude and longitude (if
         present), drops date columns, and creates standard gazetteer columns
         (certainty, checked, modern_country).  If there are no lat/long
         coordinates, the function prints a warning, but does not throw an
-        error.  Returns a pandas DataFrame.
+        error.  Setting add_code to True adds an itin_code column filled
+        with the entered itin_code.  Returns a pandas DataFrame.
         """
         self._verify_cols()
         if not self.no_flag:
@@ -296,7 +436,9 @@ class Itinerary:
             gaz_df.loc[:,'itin_code'] = itin_code
         return gaz_df
 
-    def itin_to_trips(self, date_style='full_date'):
+    @timed_stage
+    def itin_to_trips(self, date_style='full_date', distance='haversine',
+                      sort=True, distance_cache=None):
         """
         Outputs a new dataframe with the original itinerary reorganized as
         a series of point A to point B trips.  This program works best when
@@ -315,6 +457,13 @@ class Itinerary:
         days, months and years available and drops all others.  'all' uses
         only full dates, but keeps the other columns.  'month' which keeps
         all rows containing a month regardless of the day column.
+        'distance' can be 'haversine' (the default, a sphere with a 6367 km
+        radius) or 'ellipsoid' for distances on the WGS84 ellipsoid.  Setting
+        sort to False skips the date sort for rows that are already in the
+        order they should be travelled (see itinerary_stream_class.py).
+        With a distance_cache (a DistanceCache), the distances of trips
+        between places with geo_ids are read from the cache where they are
+        already known and stored there otherwise.
 
         Output format -
 
@@ -343,20 +492,11 @@ class Itinerary:
         date_col, ref = self._trips_date_style(date_style)
         # If there are no date columns, the function fails...include message?
         if not date_col: return None
-        # The 'ref' only drops columns with missing days rather than months
-        dated_locs = self.itin_df[date_col[:ref] +
-                                  ['modern_name']].notna().all(axis=1)
-        columns = date_col + ['modern_name','latitude','longitude']
-        if 'geo_id' in self.itin_df.columns: columns.append('geo_id')
-        trip_df = self.itin_df[dated_locs].reindex(columns=columns)
-        # Lines up the database in dated order so trips are contiguous.
-        trip_df.sort_values(date_col[:ref], kind='mergesort', inplace=True)
-        # This pair removes all repeated locations to leave trips only.
-        orig_df = trip_df[trip_df.modern_name.shift(-1)!=trip_df.modern_name]
-        dest_df = trip_df[trip_df.modern_name.shift(1)!=trip_df.modern_name]
-        df_lst = [orig_df.reset_index(drop=True),
-                  dest_df.reset_index(drop=True).shift(-1)]
-        trip_df = pd.concat(df_lst, axis=1).loc[df_lst[0].index[:-1]]
+        trip_df, columns, first, last = self._stay_runs(date_col, ref, sort)
+        # Each trip leaves from the end of one stay for the start of the next.
+        df_lst = [trip_df.iloc[last[:-1]].reset_index(drop=True),
+                  trip_df.iloc[first[1:]].reset_index(drop=True)]
+        trip_df = pd.concat(df_lst, axis=1)
         # Relabeling columns for the 'trips' - origin and destination.
         origin_cols = ['origin_' + col for col in columns]
         dest_cols = ['dest_' + col for col in columns]
@@ -364,11 +504,115 @@ class Itinerary:
         # months style prioritizes years and months and cannot calculate the
         # day vector between origin and destination dates.
         if date_style!='months':
-            trip_df['travel_days'] = (trip_df['dest_dates'] -
-                                   trip_df['origin_dates']).dt.days
-        trip_df['distance'] = trip_df.apply(self._distance_calc, axis=1)
+            travel_days = trip_df['dest_dates'] - trip_df['origin_dates']
+            # Day numbers (see format_dates) subtract directly to days.
+            if not pd.api.types.is_numeric_dtype(travel_days):
+                travel_days = travel_days.dt.days
+            trip_df['travel_days'] = travel_days
+        trip_df['distance'] = self._distance_calc(trip_df, distance,
+                                                  distance_cache)
         return trip_df
 
+    @timed_stage
+    def travel_check(self, trip_df=None, max_km_day=100, window=15,
+                     z_limit=3.0, min_km_day=40):
+        """
+        Checks every trip for travel that seems impossible (itinerary code 3
+        in Tool-Box/rubrics.csv).  The trips dataframe is made with
+        itin_to_trips if one is not entered.  Every trip gets its km per
+        day, and trips faster than max_km_day, more than z_limit standard
+        deviations faster than the 'window' trips around them (and faster
+        than min_km_day), or arriving before they leave are flagged (see
+        flag_trips in travel_check_functions.py).  Each flagged trip is
+        added to the error_checks with its dates, places, distance, and
+        reasons.  Returns only the flagged trips, with the km_day,
+        rolling_mean, z_score, and flags columns, or None if there are no
+        trips.  Trips made with date_style='months' have no travel_days and
+        raise a ValueError.
+        """
+        if trip_df is None:
+            trip_df = self.itin_to_trips()
+        if trip_df is None:
+            return None
+        checked = flag_trips(trip_df, max_km_day, window, z_limit,
+                             min_km_day)
+        flagged = checked[checked['flags'].notna()]
+        message = ['{} of {} trips seem too fast to be possible:'.format(
+                                                len(flagged), len(checked))]
+        for row in flagged.itertuples():
+            message.append('{} ({}) to {} ({}): {:.1f} km in {} days, {:.1f} '
+                           'km/day - {}'.format(
+                           row.origin_modern_name, row.origin_dates,
+                           row.dest_modern_name, row.dest_dates,
+                           row.distance, row.travel_days, row.km_day,
+                           row.flags))
+        self.error_checks += message
+        return flagged
+
+    @timed_stage
+    def itin_to_stays(self, sort=True):
+        """
+        Compresses the itinerary into stays.  Every run of dated rows at the
+        same place (in date order, or the current order with sort=False)
+        becomes one row with:
+            modern_name (str)
+            arrival (date or day number) - the first date at the place
+            departure (date or day number) - the last date at the place
+            n_days (int) - the days from arrival to departure, counting both
+            n_records (int) - the number of itinerary rows in the stay
+            latitude, longitude, geo_id - from the arrival row, when the
+                itinerary has them
+        Consecutive days at one place (often hundreds of rows in a daily
+        itinerary) are found in a single pass (see _stay_runs), and are the
+        same runs that itin_to_trips joins into trips.  Returns a pandas
+        DataFrame, or None if the itinerary columns are missing.
+        """
+        self._verify_cols()
+        if not self.no_flag:
+            print("This operation has failed")
+            return None
+        date_col, ref = self._trips_date_style('full_date')
+        trip_df, columns, first, last = self._stay_runs(date_col, ref, sort)
+        stays = trip_df.iloc[first].reset_index(drop=True)
+        stays = stays[[col for col in columns[len(date_col):]
+                       if col in self.itin_df.columns]]
+        arrival = trip_df['dates'].iloc[first].reset_index(drop=True)
+        departure = trip_df['dates'].iloc[last].reset_index(drop=True)
+        n_days = departure - arrival
+        # Day numbers (see format_dates) subtract directly to days.
+        if not pd.api.types.is_numeric_dtype(n_days):
+            n_days = n_days.dt.days
+        stays.insert(1, 'arrival', arrival)
+        stays.insert(2, 'departure', departure)
+        stays.insert(3, 'n_days', n_days + 1)
+        stays.insert(4, 'n_records', last - first + 1)
+        return stays
+
+    def _stay_runs(self, date_col, ref, sort=True):
+        """
+        Takes the rows with a place and the dates needed ('ref' only drops
+        rows with missing days rather than months), keeps the date, name,
+        coordinate, and geo_id columns, and sorts them by date (unless sort
+        is False).  A run starts at every row whose place differs from the
+        row before it and ends just before the next run starts, so the
+        first and last row positions of every run come from one comparison
+        of the whole modern_name column.  Returns the sorted rows, their
+        columns, and the arrays of first and last positions.
+        """
+        dated_locs = self.itin_df[date_col[:ref] +
+                                  ['modern_name']].notna().all(axis=1)
+        columns = date_col + ['modern_name','latitude','longitude']
+        if 'geo_id' in self.itin_df.columns: columns.append('geo_id')
+        trip_df = self.itin_df[dated_locs].reindex(columns=columns)
+        # Lines up the database in dated order so trips are contiguous.
+        if sort:
+            trip_df.sort_values(date_col[:ref], kind='mergesort',
+                                inplace=True)
+        names = trip_df['modern_name']
+        first = np.flatnonzero((names != names.shift(1)).to_numpy())
+        last = np.append(first[1:] - 1, len(names) - 1)[:len(first)]
+        return trip_df, columns, first, last
+
     def _trips_date_style(self, date_style):
         """
         Determines whether the trips dataframe will be output with fully
@@ -409,7 +653,7 @@ class Itinerary:
         # Does not flag locations without a name...obviously.
         missing_locs = no_dates.difference(no_names)
         places = self.itin_df.loc[missing_locs, 'modern_name'].unique()
-        if places:
+        if len(places):
             message.append('the following places are listed with no dates:')
             for loc in places:
                 message.append('{}, '.format(loc))
@@ -417,31 +661,140 @@ class Itinerary:
             message.append('{}.'.format((missing_locs + 2).tolist()))
         return message
 
-    def _distance_calc(self, trip_row):
+    def _distance_calc(self, trip_df, method='haversine', cache=None):
         """
-        The old version uses a geo-calculator from pyproj to create a great 
-        circle distance given a series, array, or row of a dataframe and 
-        returns the distance:
+        The old version used a geo-calculator from pyproj to create a great
+        circle distance one row of the dataframe at a time:
         wgs84_geod = Geod(ellps='WGS84')
-        lat1, long1 = trip_row.origin_latitude, trip_row.origin_longitude
-        lat2, long2 = trip_row.dest_latitude, trip_row.dest_longitude
         az12,az21,dist = wgs84_geod.inv(long1,lat1,long2,lat2)
-        kmdist = round((dist / 1000), 1)
-        
-        This new version is a direct calculation using the Haversine formula.
-        
-        The inputs from the series need to include depart_lat, depart_long,
-        arrive_lat, and arrive_long.  Distance is returned in kilometers
-        """
-        lat1, long1 = trip_row.origin_latitude, trip_row.origin_longitude
-        lat2, long2 = trip_row.dest_latitude, trip_row.dest_longitude
-        long1, lat1, long2, lat2 = map(radians, [long1, lat1, long2, lat2])
-        dlong = long2 - long1 
-        dlat = lat2 - lat1 
-        angle = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlong/2)**2
-        arc_dist = 2 * arcsin(sqrt(angle)) 
-        km_dist = 6367 * arc_dist
-        return km_dist
+
+        This version hands the whole trips dataframe to trip_distances (see
+        distance_functions.py), which calculates every row at once with the
+        Haversine formula or, with method='ellipsoid', on the WGS84
+        ellipsoid in place of the old pyproj calculation.
+
+        With a cache (a DistanceCache) the trips between places with
+        geo_ids use the stored distances, so repeated runs over the same
+        places skip the calculation.
+
+        The dataframe needs to include origin_latitude, origin_longitude,
+        dest_latitude, and dest_longitude.  Distance is returned in kilometers
+        """
+        if cache is not None:
+            return cache.trip_distances(trip_df, method)
+        return trip_distances(trip_df, method)
+
+    def record_index(self, calendar='gregorian', rebuild=False):
+        """
+        Returns the index used to find rows by date and place without
+        reading the whole itin_df.  It holds:
+            days - the day number (see date_functions.py) of every row with
+                a complete, real date in the calendar, sorted
+            positions - the position of each of those rows in the itin_df
+            places - for every modern_name, the positions of all its rows in
+                itinerary order (dated or not)
+            place_days - for every modern_name, its dated rows as a pair of
+                arrays (sorted day numbers, positions)
+        The day numbers come from the day, month, and year columns, so
+        format_dates does not need to run first.  The index is built the
+        first time it is needed and built again whenever the itin_df is
+        replaced or changes length, whenever a function of the class changes
+        the modern_name column (see attribute_lookup), or when another
+        calendar is asked for.  Checking every cell on each query would cost
+        as much as reading the whole itin_df, so day, month, year, or
+        modern_name cells edited by hand are not noticed: call
+        record_index(rebuild=True) after such edits.
+        """
+        index = self._records
+        if (rebuild or index is None or index['frame'] is not self.itin_df
+                or index['length'] != len(self.itin_df)
+                or index['calendar'] != calendar):
+            day, month, year = date_parts(self.itin_df)
+            dated = np.flatnonzero(valid_dates(day, month, year, calendar))
+            days = day_numbers(day[dated], month[dated], year[dated],
+                               calendar)
+            order = np.argsort(days, kind='mergesort')
+            days, positions = days[order], dated[order]
+            names = self.itin_df['modern_name'].to_numpy(dtype=object)
+            places = pd.Series(names).groupby(names, sort=False).indices
+            dated_places = pd.Series(positions).groupby(names[positions],
+                                                        sort=False).indices
+            index = self._records = {
+                'frame': self.itin_df, 'length': len(self.itin_df),
+                'calendar': calendar, 'days': days, 'positions': positions,
+                'places': places,
+                'place_days': {name: (days[found], positions[found])
+                               for name, found in dated_places.items()}}
+        return index
+
+    def records_between(self, start=None, end=None, place=None,
+                        calendar='gregorian'):
+        """
+        Returns the itinerary rows dated from the beginning of 'start' to the
+        end of 'end' in date order.  Each can be a year ('1300'), a month
+        ('1352-03'), or a day ('1352-03-15') in the calendar, a
+        datetime.date, or a day number (see period_day_numbers), and either
+        can be left open.  With a place (a modern_name), only the rows at
+        that place are returned.  The range is found by binary search in the
+        sorted day numbers of record_index, so only the rows returned are
+        copied.  Rows without a complete date are never included.
+        Example: records_between('1300', '1310', place='Zaragoza')
+        """
+        index = self.record_index(calendar)
+        days, positions = index['days'], index['positions']
+        if place is not None:
+            empty = np.array([], dtype=np.int64)
+            days, positions = index['place_days'].get(place, (empty, empty))
+        low, high = 0, len(days)
+        if start is not None:
+            first = period_day_numbers(start, calendar)[0]
+            low = np.searchsorted(days, first, 'left')
+        if end is not None:
+            last = period_day_numbers(end, calendar)[1]
+            high = np.searchsorted(days, last, 'right')
+        return self.itin_df.iloc[positions[low:max(low, high)]]
+
+    def records_on(self, period, place=None, calendar='gregorian'):
+        """
+        Returns the itinerary rows dated within a single year, month, or day
+        (see records_between), in date order.
+        Example: records_on('1352-03') - where was the king in March 1352
+        """
+        return self.records_between(period, period, place, calendar)
+
+    def place_records(self, place):
+        """
+        Returns every itinerary row at a place (a modern_name), dated or
+        not, in itinerary order, from the place index of record_index.
+        """
+        # The places are the same in any calendar, so the index is reused.
+        calendar = self._records['calendar'] if self._records else 'gregorian'
+        positions = self.record_index(calendar)['places'].get(place, [])
+        return self.itin_df.iloc[positions]
+
+    @timed_stage
+    def csv_output(self, out_file_name=None):
+        """
+        Saves the itinerary dataframe.  The default file name is the input
+        itinerary name with '_processed.csv' added.  File names ending in
+        .parquet or .feather keep the column types (dates, categories, and
+        text geo_ids) for quicker reloading (see table_io_functions.py).
+        """
+        if out_file_name==None:
+            out_file_name = (self.name + '_processed.csv')
+        write_table(self.itin_df, out_file_name)
+
+    @timed_stage
+    def store_output(self, store, itin_code=None):
+        """
+        Saves the itinerary dataframe in a CorpusStore (see
+        corpus_store_class.py) under the itin_code, replacing any itinerary
+        saved under it before.  The default code is the file name of the
+        itinerary without its folder or extension.
+        """
+        if itin_code is None:
+            itin_code = os.path.basename(self.name)
+        store.save_itinerary(itin_code, self.itin_df, source=self.name)
 
     def error_output(self, tofile=False, filename=None):
         """
@@ -0,0 +1,210 @@
+"""
+-*- coding: utf-8 -*-
+
+itinerary_stream_class.py
+
+Processes itinerary datasheets too large to hold in memory at once (such as
+several itineraries joined into one file of millions of rows).  Instead of
+reading the whole file as the Itinerary class does, the file is read a
+chunk of rows at a time and only the columns the functions need are kept:
+modern_name, day, month, year, latitude, longitude, and geo_id, along with
+any extra columns entered.  Wide datasheets (Beckynton has 28 columns, most
+of them nearly empty) then take a fraction of the memory.
+
+Each chunk becomes an Itinerary and runs through the same functions:
+    attribute_lookup - if a gazetteer is entered
+    format_dates
+    itin_to_trips
+The processed rows and trips of each chunk are added to the output CSV
+files before the next chunk is read, so memory depends on the chunk size
+rather than the size of the file.
+
+Trips that cross from one chunk into the next are kept by carrying the
+last dated location of each chunk forward to the start of the next one.
+Rows are sorted by date within each chunk, so for a datasheet in date
+order (as the Crown of Aragon itineraries are) the trips are the same as
+those of the Itinerary class.  A row dated before the end of the previous
+chunk cannot be moved back into it, so its trips follow the order of the
+chunks instead; these rows are listed in the error_checks, and a larger
+chunk_size (or sorting the file first) avoids them.  The English bishops'
+registers (Beckynton, Bransford, Grandisson) are ordered by place rather
+than date, so they should be read as a single chunk or sorted first.
+
+Example:
+    stream = ItineraryStream('Jaume_II_royal_itinerary_datasheet.csv',
+                             chunk_size=50000)
+    stream.process('jaume_processed.csv', 'jaume_trips.csv',
+                   gaz_df=gaz_df, attributes=['latitude', 'longitude'])
+
+    Variable List:
+        self.file_name - the CSV itinerary datasheet.
+        self.name - the file name without its extension.
+        self.chunk_size - the number of rows read at a time.
+        self.columns - the columns read from the file (see _usecols).
+        self.error_checks - the messages of every chunk along with the
+            rows that were out of date order between chunks.
+        self.instrument - an Instrument shared with every chunk (or None).
+
+    Function List:
+        chunks(self):
+            Yields each chunk of the file as an Itinerary.
+        process(self, out_file=None, trips_file=None, gaz_df=None,
+                attributes=None, column='modern_name', calendar='gregorian',
+                date_type='date', date_style='full_date',
+                distance='haversine', distance_cache=None):
+            Runs every chunk through the Itinerary functions, appending the
+            processed rows and trips to the output files.  Returns a
+            dictionary of row, trip, and chunk counts.
+        error_output(self, tofile=False, filename=None):
+            Prints or saves the error_checks, as Itinerary.error_output.
+
+    Internal Functions:
+        _usecols(self, extra_columns):
+            Reads the column names of the file and returns the ones to keep.
+        _last_stop(self, itin_df):
+            Returns the last dated location of a sorted chunk.
+
+@author: Adam Franklin-Lyons
+    Marlboro College | Python 3.7
+
+Created on Sat Oct 17 21:03:38 2026
+"""
+
+from itinerary_class import Itinerary
+from table_io_functions import table_format, write_table
+import pandas as pd
+
+# The columns used by the Itinerary functions, read when present.
+STREAM_COLUMNS = ['modern_name', 'day', 'month', 'year', 'latitude',
+                  'longitude', 'geo_id']
+
+class ItineraryStream:
+
+    def __init__(self, file_name, chunk_size=100000, extra_columns=None,
+                 instrument=None):
+        """
+        Prepares a CSV itinerary for reading in chunks of chunk_size rows.
+        Only the columns in STREAM_COLUMNS (and any extra_columns, such as
+        'notes') are read.
+        """
+        if table_format(file_name) != 'csv':
+            raise ValueError('Only CSV itineraries can be read in chunks.')
+        self.file_name = file_name
+        self.name = file_name.split('.')[0]
+        self.chunk_size = chunk_size
+        self.instrument = instrument
+        self.error_checks = []
+        self.columns = self._usecols(extra_columns or [])
+
+    def chunks(self):
+        """
+        Reads the file chunk_size rows at a time and yields each chunk as an
+        Itinerary.  The rows keep their place in the whole file as their
+        index, so the row numbers in error messages match the spreadsheet.
+        """
+        reader = pd.read_csv(self.file_name, usecols=self.columns,
+                             chunksize=self.chunk_size,
+                             error_bad_lines=False, encoding='utf-8-sig')
+        for chunk in reader:
+            yield Itinerary(self.file_name, instrument=self.instrument,
+                            itin_df=chunk[self.columns])
+
+    def process(self, out_file=None, trips_file=None, gaz_df=None,
+                attributes=None, column='modern_name', calendar='gregorian',
+                date_type='date', date_style='full_date',
+                distance='haversine', distance_cache=None):
+        """
+        Runs each chunk through attribute_lookup (when a gazetteer and
+        attributes are entered), format_dates, and itin_to_trips (with
+        'full_date' or 'all' dates, which trips need), and adds
+        the processed rows to out_file and the trips to trips_file (both
+        CSV; either can be None to skip it).  The last dated location of
+        each chunk is put in front of the next chunk before its trips are
+        made, so trips across the boundary are not lost.  Returns the
+        number of rows, dated rows, trips, chunks, and rows out of date
+        order between chunks.  A distance_cache (see
+        distance_cache_class.py) is shared by every chunk, so the distances
+        of place pairs seen in earlier chunks are reused.
+        """
+        if date_style not in ['full_date', 'all']:
+            raise ValueError('Chunked trips need full dates: use date_style '
+                             '"full_date" or "all".')
+        summary = {'rows': 0, 'dated_rows': 0, 'trips': 0, 'chunks': 0,
+                   'out_of_order': 0}
+        last_stop = None
+        late_rows = []
+        for itin in self.chunks():
+            summary['chunks'] += 1
+            summary['rows'] += len(itin.itin_df)
+            if not itin.no_flag:
+                self.error_checks += itin.error_checks
+                break
+            if gaz_df is not None and attributes:
+                itin.attribute_lookup(gaz_df, attributes[:], column)
+            itin.format_dates(calendar, date_type)
+            summary['dated_rows'] += int(itin.itin_df['dates'].notna().sum())
+            if out_file:
+                write_table(itin.itin_df, out_file,
+                            append=summary['chunks'] > 1)
+            if last_stop is not None:
+                dates = itin.itin_df['dates'].dropna()
+                late = dates[dates < last_stop['dates'].iloc[0]]
+                late_rows += (late.index + 2).tolist()
+            # Sorts the chunk by date and puts the carried location first.
+            itin.itin_df = pd.concat([last_stop, itin.itin_df.sort_values(
+                                        'dates', kind='mergesort')])
+            trips = itin.itin_to_trips(date_style, distance, sort=False,
+                                       distance_cache=distance_cache)
+            if trips is not None:
+                summary['trips'] += len(trips)
+                if trips_file:
+                    write_table(trips, trips_file,
+                                append=summary['chunks'] > 1)
+            last_stop = self._last_stop(itin.itin_df)
+            self.error_checks += itin.error_checks
+        summary['out_of_order'] = len(late_rows)
+        if late_rows:
+            self.error_checks.append('The following rows are dated before '
+                                     'the end of the previous chunk, so '
+                                     'their trips follow the file order:'
+                                     '\n{}'.format(late_rows))
+        return summary
+
+    def error_output(self, tofile=False, filename=None):
+        """
+        Prints the error_checks of every chunk (without repeats) or, with
+        tofile=True, saves them to filename (the datasheet name with
+        '_errors.txt' by default).
+        """
+        output = pd.unique(pd.Series(self.error_checks, dtype=object)
+                           ).tolist()
+        output.append('Have a nice day!')
+        if tofile:
+            error_file = filename or self.name + '_errors.txt'
+            with open(error_file, 'w') as f:
+                f.writelines("{}\n".format(line) for line in output)
+        else:
+            for line in output:
+                print(line)
+        return None
+
+    def _usecols(self, extra_columns):
+        """
+        Reads only the first line of the file and returns the columns of
+        STREAM_COLUMNS and extra_columns that the file has, in that order.
+        """
+        header = pd.read_csv(self.file_name, nrows=0,
+                             encoding='utf-8-sig').columns
+        return [col for col in STREAM_COLUMNS + list(extra_columns)
+                if col in header]
+
+    def _last_stop(self, itin_df):
+        """
+        Returns the last dated location of a chunk (already sorted by date
+        with the carried location first) as a one row dataframe, or None if
+        there are no dated locations yet.
+        """
+        dated = itin_df[itin_df[['dates', 'modern_name']].notna().all(axis=1)]
+        if dated.empty:
+            return None
+        return dated.iloc[[-1]]
@@ -0,0 +1,150 @@
+"""
+-*- coding: utf-8 -*-
+
+name_match_class.py
+
+A name matching class for comparing a list of place names (usually the
+'modern_name' column of an itinerary) with the names in a gazetteer.  The
+gazetteer names are lowercased and indexed once when the class is created,
+so any number of itinerary names can be matched afterward without reworking
+the gazetteer for each one.
+
+Matching uses the same Levenshtein ratio as the rest of the project.  To
+avoid calling lev.ratio against every gazetteer name, each name is stored
+with its length and a count of its letters.  The ratio between two names
+can never be higher than twice the number of letters they share divided by
+their combined length, so that number gives a quick upper limit for every
+gazetteer name at once.  Names are then checked from the highest limit
+down and the search stops as soon as no remaining name could beat the best
+ratio already found.  The results are exactly the same as checking every
+gazetteer name, just with far fewer checks.
+
+    Variable List:
+        self.names - the original gazetteer names (numpy array) in order.
+        self.keys - the lowercased string version of every name.
+        self.exact - a set of the lowercased names for exact matches.
+        self.lengths - the length of every lowercased name (numpy array).
+        self.letters - a dictionary of every letter in the gazetteer names
+            and its column in the self.counts table.
+        self.counts - a table with one row per gazetteer name and one column
+            per letter holding the number of times the letter appears.
+        self.threshold - the ratio a name needs to beat to be a match (0.5).
+
+    Function List:
+        match(self, name):
+            Returns 'exact match' if the name is in the gazetteer, the closest
+            gazetteer name if the best ratio is over the threshold, or None.
+        match_series(self, names):
+            Matches a whole pandas Series of names, running each unique name
+            only once, and returns a Series with the same index.
+        best_match(self, name):
+            Returns the best ratio and the position of the matching name in
+            the gazetteer (or None if nothing beats the threshold).
+
+    Internal Functions:
+        _upper_bounds(self, key):
+            Returns the highest possible ratio between the key and every
+            gazetteer name along with the positions worth checking.
+
+@author: Adam Franklin-Lyons
+    Marlboro College | Python 3.7
+
+Created on Sat Oct 17 11:40:05 2026
+"""
+
+import numpy as np
+import pandas as pd
+import Levenshtein as lev
+
+class NameMatcher:
+
+    def __init__(self, names, threshold=0.5):
+        """
+        Takes a list or Series of gazetteer names (ex: gaz_df['modern_name'])
+        and indexes them for matching.  Blank cells are kept as the string
+        'nan' so that positions line up with the original gazetteer.
+        """
+        self.names = np.asarray(names, dtype=object)
+        self.keys = [str(name).lower() for name in self.names]
+        self.exact = set(self.keys)
+        self.lengths = np.array([len(key) for key in self.keys], dtype=int)
+        self.threshold = threshold
+        self.letters = {}
+        for key in self.keys:
+            for letter in key:
+                self.letters.setdefault(letter, len(self.letters))
+        self.counts = np.zeros((len(self.keys), len(self.letters)),
+                               dtype=np.int16)
+        for row, key in enumerate(self.keys):
+            for letter in key:
+                self.counts[row, self.letters[letter]] += 1
+
+    def match(self, name):
+        """
+        Compares the name to every name in the gazetteer.  It returns the
+        best ratio match in the gazetteer.  If there is an exact match,
+        instead of the name it returns 'exact match,' if there is no match
+        better than the threshold (50%) it returns None.
+        """
+        if str(name).lower() in self.exact:
+            return 'exact match'
+        ratio, position = self.best_match(name)
+        if position is None:
+            return None
+        return self.names[position]
+
+    def match_series(self, names):
+        """
+        Runs match on every unique name in a Series and maps the results
+        back onto the full Series so repeated names are only matched once.
+        """
+        unique = pd.unique(names)
+        results = {name: self.match(name) for name in unique}
+        return names.map(results)
+
+    def best_match(self, name):
+        """
+        Returns the highest Levenshtein ratio for the name along with the
+        position of the first gazetteer name with that ratio.  If no name
+        does better than the threshold, the position is None.
+        """
+        key = str(name).lower()
+        bounds, candidates = self._upper_bounds(key)
+        # Highest possible ratio first; ties keep the gazetteer order.
+        order = candidates[np.argsort(-bounds[candidates], kind='mergesort')]
+        best, position = self.threshold, None
+        for row in order:
+            # The small margin keeps float rounding from cutting off ties.
+            if bounds[row] + 1e-9 < best or (bounds[row] <= best and
+                                             position is None):
+                break
+            ratio = lev.ratio(self.keys[row], key)
+            if ratio > best or (ratio == best and position is not None
+                                and row < position):
+                best, position = ratio, row
+        return best, position
+
+    def _upper_bounds(self, key):
+        """
+        The Levenshtein ratio is twice the longest shared sequence of letters
+        divided by the combined length of the two names.  Neither the shared
+        letters nor the shorter length can be beaten, so this returns the
+        ratio those would give for every name in the gazetteer and the
+        positions of the names that could still beat the threshold.
+        """
+        total = self.lengths + len(key)
+        # Only names of roughly similar length can beat the threshold.
+        close = np.flatnonzero(2 * np.minimum(self.lengths, len(key)) >
+                               self.threshold * total)
+        letters = {}
+        for letter in key:
+            if letter in self.letters:
+                letters[self.letters[letter]] = letters.get(
+                                        self.letters[letter], 0) + 1
+        bounds = np.zeros(len(self.keys))
+        if letters and close.size:
+            cols = list(letters.keys())
+            shared = np.minimum(self.counts[np.ix_(close, cols)],
+                                list(letters.values())).sum(axis=1)
+            bounds[close] = 2 * shared / total[close]
+        return bounds, close[bounds[close] > self.threshold]
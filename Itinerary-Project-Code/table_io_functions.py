@@ -0,0 +1,168 @@
+"""
+-*- coding: utf-8 -*-
+
+table_io_functions.py
+
+Reading and writing for gazetteer and itinerary tables.  The file type is
+chosen from the file extension:
+    .csv - plain text, the format used throughout the repository
+    .parquet or .pq - a typed, compressed column format
+    .feather - a typed column format that is very quick to load
+
+Parquet and Feather files keep the column types as they were saved, so
+chained gazetteer and itinerary steps do not need to re-read text and
+re-guess every type.  Repeated names (modern_name and itin_code) are saved
+as categories, which store each place name once no matter how many times
+it appears in an itinerary.  Both formats need the optional pyarrow
+package (conda install pyarrow); CSV files work without it.
+
+In every format, geo_id columns are read and written as text.  Geonames
+ids read from a CSV with blank cells otherwise turn into floats and are
+written back as '2657355.0'; these are all returned to '2657355'.
+
+compact_types shrinks a table in memory: repeated text (place names, book
+references) becomes categories, day/month/year become small whole number
+columns that still allow blanks, and geo_ids that are all numbers become
+whole numbers (Int64) rather than text or floats.
+
+Function List:
+    read_table(file_name, **csv_options):
+        Reads a CSV, Parquet, or Feather file into a DataFrame.  Any extra
+        options are passed on to pd.read_csv for CSV files.
+    write_table(df, file_name, append=False):
+        Writes a DataFrame to a CSV, Parquet, or Feather file.  CSV files
+        can be added to one piece at a time with append=True.
+    table_format(file_name):
+        Returns 'csv', 'parquet', or 'feather' based on the extension.
+    normalize_geo_ids(ids):
+        Returns a Series of geo_ids as text with float endings removed.
+    compact_types(df, columns=None, max_unique=0.5):
+        Returns the dataframe with smaller column types (see above).
+
+Functions called by main Function List:
+    _id_columns(df):
+        Returns the geo_id columns in a DataFrame (geo_id, geo_id_guess1...).
+
+@author: Adam Franklin-Lyons
+    Marlboro College | Python 3.7
+
+Created on Sat Oct 17 17:30:54 2026
+"""
+
+import os
+import pandas as pd
+
+FORMATS = {'.csv': 'csv', '.txt': 'csv', '.parquet': 'parquet',
+           '.pq': 'parquet', '.feather': 'feather'}
+CATEGORY_COLUMNS = ['modern_name', 'itin_code']
+# The smallest whole number types that hold days, months, and years.
+DATE_PART_TYPES = {'day': 'Int8', 'month': 'Int8', 'year': 'Int16'}
+
+def read_table(file_name, **csv_options):
+    """
+    Reads a gazetteer or itinerary table in the format given by the file
+    extension.  geo_id columns are always returned as text.
+    """
+    file_type = table_format(file_name)
+    if file_type == 'parquet':
+        df = pd.read_parquet(file_name)
+    elif file_type == 'feather':
+        df = pd.read_feather(file_name)
+    else:
+        df = pd.read_csv(file_name, **csv_options)
+    for col in _id_columns(df):
+        df[col] = normalize_geo_ids(df[col])
+    return df
+
+def write_table(df, file_name, append=False):
+    """
+    Writes a DataFrame in the format given by the file extension.  geo_id
+    columns are saved as text and, for Parquet and Feather, modern_name and
+    itin_code are saved as categories.  The DataFrame itself is unchanged.
+    With append, the rows are added to the end of an existing CSV file
+    (without repeating the column names); Parquet and Feather files can
+    only be written whole.
+    """
+    file_type = table_format(file_name)
+    df = df.copy()
+    for col in _id_columns(df):
+        df[col] = normalize_geo_ids(df[col])
+    if file_type == 'csv':
+        adding = append and os.path.exists(file_name)
+        df.to_csv(file_name, index=False, mode='a' if adding else 'w',
+                  header=not adding)
+        return None
+    if append:
+        raise ValueError('Only CSV files can be written in pieces, not '
+                         '{} files.'.format(file_type))
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    # Mixed text and numbers in one column cannot be saved with a type.
+    for col in df.columns[df.dtypes == object]:
+        if pd.api.types.infer_dtype(df[col], skipna=True).startswith('mixed'):
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    df = df.reset_index(drop=True)
+    if file_type == 'parquet':
+        df.to_parquet(file_name, index=False)
+    else:
+        df.to_feather(file_name)
+    return None
+
+def table_format(file_name):
+    """
+    Returns the table format for a file name from its extension.  Unknown
+    extensions raise a ValueError listing the ones that can be used.
+    """
+    extension = os.path.splitext(str(file_name))[1].lower()
+    if extension not in FORMATS:
+        raise ValueError('"{}" is not a known table type; use one of: '
+                         '{}'.format(extension, ', '.join(FORMATS)))
+    return FORMATS[extension]
+
+def normalize_geo_ids(ids):
+    """
+    Takes a Series of geo_ids (numbers, floats from a CSV with blanks, or
+    text ids such as TL_0001) and returns them all as text, with any '.0'
+    endings and surrounding spaces removed.  Blanks stay blank.
+    """
+    text = ids.astype(str).str.strip().str.replace(r'^(\d+)\.0*$', r'\1',
+                                                   regex=True)
+    return text.where(ids.notna(), None).astype(object)
+
+def compact_types(df, columns=None, max_unique=0.5):
+    """
+    Returns a copy of the dataframe using less memory.  Only the entered
+    columns (all of them by default) are changed:
+        day, month, year - Int8/Int16 columns with blanks kept, but only if
+            every entry is a whole number (so bad dates are still reported
+            by format_dates)
+        geo_id columns - Int64 if every id is a number, otherwise as text
+        other text columns - categories when at most max_unique of the
+            rows (half by default) hold different values
+    """
+    df = df.copy()
+    id_cols = _id_columns(df)
+    for col in columns if columns is not None else df.columns:
+        values = df[col]
+        if col in DATE_PART_TYPES or col in id_cols:
+            numbers = pd.to_numeric(values.astype(object).where(
+                                    values.notna(), None), errors='coerce')
+            whole = numbers.isna().eq(values.isna()).all() and (
+                    numbers.dropna() % 1 == 0).all()
+            if whole:
+                df[col] = numbers.astype(DATE_PART_TYPES.get(col, 'Int64'))
+                continue
+        if values.dtype != object:
+            continue
+        if values.nunique() <= max_unique * len(values):
+            df[col] = values.astype('category')
+    return df
+
+def _id_columns(df):
+    """
+    Returns the names of all geo_id columns: 'geo_id' along with the guess
+    columns such as 'geo_id_guess1' or 'geoid_guess1'.
+    """
+    return [col for col in df.columns if str(col).replace('_', '').lower(
+                                                        ).startswith('geoid')]
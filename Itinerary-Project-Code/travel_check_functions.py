@@ -0,0 +1,132 @@
+"""
+-*- coding: utf-8 -*-
+
+travel_check_functions.py
+
+Checks whether the trips of an itinerary (see Itinerary.itin_to_trips) are
+possible.  The rubrics (Tool-Box/rubrics.csv, itinerary code 3) ask for
+towns where "the distance to this town is impossibly long" to be marked,
+such as Guadalajara to Gurrea de Gállego in a single day.  These functions
+find those trips for the whole trips dataframe at once rather than by
+reading through it by hand.
+
+Every trip gets its speed in kilometers per day (trips on the same day
+count as one day), and a trip is flagged for any of these reasons:
+    speed - faster than max_km_day (100 km a day by default; a court on
+        the move usually covers 20-40)
+    outlier - much faster than the trips around it: more than z_limit
+        standard deviations above the average of the 'window' trips
+        centered on it (the trip itself is left out of the average so a
+        single impossible trip cannot hide itself).  Only trips faster
+        than min_km_day can be outliers, so a 30 km day among 5 km days
+        is not flagged.
+    backwards - the arrival date is before the departure date (for trips
+        made without sorting)
+All of the calculations are whole column (rolling sums), so tens of
+thousands of trips take a few milliseconds.  With a group column (ex:
+itin_code, for trips of several itineraries together) the rolling
+averages are kept separate for each itinerary.
+
+Function List:
+    travel_speeds(trip_df):
+        Returns the km per day of every trip.
+    rolling_speed_stats(speeds, window=15, groups=None):
+        Returns the average and standard deviation of the surrounding
+        trips for every trip, leaving the trip itself out.
+    flag_trips(trip_df, max_km_day=100, window=15, z_limit=3.0,
+               min_km_day=40, group=None):
+        Returns a copy of the trips with km_day, rolling_mean, z_score, and
+        flags columns (the reasons, separated by '; ', or blank).
+
+@author: Adam Franklin-Lyons
+    Marlboro College | Python 3.7
+
+Created on Sat Oct 17 23:20:41 2026
+"""
+
+import numpy as np
+import pandas as pd
+
+def travel_speeds(trip_df):
+    """
+    Divides the distance of every trip by its travel_days, counting trips
+    on the same day (0 days) as a single day.  Trips without a distance or
+    number of days return NaN.  Trips made with date_style='months' have no
+    travel_days and raise a ValueError.
+    """
+    if 'travel_days' not in trip_df.columns:
+        raise ValueError('The travel check needs trips with travel_days; '
+                         'trips made with date_style="months" cannot be '
+                         'checked.  Use date_style "full_date" or "all".')
+    days = pd.to_numeric(trip_df['travel_days'], errors='coerce'
+                         ).to_numpy(dtype=float, na_value=np.nan)
+    distance = pd.to_numeric(trip_df['distance'], errors='coerce'
+                             ).to_numpy(dtype=float, na_value=np.nan)
+    return distance / np.maximum(np.abs(days), 1)
+
+def rolling_speed_stats(speeds, window=15, groups=None):
+    """
+    For every trip, takes the 'window' trips centered on it (fewer at the
+    ends of the itinerary), leaves the trip itself out, and returns the
+    average speed and standard deviation of the others as two arrays.
+    These come from rolling sums of the speeds and their squares, so no
+    trip is handled on its own.  With groups (an array of itinerary
+    labels) the windows do not cross from one itinerary into the next.
+    Trips with fewer than two other trips around them get NaN.
+    """
+    speeds = pd.Series(np.asarray(speeds, dtype=float))
+    frame = pd.DataFrame({'value': speeds, 'square': speeds**2,
+                          'count': speeds.notna().astype(float)})
+    frame = frame.fillna({'value': 0, 'square': 0})
+    if groups is None:
+        sums = frame.rolling(window, center=True, min_periods=1).sum()
+    else:
+        sums = frame.groupby(np.asarray(groups), sort=False).rolling(
+                    window, center=True, min_periods=1).sum()
+        sums = sums.reset_index(level=0, drop=True).sort_index()
+    own = speeds.notna()
+    count = sums['count'] - own
+    total = sums['value'] - frame['value']
+    squares = sums['square'] - frame['square']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = total / count
+        variance = (squares - count * mean**2) / (count - 1)
+    enough = count >= 2
+    mean = mean.where(enough)
+    std = np.sqrt(variance.clip(lower=0)).where(enough)
+    return mean.to_numpy(), std.to_numpy()
+
+def flag_trips(trip_df, max_km_day=100, window=15, z_limit=3.0,
+               min_km_day=40, group=None):
+    """
+    Returns a copy of the trips dataframe with four new columns:
+        km_day - the speed of the trip (see travel_speeds)
+        rolling_mean - the average speed of the surrounding trips
+        z_score - how many standard deviations the trip is above that
+            average
+        flags - 'speed', 'outlier', and/or 'backwards' (see above), joined
+            with '; ', or blank for trips that look possible
+    The trips keep their order, so the rolling windows follow the order of
+    travel.  'group' is the name of a column (such as itin_code) that
+    separates the trips of different itineraries.
+    """
+    trip_df = trip_df.copy()
+    speeds = travel_speeds(trip_df)
+    groups = trip_df[group].to_numpy() if group else None
+    mean, std = rolling_speed_stats(speeds, window, groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z_score = np.where(std > 0, (speeds - mean) / std, np.nan)
+    days = pd.to_numeric(trip_df['travel_days'], errors='coerce'
+                         ).to_numpy(dtype=float, na_value=np.nan)
+    reasons = {'speed': speeds > max_km_day,
+               'outlier': (z_score > z_limit) & (speeds > min_km_day),
+               'backwards': days < 0}
+    flags = np.full(len(trip_df), '', dtype=object)
+    for reason, found in reasons.items():
+        flags[found] = np.where(flags[found] == '', reason,
+                                flags[found] + '; ' + reason)
+    trip_df['km_day'] = speeds
+    trip_df['rolling_mean'] = mean
+    trip_df['z_score'] = z_score
+    trip_df['flags'] = np.where(flags == '', None, flags)
+    return trip_df